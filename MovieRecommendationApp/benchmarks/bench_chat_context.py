@@ -0,0 +1,95 @@
+"""
+Chatbot prompt size against conversation length: whole history vs context window.
+
+    python -m benchmarks.bench_chat_context --lengths 10,100,1000,10000
+
+For each history length a session is filled with that many alternating
+user/assistant messages (in a throwaway SQLite test database), then the prompt
+for one more message is built two ways:
+
+* naive:  every earlier ChatMessage rendered into the prompt.
+* window: chatbot.context.build_context with CHATBOT_CONTEXT_TOKENS, after the
+          rolling summary has been brought up to date.
+
+Also reported: the time to build each, and the time refresh_summary takes to
+fold one more batch of --batch messages into an up-to-date summary, which
+should stay flat as the history grows. The extractive summarizer is used, so no
+LLM is involved.
+"""
+import argparse
+import time
+
+from .common import create_test_database, setup_django
+
+USER_TEXT = "What do you think about {n}? I liked the soundtrack but the ending felt rushed to me."
+BOT_TEXT = ("Movie {n} is a well-reviewed drama; critics praised the lead performance and the score, "
+            "though some found the final act hurried. If you liked it, you might also enjoy similar films.")
+
+
+def add_messages(session, start, count):
+    from web.models import ChatMessage
+
+    ChatMessage.objects.bulk_create(
+        (ChatMessage(session=session, is_user=i % 2 == 0, message_text=(USER_TEXT if i % 2 == 0 else BOT_TEXT).format(n=i))
+         for i in range(start, start + count)),
+        batch_size=1000,
+    )
+
+
+def naive_prompt(session, message):
+    from chatbot.bot import STRUCTURED_PROMPT, CONTEXT_SECTION
+    from web.models import ChatMessage
+
+    turns = ChatMessage.objects.filter(session=session).order_by('id').values_list('is_user', 'message_text')
+    conversation = "Recent conversation:\n" + '\n'.join(
+        f"{'User' if is_user else 'Assistant'}: {text}" for is_user, text in turns
+    )
+    return STRUCTURED_PROMPT.format(context=CONTEXT_SECTION.format(conversation=conversation), message=message)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lengths', default='10,100,1000,10000', help="Comma-separated history lengths (messages)")
+    parser.add_argument('--batch', type=int, default=20, help="Messages added before the incremental summary refresh")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.db import connection
+
+    from chatbot.bot import build_prompt
+    from chatbot.context import build_context, estimate_tokens, get_context_tokens, refresh_summary
+    from web.models import ChatSession
+
+    db_path = create_test_database('bench_chat_context')
+    user = User.objects.create_user('bench-context')
+
+    print(f"context budget {get_context_tokens()} tokens, ~4 characters per token")
+    print(f"{'messages':>9} {'naive tok':>10} {'naive ms':>9} {'window tok':>11} {'window ms':>10} {'refresh ms':>11}")
+    for length in [int(n) for n in args.lengths.split(',')]:
+        session = ChatSession.objects.create(user=user)
+        add_messages(session, 0, length)
+
+        started = time.perf_counter()
+        naive = naive_prompt(session, 'And the sequel?')
+        naive_ms = (time.perf_counter() - started) * 1000
+
+        refresh_summary(session.id)  # catch up once; afterwards refreshes are incremental
+        session.refresh_from_db()
+        started = time.perf_counter()
+        windowed = build_prompt('And the sequel?', build_context(session))
+        window_ms = (time.perf_counter() - started) * 1000
+
+        add_messages(session, length, args.batch)
+        started = time.perf_counter()
+        refresh_summary(session.id)
+        refresh_ms = (time.perf_counter() - started) * 1000
+
+        print(f"{length:>9} {estimate_tokens(naive):>10} {naive_ms:>9.1f} {estimate_tokens(windowed):>11} "
+              f"{window_ms:>10.1f} {refresh_ms:>11.1f}")
+
+    connection.creation.destroy_test_db(db_path, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
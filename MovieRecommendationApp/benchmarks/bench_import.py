@@ -0,0 +1,96 @@
+"""
+Throughput and memory of the MovieLens importer (web.importer) on synthetic files.
+
+    python -m benchmarks.bench_import --scales tiny,ml-100k,ml-1m
+
+For each scale a movies.csv and ratings.csv in ml-latest format are written to
+a temporary directory (ratings sorted by user, as MovieLens ships them) and
+imported into a throwaway SQLite test database. Writing the files and
+importing the ratings each run in a fresh child process, so the reported peak
+RSS covers the import alone (Linux carries a process's peak over into what it
+runs); it should stay flat as the number of ratings grows.
+"""
+import argparse
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+from .common import SCALES, create_test_database, setup_django, synthetic_ratings
+
+
+def write_files(directory, num_users, num_movies, num_ratings):
+    user_ids, movie_ids, ratings = synthetic_ratings(num_users, num_movies, num_ratings)
+    with open(os.path.join(directory, 'movies.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['movieId', 'title', 'genres'])
+        for movie_id in range(1, num_movies + 1):
+            writer.writerow([movie_id, f'Synthetic Movie {movie_id} ({1950 + movie_id % 70})', 'Drama|Comedy'])
+    order = user_ids.argsort(kind='stable')
+    with open(os.path.join(directory, 'ratings.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['userId', 'movieId', 'rating', 'timestamp'])
+        for i in order.tolist():
+            writer.writerow([int(user_ids[i]), int(movie_ids[i]), f'{ratings[i] - 0.5 * (i % 2):.1f}', 1500000000 + i])
+
+
+def run_child(*args):
+    """Run this benchmark with args in a child process and return its last line of output."""
+    child = subprocess.run([sys.executable, '-m', 'benchmarks.bench_import', *args],
+                           check=True, capture_output=True, text=True)
+    return child.stdout.strip().splitlines()[-1] if child.stdout.strip() else ''
+
+
+def import_ratings_child(db_path, ratings_path, chunk_size, user_prefix):
+    """Child process: import one ratings file into db_path and print its stats as JSON."""
+    setup_django()
+    from django.db import connection
+
+    from web import importer
+
+    connection.settings_dict['NAME'] = db_path
+    stats = importer.import_ratings(ratings_path, chunk_size, user_prefix=user_prefix)
+    print(json.dumps({'written': stats.written, 'seconds': stats.seconds,
+                      'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', default='tiny,ml-100k,ml-1m', help=f"Comma-separated, from {', '.join(SCALES)}")
+    parser.add_argument('--chunk-size', type=int, default=20000)
+    parser.add_argument('--write-files', nargs=2, metavar=('DIRECTORY', 'SCALE'), help=argparse.SUPPRESS)
+    parser.add_argument('--import-ratings', nargs=3, metavar=('DB', 'RATINGS', 'PREFIX'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.write_files:
+        directory, scale = args.write_files
+        return write_files(directory, *SCALES[scale])
+    if args.import_ratings:
+        db, ratings, prefix = args.import_ratings
+        return import_ratings_child(db, ratings, args.chunk_size, prefix)
+
+    setup_django()
+    from django.db import connection
+
+    from web import importer
+
+    db_path = create_test_database('bench_import')
+    print(f"chunk size {args.chunk_size}")
+    print(f"{'scale':<8} {'ratings':>9} {'movies s':>9} {'ratings s':>10} {'ratings/s':>10} {'max RSS MB':>11}")
+    for scale in args.scales.split(','):
+        with tempfile.TemporaryDirectory() as directory:
+            run_child('--write-files', directory, scale)
+            movies = importer.import_movies(os.path.join(directory, 'movies.csv'), args.chunk_size)
+            connection.close()  # the child writes to the same SQLite file
+            ratings = json.loads(run_child('--chunk-size', str(args.chunk_size), '--import-ratings',
+                                           db_path, os.path.join(directory, 'ratings.csv'), f'{scale}-'))
+        print(f"{scale:<8} {ratings['written']:>9} {movies.seconds:>9.2f} {ratings['seconds']:>10.2f} "
+              f"{ratings['written'] / ratings['seconds']:>10,.0f} {ratings['max_rss_kb'] / 1024:>11.1f}")
+
+    connection.creation.destroy_test_db(db_path, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Micro-benchmark: separate cost/gradient functions vs the fused (J, grad) objective.
+
+    python -m benchmarks.bench_objective --scale ml-100k
+
+One "evaluation" is what the optimizer needs at a line-search point: J and grad.
+Reports mean time and peak traced allocation (tracemalloc) per evaluation.
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from .common import SCALES, setup_django, synthetic_ratings
+
+
+def measure(fn, repeat):
+    fn()  # warm up caches and buffers
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    seconds = (time.perf_counter() - started) / repeat
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='ml-100k')
+    parser.add_argument('--features', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from web import recommendation as rec
+
+    rows, cols, vals, movie_ids, user_ids = rec.build_rating_index(*synthetic_ratings(*SCALES[args.scale]))
+    num_movies, num_users, k, reg = len(movie_ids), len(user_ids), args.features, 1.0
+    vals, _ = rec.normalizeRatingsSparse(rows, vals, num_movies)
+    params = np.random.default_rng(0).random((num_movies + num_users) * k)
+
+    cases = {}
+    sparse_args = (rows, cols, vals, num_movies, num_users, k, reg)
+    cases['sparse'] = (
+        lambda: (rec.cofiCostFuncSparse(params, *sparse_args), rec.cofiGradFuncSparse(params, *sparse_args)),
+        rec.SparseCofiObjective(*sparse_args),
+    )
+    if num_movies * num_users <= 20_000_000:
+        Y = np.zeros((num_movies, num_users))
+        R = np.zeros((num_movies, num_users))
+        Y[rows, cols] = vals
+        R[rows, cols] = 1
+        cases['dense'] = (
+            lambda: (rec.cofiCostFunc(params, Y, R, k, reg), rec.cofiGradFunc(params, Y, R, k, reg)),
+            rec.CofiObjective(Y, R, k, reg),
+        )
+
+    print(f"{args.scale}: {num_users} users x {num_movies} movies, {len(vals)} ratings, {k} features")
+    print(f"{'path':<7} {'variant':<9} {'ms/eval':>9} {'MB peak/eval':>14}")
+    for path, (separate, fused) in cases.items():
+        results = {
+            'separate': measure(separate, args.repeat),
+            'fused': measure(lambda: fused(params), args.repeat),
+        }
+        for variant, (seconds, peak) in results.items():
+            print(f"{path:<7} {variant:<9} {seconds * 1000:>9.2f} {peak / 1e6:>14.2f}")
+        speedup = results['separate'][0] / results['fused'][0]
+        memory = results['separate'][1] / max(results['fused'][1], 1)
+        print(f"{path:<7} {'gain':<9} {speedup:>8.2f}x {memory:>13.2f}x")
+
+
+if __name__ == '__main__':
+    main()
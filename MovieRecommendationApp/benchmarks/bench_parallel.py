@@ -0,0 +1,80 @@
+"""
+Speedup of the recommender's parallel paths (web.parallel) with more workers.
+
+    python -m benchmarks.bench_parallel --scale ml-1m --workers 1,2,4,8
+
+On synthetic ratings, times for each pool kind (thread, process) and worker count:
+
+* als:  --iterations blocked ALS sweeps (ALSTrainer with tol=0)
+* cv:   --folds-fold cross-validation, one fold per task (ALS inside each fold)
+* topk: top-K scoring of every user (web.materialize.score_top_k)
+
+Speedup is against one worker (everything inline, no pool). It can't exceed
+the number of CPUs available, printed first.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from .common import SCALES, setup_django, synthetic_ratings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='ml-100k')
+    parser.add_argument('--workers', default='1,2,4,8', help="Comma-separated worker counts")
+    parser.add_argument('--pools', default='thread,process')
+    parser.add_argument('--iterations', type=int, default=5, help="ALS sweeps per fit")
+    parser.add_argument('--folds', type=int, default=4)
+    parser.add_argument('--top-k', type=int, default=50)
+    parser.add_argument('--features', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from web.materialize import score_top_k
+    from web.parallel import default_workers
+    from web.recommendation import ALSTrainer, build_rating_index, cross_validate, normalizeRatingsSparse
+
+    user_ids, movie_ids, ratings = synthetic_ratings(*SCALES[args.scale])
+    rows, cols, vals, unique_movie_ids, unique_user_ids = build_rating_index(user_ids, movie_ids, ratings)
+    num_movies, num_users = len(unique_movie_ids), len(unique_user_ids)
+    vals_norm, Ymean = normalizeRatingsSparse(rows, vals, num_movies)
+    Ymean = Ymean.flatten()
+    X, Theta = ALSTrainer(max_iter=2).fit(rows, cols, vals_norm, num_movies, num_users, args.features, 1.0,
+                                          np.random.default_rng(0))
+    by_user = np.argsort(cols, kind='stable')
+    rated_movies = rows[by_user]
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(cols, minlength=num_users))))
+
+    def als(workers, pool):
+        trainer = ALSTrainer(max_iter=args.iterations, tol=0, workers=workers, pool=pool)
+        trainer.fit(rows, cols, vals_norm, num_movies, num_users, args.features, 1.0, np.random.default_rng(0))
+
+    def cv(workers, pool):
+        cross_validate(user_ids, movie_ids, ratings, num_folds=args.folds, num_features=args.features, trainer='als',
+                       workers=workers, pool=pool)
+
+    def topk(workers, pool):
+        for _ in score_top_k(X, Ymean, Theta, rated_movies, bounds, args.top_k, workers=workers, pool=pool):
+            pass
+
+    print(f"{args.scale}: {num_users} users x {num_movies} movies, {len(vals)} ratings; "
+          f"{default_workers()} CPUs available")
+    print(f"{'task':<5} {'pool':<8} {'workers':>7} {'seconds':>8} {'speedup':>8}")
+    for name, task in (('als', als), ('cv', cv), ('topk', topk)):
+        baseline = None
+        for pool in args.pools.split(','):
+            for workers in [int(n) for n in args.workers.split(',')]:
+                if workers == 1 and baseline is not None:
+                    continue  # one worker runs inline whatever the pool kind
+                started = time.perf_counter()
+                task(workers, pool)
+                elapsed = time.perf_counter() - started
+                baseline = baseline or elapsed
+                print(f"{name:<5} {pool if workers > 1 else 'inline':<8} {workers:>7} {elapsed:>8.2f} "
+                      f"{baseline / elapsed:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Query latency and recall of the "similar movies" indexes on random movie factors.
+
+    python -m benchmarks.bench_similarity --movies 200000
+
+Recall@n is measured against the exact brute-force answer.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from .common import setup_django
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--movies', type=int, default=200000)
+    parser.add_argument('--features', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-n', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from web.similarity import BruteForceIndex, LSHIndex
+
+    rng = np.random.default_rng(0)
+    # Clustered factors, like genres in a trained model
+    centers = rng.normal(size=(50, args.features))
+    X = centers[rng.integers(0, 50, args.movies)] + 0.3 * rng.normal(size=(args.movies, args.features))
+    ids = np.arange(1, args.movies + 1)
+    queries = rng.choice(ids, size=args.queries, replace=False).tolist()
+
+    indexes = {}
+    for name, cls in (('brute', BruteForceIndex), ('lsh', LSHIndex)):
+        started = time.perf_counter()
+        indexes[name] = cls(X, ids)
+        print(f"{name:<6} built in {time.perf_counter() - started:.2f}s")
+
+    exact = {}
+    print(f"{'index':<6} {'ms/query':>9} {'recall@' + str(args.n):>10}")
+    for name, index in indexes.items():
+        started = time.perf_counter()
+        answers = [index.similar(q, args.n) for q in queries]
+        per_query = (time.perf_counter() - started) / len(queries) * 1000
+        if name == 'brute':
+            exact = dict(zip(queries, answers))
+        recall = np.mean([len(set(a) & set(exact[q])) / args.n for q, a in zip(queries, answers)])
+        print(f"{name:<6} {per_query:>9.3f} {recall:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Training input I/O: reading ratings through the ORM vs the columnar snapshot.
+
+    python -m benchmarks.bench_snapshot --scales tiny,ml-100k,ml-1m
+
+For each scale a throwaway SQLite test database is filled with synthetic
+ratings, then timed:
+
+* orm:         web.recommendation.load_ratings_from_db (one tuple per row)
+* export:      a full web.snapshot export
+* incremental: an export after --changed ratings were updated
+* mmap:        load_snapshot plus one pass over the mapped columns
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from .common import SCALES, create_test_database, setup_django, synthetic_ratings
+
+
+def fill_database(num_users, num_movies, num_ratings):
+    """Replace every user, movie and rating with synthetic ones (raw inserts, to keep setup short)."""
+    from django.contrib.auth.models import User
+    from django.db import connection, transaction
+    from django.utils import timezone
+
+    from web.models import Movie, Myrating
+
+    with connection.cursor() as cursor:  # skips the per-row delete signals
+        for table in (Myrating._meta.db_table, Movie._meta.db_table, User._meta.db_table):
+            cursor.execute(f'DELETE FROM {table}')
+    users = User.objects.bulk_create([User(username=f'bench-{i}') for i in range(num_users)], batch_size=5000)
+    movies = Movie.objects.bulk_create([Movie(title=f'Movie {i}') for i in range(num_movies)], batch_size=5000)
+    user_pks = np.array([user.pk for user in users])
+    movie_pks = np.array([movie.pk for movie in movies])
+
+    user_ids, movie_ids, ratings = synthetic_ratings(num_users, num_movies, num_ratings)
+    updated_at = connection.ops.adapt_datetimefield_value(timezone.now() - timezone.timedelta(days=1))
+    rows = zip(user_pks[user_ids - 1].tolist(), movie_pks[movie_ids - 1].tolist(), ratings.astype(int).tolist())
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO web_myrating (user_id, movie_id, rating, updated_at) VALUES (%s, %s, %s, %s)',
+            ((user, movie, rating, updated_at) for user, movie, rating in rows),
+        )
+    return len(ratings)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', default='tiny,ml-100k,ml-1m', help=f"Comma-separated, from {', '.join(SCALES)}")
+    parser.add_argument('--changed', type=int, default=1000, help="Ratings updated before the incremental export")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.db import connection
+
+    from web.models import Myrating
+    from web.recommendation import load_ratings_from_db
+    from web.snapshot import export_snapshot, load_snapshot
+
+    db_path = create_test_database('bench_snapshot')
+    print(f"{'scale':<8} {'ratings':>9} {'orm s':>7} {'export s':>9} {'incr s':>7} {'mmap s':>7} {'snapshot MB':>12}")
+    for scale in args.scales.split(','):
+        num_ratings = fill_database(*SCALES[scale])
+        with tempfile.TemporaryDirectory() as directory:
+            _, orm = timed(load_ratings_from_db)
+            _, export = timed(lambda: export_snapshot(directory, full=True))
+            for rating in Myrating.objects.order_by('?')[:args.changed]:
+                rating.rating = rating.rating % 5 + 1
+                rating.save(update_fields=['rating', 'updated_at'])
+            _, incremental = timed(lambda: export_snapshot(directory))
+            # Touch every mapped value so the read is actually done
+            _, mmap = timed(lambda: [int(np.asarray(column, dtype=np.int64).sum()) for column in load_snapshot(directory)])
+            size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"{scale:<8} {num_ratings:>9} {orm:>7.2f} {export:>9.2f} {incremental:>7.2f} {mmap:>7.3f} "
+              f"{size / 2 ** 20:>12.1f}")
+
+    connection.creation.destroy_test_db(db_path, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
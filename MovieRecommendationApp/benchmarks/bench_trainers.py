@@ -0,0 +1,64 @@
+"""
+Compare the CG and ALS trainers on synthetic MovieLens-sized data.
+
+    python -m benchmarks.bench_trainers --scale ml-100k
+
+Reports wall time, iterations and train/test RMSE for each trainer.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from .common import SCALES, setup_django, synthetic_ratings, train_test_split
+
+
+def rmse(X, Theta, Ymean, rows, cols, vals):
+    predictions = np.einsum('ij,ij->i', X[rows], Theta[cols]) + Ymean[rows]
+    return float(np.sqrt(np.mean((predictions - vals) ** 2)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='ml-100k')
+    parser.add_argument('--trainers', nargs='+', default=['cg', 'als'])
+    parser.add_argument('--features', type=int, default=10)
+    parser.add_argument('--reg', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from web.recommendation import build_rating_index, get_trainer, normalizeRatingsSparse
+
+    user_ids, movie_ids, ratings = synthetic_ratings(*SCALES[args.scale], seed=args.seed)
+    test = train_test_split(len(ratings), seed=args.seed)
+    rows, cols, vals, unique_movie_ids, unique_user_ids = build_rating_index(
+        user_ids[~test], movie_ids[~test], ratings[~test])
+    num_movies, num_users = len(unique_movie_ids), len(unique_user_ids)
+    vals_norm, Ymean = normalizeRatingsSparse(rows, vals, num_movies)
+    Ymean = Ymean.flatten()
+
+    # Held-out ratings whose user and movie both appear in the training split
+    test_rows = np.searchsorted(unique_movie_ids, movie_ids[test])
+    test_cols = np.searchsorted(unique_user_ids, user_ids[test])
+    known = (test_rows < num_movies) & (test_cols < num_users)
+    known[known] &= (unique_movie_ids[test_rows[known]] == movie_ids[test][known]) & \
+                    (unique_user_ids[test_cols[known]] == user_ids[test][known])
+    test_rows, test_cols, test_vals = test_rows[known], test_cols[known], ratings[test][known]
+
+    print(f"{args.scale}: {num_users} users x {num_movies} movies, "
+          f"{len(vals)} train / {len(test_vals)} test ratings, {args.features} features")
+    print(f"{'trainer':<8} {'seconds':>9} {'iters':>6} {'train RMSE':>11} {'test RMSE':>10}")
+    for name in args.trainers:
+        trainer = get_trainer(name)
+        started = time.perf_counter()
+        X, Theta = trainer.fit(rows, cols, vals_norm, num_movies, num_users, args.features,
+                               args.reg, np.random.default_rng(args.seed))
+        elapsed = time.perf_counter() - started
+        print(f"{name:<8} {elapsed:>9.2f} {trainer.n_iter_:>6} "
+              f"{rmse(X, Theta, Ymean, rows, cols, vals):>11.4f} "
+              f"{rmse(X, Theta, Ymean, test_rows, test_cols, test_vals):>10.4f}")
+
+
+if __name__ == '__main__':
+    main()
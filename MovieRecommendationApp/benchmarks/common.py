@@ -0,0 +1,86 @@
+"""
+Shared helpers for the offline benchmarks.
+
+Run benchmarks from the MovieRecommendationApp directory as modules, e.g.
+``python -m benchmarks.bench_trainers``. They need no network, and those that
+touch the database create a temporary one (create_test_database).
+"""
+import os
+import tempfile
+
+import numpy as np
+
+# MovieLens-like shapes: (num_users, num_movies, num_ratings)
+SCALES = {
+    'tiny': (200, 300, 5000),
+    'ml-100k': (943, 1682, 100000),
+    'ml-1m': (6040, 3706, 1000209),
+}
+
+
+def setup_django():
+    """web.recommendation imports the app's models, so Django must be configured first."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main.settings')
+    import django
+    django.setup()
+
+
+def create_test_database(name):
+    """
+    Point Django at a throwaway SQLite database in a temporary directory and
+    migrate it, for benchmarks that exercise views or the ORM. Returns its path,
+    for connection.creation.destroy_test_db(path).
+    """
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    settings.ALLOWED_HOSTS = ['testserver']
+    db_path = os.path.join(tempfile.mkdtemp(), f'{name}.sqlite3')
+    connection.settings_dict['TEST']['NAME'] = db_path
+    connection.creation.create_test_db(verbosity=0)
+    return db_path
+
+
+def synthetic_ratings(num_users, num_movies, num_ratings, rank=8, noise=0.5, seed=0):
+    """
+    Integer 1-5 ratings drawn from a random low-rank model plus noise.
+
+    Returns (user_ids, movie_ids, ratings) with unique (user, movie) pairs; movie
+    popularity is skewed (Zipf-like) as in real rating logs.
+    """
+    rng = np.random.default_rng(seed)
+    num_ratings = min(num_ratings, num_users * num_movies)
+
+    popularity = 1.0 / np.arange(1, num_movies + 1) ** 0.8
+    popularity /= popularity.sum()
+    seen = set()
+    user_ids = np.empty(num_ratings, dtype=np.int64)
+    movie_ids = np.empty(num_ratings, dtype=np.int64)
+    filled = 0
+    while filled < num_ratings:
+        batch = num_ratings - filled
+        users = rng.integers(0, num_users, size=batch)
+        movies = rng.choice(num_movies, size=batch, p=popularity)
+        keys = users * num_movies + movies
+        for key, user, movie in zip(keys.tolist(), users.tolist(), movies.tolist()):
+            if key not in seen and filled < num_ratings:
+                seen.add(key)
+                user_ids[filled] = user
+                movie_ids[filled] = movie
+                filled += 1
+
+    U = rng.normal(size=(num_users, rank)) / np.sqrt(rank)
+    M = rng.normal(size=(num_movies, rank)) / np.sqrt(rank)
+    bias = rng.normal(scale=0.5, size=num_movies)
+    raw = 3.5 + bias[movie_ids] + np.einsum('ij,ij->i', U[user_ids], M[movie_ids]) + rng.normal(scale=noise, size=num_ratings)
+    ratings = np.clip(np.rint(raw), 1, 5)
+    # Shift ids so they look like database primary keys (1-based)
+    return user_ids + 1, movie_ids + 1, ratings
+
+
+def train_test_split(num_ratings, test_fraction=0.1, seed=0):
+    """Boolean mask selecting the held-out test ratings."""
+    rng = np.random.default_rng(seed)
+    return rng.random(num_ratings) < test_fraction
@@ -0,0 +1,198 @@
+"""
+Offline evaluation of the recommender: speed, memory and accuracy as JSON.
+
+    python -m benchmarks.evaluate --scales tiny,ml-100k --trainers cg,als --output eval.json
+    python -m benchmarks.evaluate --compare before.json after.json
+
+For every scale and trainer, synthetic ratings are split into train and
+held-out sets and run through the train/predict pipeline of
+web.recommendation:
+
+* prepare: build_rating_index + normalizeRatingsSparse on the training split
+* train:   the trainer's fit (iterations, and whether it converged before max_iter)
+* predict: held-out RMSE, plus precision@k / recall@k of every user's top-k list
+           against their held-out ratings of --relevant stars or more
+
+Each case runs in a fresh child process, so its peak RSS is its own. The report
+records the git commit and library versions, so reports of two commits can be
+compared with --compare. Everything is generated locally; no network is needed.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from .common import SCALES, setup_django, synthetic_ratings, train_test_split
+
+SCHEMA_VERSION = 1
+# Reported metrics, and whether a larger value is better (for --compare)
+METRICS = {
+    'total_seconds': False,
+    'train_seconds': False,
+    'peak_rss_mb': False,
+    'iterations': False,
+    'test_rmse': False,
+    'precision_at_k': True,
+    'recall_at_k': True,
+}
+
+
+def run_case(scale, trainer_name, features, reg, k, relevant, test_fraction, seed):
+    """Train and evaluate one (scale, trainer) case in this process and return its result dict."""
+    setup_django()
+    from web.recommendation import (build_rating_index, get_trainer, index_held_out, normalizeRatingsSparse,
+                                    ranking_metrics, rmse)
+
+    user_ids, movie_ids, ratings = synthetic_ratings(*SCALES[scale], seed=seed)
+    test = train_test_split(len(ratings), test_fraction, seed=seed)
+
+    started = time.perf_counter()
+    rows, cols, vals, unique_movie_ids, unique_user_ids = build_rating_index(
+        user_ids[~test], movie_ids[~test], ratings[~test])
+    num_movies, num_users = len(unique_movie_ids), len(unique_user_ids)
+    vals_norm, Ymean = normalizeRatingsSparse(rows, vals, num_movies)
+    Ymean = Ymean.flatten()
+    prepared = time.perf_counter()
+
+    trainer = get_trainer(trainer_name)
+    X, Theta = trainer.fit(rows, cols, vals_norm, num_movies, num_users, features, reg, np.random.default_rng(seed))
+    trained = time.perf_counter()
+
+    test_rows, test_cols, known = index_held_out(unique_movie_ids, unique_user_ids, movie_ids[test], user_ids[test])
+    test_rows, test_cols, test_vals = test_rows[known], test_cols[known], ratings[test][known]
+    test_rmse = rmse(X, Theta, Ymean, test_rows, test_cols, test_vals)
+    precision, recall = ranking_metrics(X, Theta, Ymean, rows, cols, test_rows, test_cols, test_vals, k, relevant)
+    predicted = time.perf_counter()
+
+    return {
+        'scale': scale,
+        'trainer': trainer_name,
+        'num_users': num_users,
+        'num_movies': num_movies,
+        'train_ratings': len(vals),
+        'test_ratings': len(test_vals),
+        'prepare_seconds': prepared - started,
+        'train_seconds': trained - prepared,
+        'predict_seconds': predicted - trained,
+        'total_seconds': predicted - started,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'iterations': trainer.n_iter_,
+        'max_iter': trainer.max_iter,
+        'converged': trainer.n_iter_ < trainer.max_iter,
+        'train_rmse': rmse(X, Theta, Ymean, rows, cols, vals),
+        'test_rmse': test_rmse,
+        'precision_at_k': precision,
+        'recall_at_k': recall,
+    }
+
+
+def git_commit():
+    """Abbreviated HEAD commit, suffixed -dirty if the tree has uncommitted changes; None outside git."""
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty', '--abbrev=12'],
+                              check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    import scipy
+
+    return {
+        'commit': git_commit(),
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'platform': platform.platform(),
+        'cpus': len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count(),
+    }
+
+
+def compare(before_path, after_path):
+    """Print how each metric changed between two reports, per (scale, trainer)."""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    previous = {(r['scale'], r['trainer']): r for r in before['results']}
+    print(f"{before['environment']['commit'] or '?'} -> {after['environment']['commit'] or '?'} "
+          f"(+ better, - worse)")
+    print(f"{'scale':<8} {'trainer':<8} {'metric':<15} {'before':>10} {'after':>10} {'change':>8}")
+    for result in after['results']:
+        old = previous.get((result['scale'], result['trainer']))
+        if old is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            a, b = old[metric], result[metric]
+            change = (b - a) / abs(a) * 100 if a else float('nan')
+            better = (b > a) == higher_is_better if b != a else None
+            flag = '' if better is None else (' +' if better else ' -')
+            print(f"{result['scale']:<8} {result['trainer']:<8} {metric:<15} {a:>10.4g} {b:>10.4g} "
+                  f"{change:>+7.1f}%{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', default='tiny,ml-100k', help=f"Comma-separated, from {', '.join(SCALES)}")
+    parser.add_argument('--trainers', default='cg,als', help="Comma-separated trainer names")
+    parser.add_argument('--features', type=int, default=10)
+    parser.add_argument('--reg', type=float, default=1.0)
+    parser.add_argument('--k', type=int, default=10, help="List length for precision@k / recall@k")
+    parser.add_argument('--relevant', type=float, default=4, help="Held-out ratings this high count as relevant")
+    parser.add_argument('--test-fraction', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the JSON report here instead of to stdout")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="Compare two JSON reports")
+    parser.add_argument('--case', nargs=2, metavar=('SCALE', 'TRAINER'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare)
+
+    if args.case:
+        result = run_case(*args.case, args.features, args.reg, args.k, args.relevant, args.test_fraction, args.seed)
+        print(json.dumps(result))
+        return
+
+    config = {'features': args.features, 'reg': args.reg, 'k': args.k, 'relevant': args.relevant,
+              'test_fraction': args.test_fraction, 'seed': args.seed}
+    options = [f"--{name.replace('_', '-')}={value}" for name, value in config.items()]
+    results = []
+    for scale in args.scales.split(','):
+        for trainer in args.trainers.split(','):
+            # A child per case: fresh peak RSS, and no state carried between cases
+            child = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.evaluate', '--case', scale, trainer, *options],
+                check=True, capture_output=True, text=True,
+            )
+            result = json.loads(child.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(f"{scale} {trainer}: {result['total_seconds']:.2f}s, {result['iterations']} iterations, "
+                  f"test RMSE {result['test_rmse']:.4f}, precision@{args.k} {result['precision_at_k']:.4f}, "
+                  f"recall@{args.k} {result['recall_at_k']:.4f}, peak {result['peak_rss_mb']:.0f} MB",
+                  file=sys.stderr)
+
+    report = {
+        'schema': SCHEMA_VERSION,
+        'environment': environment(),
+        'config': config,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
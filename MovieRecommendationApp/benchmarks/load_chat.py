@@ -0,0 +1,140 @@
+"""
+Concurrent-user throughput of the sync chat view vs the async chat endpoints.
+
+    python -m benchmarks.load_chat --users 4,16,64 --latency 0.5
+
+Every simulated user sends --messages chat messages back to back. Gemini is
+replaced by FakeLLMClient with --latency seconds per call, and a throwaway
+SQLite test database holds the users, sessions and ChatMessage rows.
+
+* sync:  POST to chat_view; --workers threads stand in for the WSGI worker
+         pool, so each request holds a worker for the whole LLM call.
+* async: POST to the async send endpoint through the ASGI handler on one event
+         loop, with at most --limit concurrent upstream calls.
+* stream: the same through the streaming endpoint; its p50/p95 are time to the
+         first streamed chunk rather than to the full reply.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import threading
+import time
+
+from .common import create_test_database, setup_django
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+def make_users(num_users):
+    from django.contrib.auth.models import User
+    from web.models import ChatSession
+
+    users = []
+    for i in range(num_users):
+        user = User.objects.create_user(f'load-{time.monotonic_ns()}-{i}')
+        users.append((user, ChatSession.objects.create(user=user)))
+    return users
+
+
+def run_sync(users, messages, workers):
+    """Each user in its own thread; a semaphore of size workers plays the WSGI worker pool."""
+    from django.test import Client
+
+    pool = threading.BoundedSemaphore(workers)
+    latencies = []
+
+    def user_loop(user, session):
+        client = Client()
+        client.force_login(user)
+        for i in range(messages):
+            started = time.perf_counter()
+            with pool:
+                response = client.post(f'/chatbot/session/{session.id}/', {'message': f'hi {i}', 'session_id': session.id})
+            assert response.status_code == 200, response.status_code
+            latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=user_loop, args=pair) for pair in users]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies
+
+
+def run_async(users, messages, stream=False):
+    """Every user as a coroutine on one event loop; with stream=True, latency is time to the first chunk."""
+    from asgiref.sync import sync_to_async
+    from django.test import AsyncClient
+
+    latencies = []
+    url = '/chatbot/stream/' if stream else '/chatbot/send/'
+
+    async def user_loop(user, session):
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(user)
+        for i in range(messages):
+            started = time.perf_counter()
+            response = await client.post(url, {'message': f'hi {i}', 'session_id': session.id})
+            assert response.status_code == 200, response.status_code
+            if stream:
+                first = None
+                async for _ in response.streaming_content:
+                    first = first or time.perf_counter()
+                latencies.append(first - started)
+            else:
+                latencies.append(time.perf_counter() - started)
+
+    async def all_users():
+        await asyncio.gather(*(user_loop(*pair) for pair in users))
+
+    started = time.perf_counter()
+    asyncio.run(all_users())
+    return time.perf_counter() - started, latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', default='4,16,64', help="Comma-separated concurrent user counts")
+    parser.add_argument('--messages', type=int, default=3, help="Messages per user")
+    parser.add_argument('--latency', type=float, default=0.5, help="Fake LLM seconds per call")
+    parser.add_argument('--workers', type=int, default=4, help="Sync worker threads (WSGI pool size)")
+    parser.add_argument('--limit', type=int, default=32, help="Async cap on concurrent LLM calls")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.db import connection
+
+    from chatbot.bot import chatbot
+    from chatbot.llm import FakeLLMClient
+
+    db_path = create_test_database('load_chat')
+
+    # A movie-info sized answer (~800 characters), so streaming has something to stream
+    answer = 'Heat is a 1995 crime thriller written and directed by Michael Mann. ' * 12
+    chatbot.client = FakeLLMClient(lambda prompt: json.dumps({'movie_title': None, 'answer': answer}),
+                                   latency=args.latency)
+    chatbot.max_concurrent_calls = args.limit
+    chatbot.queue_timeout = 3600
+
+    print(f"fake LLM latency {args.latency}s, {args.messages} messages/user, "
+          f"{args.workers} sync workers, async limit {args.limit}")
+    print(f"{'mode':<6} {'users':>6} {'requests':>9} {'seconds':>8} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for num_users in [int(n) for n in args.users.split(',')]:
+        users = make_users(num_users)
+        for mode in ('sync', 'async', 'stream'):
+            if mode == 'sync':
+                elapsed, latencies = run_sync(users, args.messages, args.workers)
+            else:
+                elapsed, latencies = run_async(users, args.messages, stream=(mode == 'stream'))
+            print(f"{mode:<6} {num_users:>6} {len(latencies):>9} {elapsed:>8.2f} {len(latencies) / elapsed:>7.1f} "
+                  f"{percentile(latencies, 50) * 1000:>8.0f} {percentile(latencies, 95) * 1000:>8.0f}")
+
+    connection.creation.destroy_test_db(db_path, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,68 +1,601 @@
 # Simple chatbot implementation without chatterbot dependency
-import google.generativeai as genai
-from django.conf import settings
-import traceback
+import asyncio
+import hashlib
+import json
+import logging
 import random
+import re
+import threading
+import time
+import unicodedata
+import weakref
+from dataclasses import dataclass, field
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .context import clip_tokens, extractive_summary, get_summary_tokens
+from .llm import CircuitBreaker, GeminiClient, LLMError
+
+logger = logging.getLogger(__name__)
+
+
+STRUCTURED_PROMPT = """You are a friendly movie assistant. Reply with only a JSON object with two keys:
+"movie_title": the title of the movie the user's message is about, or null if it mentions no movie;
+"answer": your reply to the user.
+If a movie is mentioned, the answer should give detailed information about it: plot summary, release year,
+main actors/actresses, director, genre and critical reception, formatted as a friendly, conversational
+response as if you're recommending the movie. If you're not sure about this specific movie, make it clear
+that the information might not be completely accurate.
+If no movie is mentioned, answer the user's message in a friendly, conversational way.
+{context}User message: {message}"""
+
+CONTEXT_SECTION = """Use the conversation so far to work out what the user's message refers to
+(for example "it" or "that movie"), but answer only the user's message.
+{conversation}
+"""
+
+SUMMARY_PROMPT = """Summarize this conversation between a user and a movie assistant in at most {words} words.
+Keep the movies discussed, the user's tastes and any open questions; write plain text, no lists.
+{previous}Conversation:
+{conversation}"""
+
+
+def build_prompt(message, context=None):
+    """The structured prompt for message, with context's summary and recent turns if there are any."""
+    conversation = context.render() if context is not None else ''
+    section = CONTEXT_SECTION.format(conversation=conversation) if conversation else ''
+    return STRUCTURED_PROMPT.format(context=section, message=message)
+
+
+def parse_structured_reply(text):
+    """(movie_title or None, answer) from a structured reply; unparseable text is used as the answer."""
+    cleaned = text.strip()
+    if cleaned.startswith('```'):
+        cleaned = cleaned.strip('`')
+        cleaned = cleaned[cleaned.find('{'):] if '{' in cleaned else cleaned
+    try:
+        data = json.loads(cleaned)
+    except ValueError:
+        return None, text.strip()
+    if not isinstance(data, dict) or not isinstance(data.get('answer'), str):
+        return None, text.strip()
+    title = data.get('movie_title')
+    if not isinstance(title, str) or not title.strip() or title.strip().upper() == 'NO_MOVIE':
+        title = None
+    return (title.strip() if title else None), data['answer'].strip()
+
+
+class AnswerStreamDecoder:
+    """
+    Incrementally pulls the "answer" string out of a structured reply as it streams
+    in, so its text can be forwarded before the JSON is complete. A reply that
+    doesn't start as JSON is passed through unchanged.
+    """
+    ANSWER_START = re.compile(r'"answer"\s*:\s*"')
+    ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', '"': '"', '\\': '\\', '/': '/'}
+
+    def __init__(self):
+        self.buffer = ''
+        self.mode = None  # None until decided, then 'json' or 'raw'
+        self.pos = None   # next unread index inside the answer string
+        self.done = False
+        self.emitted = ''
+
+    def feed(self, chunk):
+        """New answer text made available by chunk ('' if none yet)."""
+        self.buffer += chunk
+        if self.mode is None:
+            head = self.buffer.lstrip()
+            if not head:
+                return ''
+            self.mode = 'json' if head[0] in '{`' else 'raw'
+        if self.mode == 'raw':
+            delta = chunk if self.emitted else self.buffer.lstrip()
+        else:
+            delta = self._decode()
+        self.emitted += delta
+        return delta
+
+    def _decode(self):
+        if self.done:
+            return ''
+        if self.pos is None:
+            match = self.ANSWER_START.search(self.buffer)
+            if match is None:
+                return ''
+            self.pos = match.end()
+        out = []
+        buf, i = self.buffer, self.pos
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self.done = True
+                i += 1
+                break
+            if ch != '\\':
+                out.append(ch)
+                i += 1
+                continue
+            if i + 1 >= len(buf):
+                break  # escape split across chunks
+            code = buf[i + 1]
+            if code == 'u':
+                if i + 6 > len(buf):
+                    break
+                out.append(chr(int(buf[i + 2:i + 6], 16)))
+                i += 6
+            else:
+                out.append(self.ESCAPES.get(code, code))
+                i += 2
+        self.pos = i
+        return ''.join(out)
+
+
+@dataclass
+class ChatReply:
+    text: str
+    movie_title: str = None
+    source: str = 'llm'  # 'llm', 'cache', 'fallback' or 'partial' (stream cut off)
+    timings: dict = field(default_factory=dict)  # stage -> seconds
+
+
+class StageLatency:
+    """Running count/total/max of per-stage latencies, shared across threads."""
 
-class SimpleChatBot:
     def __init__(self):
-        # Configure the Gemini API
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            count, total, worst = self._stats.get(stage, (0, 0.0, 0.0))
+            self._stats[stage] = (count + 1, total + seconds, max(worst, seconds))
+
+    def snapshot(self):
+        """{stage: {'count', 'mean_ms', 'max_ms'}}"""
+        with self._lock:
+            return {
+                stage: {'count': count, 'mean_ms': 1000 * total / count, 'max_ms': 1000 * worst}
+                for stage, (count, total, worst) in self._stats.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+def normalize_title(text):
+    """Cache key form of a title: no accents, case, punctuation, year suffix or leading article."""
+    text = ''.join(ch for ch in unicodedata.normalize('NFKD', text) if not unicodedata.combining(ch))
+    text = re.sub(r'\(\d{4}\)', ' ', text.lower())
+    text = ' '.join(re.findall(r'[^\W_]+', text))
+    return re.sub(r'^(the|a|an) ', '', text)
+
+
+# Plain requests for a movie's general info, in normalize_title form; anything
+# else ("who directed titanic") needs an answer the cached synopsis doesn't give
+INFO_REQUEST = re.compile(
+    r'^(?:(?:can|could) you |please )*'
+    r'(?:tell me (?:more )?about|what do you know about|what about|info(?:rmation)? (?:on|about)|about) '
+    r'(?P<title>.+)$'
+)
+INFO_REQUEST_FILLER = re.compile(
+    r'^(?:(?:the|a|an) )?(?:(?:movie|film) )?(?P<title>.+?)(?: (?:movie|film))?(?: please)?$'
+)
+
+
+def info_request_keys(message):
+    """
+    Normalized titles message could be asking for general info about: the whole
+    message (it is just a title), or what follows "tell me about" and the like.
+    Empty for any other message.
+    """
+    text = normalize_title(message)
+    if not text:
+        return []
+    keys = [text]
+    match = INFO_REQUEST.match(text)
+    if match:
+        title = match.group('title')
+        keys += [normalize_title(title), normalize_title(INFO_REQUEST_FILLER.match(title).group('title'))]
+    return list(dict.fromkeys(key for key in keys if key))
+
+
+class AnswerCache:
+    """
+    Movie-info answers keyed by normalized title, stored in Django's cache (shared
+    by every worker when CACHES is a shared backend). Entries expire after timeout
+    seconds; beyond max_entries titles the least recently used ones are evicted.
+    Each entry has a small last-used timestamp beside it, refreshed on every hit;
+    the index of cached titles is only rewritten when a title is added or dropped,
+    and eviction compares timestamps only then.
+
+    Only messages that are a title, or a plain request for info about one
+    ("tell me about Heat"), are answered from here or stored (info_request_keys);
+    a message that merely mentions a cached title gets a fresh answer.
+
+    Hit rate counts movie questions only: a hit is an answer served from here,
+    a miss is an LLM answer that named a movie (and was then cached).
+    """
+    PREFIX = 'chatbot:answer:'
+    INDEX_KEY = 'chatbot:answer-index'
+    HITS_KEY = 'chatbot:answer-hits'
+    MISSES_KEY = 'chatbot:answer-misses'
+
+    def __init__(self, max_entries=None, timeout=None, backend=None):
+        self.max_entries = max_entries or getattr(settings, 'CHATBOT_ANSWER_CACHE_SIZE', 500)
+        self.timeout = timeout or getattr(settings, 'CHATBOT_ANSWER_CACHE_TIMEOUT', 24 * 60 * 60)
+        self._backend = backend
+        # Serializes index read-modify-writes within this process; across workers a
+        # lost update can only briefly overfill the LRU or leave a stale index key, never lose answers
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return self._backend or cache
+
+    @classmethod
+    def cache_key(cls, key):
+        # Normalized titles contain spaces and can be long, which memcached rejects
+        return cls.PREFIX + hashlib.md5(key.encode()).hexdigest()
+
+    @classmethod
+    def used_key(cls, key):
+        return cls.cache_key(key) + ':used'
+
+    def _index(self):
+        return self.backend.get(self.INDEX_KEY) or []
+
+    def _touch(self, key):
+        """Mark key as just used: one small write, no index rewrite."""
+        self.backend.set(self.used_key(key), time.time(), self.timeout)
+
+    def _insert(self, key):
+        """Add key to the index, evicting the least recently used titles beyond max_entries."""
+        with self._lock:
+            index = [k for k in self._index() if k != key]
+            index.append(key)
+            evicted = []
+            if len(index) > self.max_entries:
+                used = self.backend.get_many([self.used_key(k) for k in index])
+                # Oldest first; titles without a timestamp have expired, and ties keep insertion order
+                by_age = sorted(range(len(index)), key=lambda i: used.get(self.used_key(index[i]), 0.0))
+                dropped = set(by_age[:len(index) - self.max_entries])
+                evicted = [k for i, k in enumerate(index) if i in dropped]
+                index = [k for i, k in enumerate(index) if i not in dropped]
+            self.backend.set(self.INDEX_KEY, index, None)
+        if evicted:
+            self.backend.delete_many([self.cache_key(k) for k in evicted] + [self.used_key(k) for k in evicted])
+
+    def _forget(self, key):
+        with self._lock:
+            self.backend.set(self.INDEX_KEY, [k for k in self._index() if k != key], None)
+        self.backend.delete(self.used_key(key))
+
+    def _count(self, key):
+        if not self.backend.add(key, 1, None):
+            try:
+                self.backend.incr(key)
+            except ValueError:  # expired between add and incr
+                self.backend.add(key, 1, None)
+
+    def _entry(self, key):
+        entry = self.backend.get(self.cache_key(key)) if key else None
+        if entry is not None:
+            self._touch(key)
+        return entry
+
+    def get(self, title):
+        """Cached answer for title, or None."""
+        entry = self._entry(normalize_title(title))
+        return entry['answer'] if entry else None
+
+    def set(self, title, answer):
+        key = normalize_title(title)
+        if key:
+            self.backend.set(self.cache_key(key), {'title': title, 'answer': answer}, self.timeout)
+            self._touch(key)
+            self._insert(key)
+
+    @staticmethod
+    def asks_about(message, title):
+        """Whether message is a plain info request for exactly title."""
+        key = normalize_title(title)
+        return bool(key) and key in info_request_keys(message)
+
+    def lookup_message(self, message):
+        """(title, answer) if message is an info request for a cached title, else None."""
+        keys = info_request_keys(message)
+        if not keys:
+            return None
+        indexed = set(self._index())
+        for key in keys:
+            if key not in indexed:
+                continue
+            entry = self._entry(key)
+            if entry is not None:
+                return entry['title'], entry['answer']
+            self._forget(key)  # expired; drop it from the index
+        return None
+
+    def record_hit(self):
+        self._count(self.HITS_KEY)
+
+    def record_miss(self):
+        self._count(self.MISSES_KEY)
+
+    def stats(self):
+        hits = self.backend.get(self.HITS_KEY) or 0
+        misses = self.backend.get(self.MISSES_KEY) or 0
+        total = hits + misses
+        return {
+            'hits': hits, 'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+            'entries': len(self._index()), 'max_entries': self.max_entries,
+        }
+
+    def clear(self):
+        index = self._index()
+        keys = [self.cache_key(k) for k in index] + [self.used_key(k) for k in index]
+        self.backend.delete_many(keys + [self.INDEX_KEY, self.HITS_KEY, self.MISSES_KEY])
+
+
+class ChatStream:
+    """Async iterator over a reply's text chunks; .reply is set once it is exhausted."""
+
+    def __init__(self, bot, input_text, context=None):
+        self.reply = None
+        self._chunks = bot._astream(input_text, self, context)
+
+    def __aiter__(self):
+        return self._chunks
+
+
+class SimpleChatBot:
+    """
+    Answers each message with a single structured LLM call that both identifies
+    the movie (if any) and writes the reply, given an optional
+    ConversationContext (chatbot.context) of earlier turns. Questions about a movie already in
+    the answer cache are served from it without any call. Upstream health is
+    tracked by a circuit breaker rather than probed per message; while it is
+    open, replies come from get_fallback_response without calling the LLM.
+    """
+    STREAM_INTERRUPTED = "(Sorry, I lost my connection partway through that answer. Please ask again.)"
+
+    def __init__(self, client=None, breaker=None, answer_cache=None, max_concurrent_calls=None, queue_timeout=None):
+        if client is None:
+            try:
+                client = GeminiClient()
+            except Exception as e:
+                logger.error("Error initializing Gemini API: %s", e)
+        self.client = client
+        self.breaker = breaker or CircuitBreaker()
+        self.answers = answer_cache or AnswerCache()
+        self.latency = StageLatency()
+        # arespond() only: cap on concurrent upstream calls per event loop, and how
+        # long a message may wait for a slot before getting a fallback reply
+        self.max_concurrent_calls = max_concurrent_calls or getattr(settings, 'CHATBOT_MAX_CONCURRENT_LLM_CALLS', 8)
+        self.queue_timeout = queue_timeout or getattr(settings, 'CHATBOT_LLM_QUEUE_TIMEOUT', 10)
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    @property
+    def api_available(self):
+        return self.client is not None and self.breaker.state != CircuitBreaker.OPEN
+
+    def respond(self, input_text, context=None):
+        """ChatReply for input_text, with per-stage timings."""
+        started = time.perf_counter()
+        return self._finish(self._respond(input_text, context), started)
+
+    async def arespond(self, input_text, context=None):
+        """respond() for async views: awaits the client and never blocks the event loop."""
+        started = time.perf_counter()
+        return self._finish(await self._arespond(input_text, context), started)
+
+    def _finish(self, reply, started):
+        reply.timings['total'] = time.perf_counter() - started
+        for stage, seconds in reply.timings.items():
+            self.latency.record(stage, seconds)
+        logger.debug("chatbot reply via %s: %s", reply.source,
+                     ', '.join(f'{stage}={seconds * 1000:.1f}ms' for stage, seconds in reply.timings.items()))
+        return reply
+
+    def _respond(self, input_text, context):
+        timings = {}
+        reply = self._cached_reply(input_text, timings)
+        if reply is not None:
+            return reply
+        if self.client is None or not self.breaker.allow():
+            return self._fallback(input_text, timings)
+
+        started = time.perf_counter()
         try:
-            genai.configure(api_key=settings.GOOGLE_AI_API_KEY)
-            # Using gemini-1.5-flash which has higher quota limits than gemini-1.5-pro
-            # This should help avoid quota exceeded errors
-            self.model = genai.GenerativeModel('models/gemini-1.5-flash')
-            self.api_available = True
+            raw = self.client.generate(build_prompt(input_text, context), json_output=True)
         except Exception as e:
-            print(f"Error initializing Gemini API: {e}")
-            self.api_available = False
-    
-    def get_response(self, input_text):
-        # If API is not available, use fallback responses
-        if not self.api_available:
-            return self.get_fallback_response(input_text)
-            
+            return self._llm_failed(input_text, e, started, timings)
+        return self._llm_reply(input_text, raw, started, timings)
+
+    async def _arespond(self, input_text, context):
+        timings = {}
+        # The answer cache may be a network backend, so it is read off the event loop
+        reply = await sync_to_async(self._cached_reply, thread_sensitive=False)(input_text, timings)
+        if reply is not None:
+            return reply
+        if self.client is None:
+            return self._fallback(input_text, timings)
+
+        semaphore = await self._acquire_slot(timings)
+        if semaphore is None:
+            return self._fallback(input_text, timings)
         try:
-            # Test if the API is working
-            test_response = self.model.generate_content("Hello")
-            if not test_response or not hasattr(test_response, 'text'):
-                raise Exception("API test failed - no valid response")
-                
-            # Phase 1: Use Gemini to extract the movie title from the user's query
-            prompt = f"From the following text, extract only the movie title. If no movie title is mentioned, respond with 'NO_MOVIE'. Text: '{input_text}'"
-            response = self.model.generate_content(prompt)
-            movie_title = response.text.strip()
-
-            if 'NO_MOVIE' in movie_title or not movie_title:
-                # If no movie is found, fall back to a general conversation with Gemini
-                response = self.model.generate_content(f"Answer this user query in a friendly, conversational way: {input_text}")
-                return response.text
-
-            # Phase 2: Use Gemini to get movie information directly
-            movie_prompt = f"""
-            Provide detailed information about the movie "{movie_title}" including:
-            1. Plot summary
-            2. Release year
-            3. Main actors/actresses
-            4. Director
-            5. Genre
-            6. Critical reception
-            
-            Format this as a friendly, conversational response as if you're recommending this movie to someone.
-            If you're not sure about this specific movie, make it clear that you're providing general information
-            that might not be completely accurate.
-            """
-            
-            # Get movie information from Gemini
-            movie_response = self.model.generate_content(movie_prompt)
-            return movie_response.text
+            # Checked once a slot is held, so a half-open trial call is never left pending
+            if not self.breaker.allow():
+                return self._fallback(input_text, timings)
+            started = time.perf_counter()
+            try:
+                raw = await self._agenerate(build_prompt(input_text, context))
+            except Exception as e:
+                return self._llm_failed(input_text, e, started, timings)
+        finally:
+            semaphore.release()
+        return await sync_to_async(self._llm_reply, thread_sensitive=False)(input_text, raw, started, timings)
+
+    def astream(self, input_text, context=None):
+        """
+        ChatStream for input_text: async-iterate it for chunks of the answer as the
+        LLM produces them; afterwards its .reply holds the final ChatReply.
+        """
+        return ChatStream(self, input_text, context)
 
+    async def _astream(self, input_text, stream, context):
+        """Async generator of answer chunks; stores the final ChatReply on stream.reply."""
+        started = time.perf_counter()
+        timings = {}
+        reply = await sync_to_async(self._cached_reply, thread_sensitive=False)(input_text, timings)
+        if reply is None and self.client is not None:
+            semaphore = await self._acquire_slot(timings)
+            if semaphore is not None:
+                try:
+                    async for chunk in self._astream_llm(input_text, build_prompt(input_text, context), timings, stream):
+                        yield chunk
+                finally:
+                    semaphore.release()
+                reply = stream.reply
+        if reply is None:
+            reply = self._fallback(input_text, timings)
+        if reply.source in ('cache', 'fallback'):
+            yield reply.text
+        stream.reply = self._finish(reply, started)
+
+    async def _astream_llm(self, input_text, prompt, timings, stream):
+        """Stream one LLM call's answer, leaving its ChatReply on stream.reply (None if the breaker is open)."""
+        # Checked once a slot is held, so a half-open trial call is never left pending
+        if not self.breaker.allow():
+            return
+        decoder = AnswerStreamDecoder()
+        raw = []
+        started = time.perf_counter()
+        try:
+            async for chunk in self._astream_client(prompt):
+                raw.append(chunk)
+                delta = decoder.feed(chunk)
+                if delta:
+                    timings.setdefault('first_token', time.perf_counter() - started)
+                    yield delta
         except Exception as e:
-            # Handle potential API errors gracefully
-            print(f"Error in SimpleChatBot: {e}")
-            print(traceback.format_exc())
-            self.api_available = False  # Mark API as unavailable after an error
-            return self.get_fallback_response(input_text)
+            stream.reply = self._llm_failed(input_text, e, started, timings)
+            if decoder.emitted:  # keep what the user has already seen
+                yield '\n\n' + self.STREAM_INTERRUPTED
+                stream.reply = ChatReply(decoder.emitted + '\n\n' + self.STREAM_INTERRUPTED,
+                                         source='partial', timings=timings)
+            return
+        except BaseException:  # the consumer went away mid-call
+            self.breaker.cancel()
+            raise
+
+        reply = await sync_to_async(self._llm_reply, thread_sensitive=False)(input_text, ''.join(raw), started, timings)
+        # The parsed answer is authoritative; send whatever the decoder didn't
+        sent = decoder.emitted.strip()
+        if reply.source == 'llm' and reply.text.startswith(sent) and reply.text != sent:
+            yield reply.text[len(sent):]
+        stream.reply = reply
+
+    async def _acquire_slot(self, timings):
+        """Wait for an upstream-call slot; returns the semaphore to release, or None on timeout."""
+        started = time.perf_counter()
+        semaphore = self._semaphore()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("No free LLM slot after %ss; sending a fallback reply", self.queue_timeout)
+            semaphore = None
+        timings['queue'] = time.perf_counter() - started
+        return semaphore
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrent_calls)
+        return semaphore
+
+    async def _agenerate(self, prompt):
+        agenerate = getattr(self.client, 'agenerate', None)
+        if agenerate is None:  # sync-only client: run it in a worker thread
+            return await sync_to_async(self.client.generate, thread_sensitive=False)(prompt, json_output=True)
+        return await agenerate(prompt, json_output=True)
+
+    async def _astream_client(self, prompt):
+        astream = getattr(self.client, 'astream', None)
+        if astream is None:  # client can't stream: the whole reply arrives as one chunk
+            yield await self._agenerate(prompt)
+            return
+        async for chunk in astream(prompt, json_output=True):
+            yield chunk
+
+    def _cached_reply(self, input_text, timings):
+        started = time.perf_counter()
+        cached = self.answers.lookup_message(input_text)
+        timings['cache'] = time.perf_counter() - started
+        if cached is None:
+            return None
+        self.answers.record_hit()
+        title, answer = cached
+        return ChatReply(answer, movie_title=title, source='cache', timings=timings)
+
+    def _fallback(self, input_text, timings):
+        return ChatReply(self.get_fallback_response(input_text), source='fallback', timings=timings)
+
+    def _llm_failed(self, input_text, error, started, timings):
+        # Handle potential API errors gracefully
+        logger.warning("Chatbot LLM call failed: %s", error, exc_info=not isinstance(error, LLMError))
+        self.breaker.record_failure()
+        timings['llm'] = time.perf_counter() - started
+        return self._fallback(input_text, timings)
+
+    def _llm_reply(self, input_text, raw, started, timings):
+        self.breaker.record_success()
+        timings['llm'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        movie_title, answer = parse_structured_reply(raw or '')
+        timings['parse'] = time.perf_counter() - started
+        if not answer:
+            return self._fallback(input_text, timings)
+        # Only a plain info request for this very title gets the general answer the
+        # cache hands out; follow-ups and specific questions ("who directed it?") don't
+        if movie_title and self.answers.asks_about(input_text, movie_title):
+            self.answers.record_miss()
+            self.answers.set(movie_title, answer)
+        return ChatReply(answer, movie_title=movie_title, timings=timings)
+
+    def summarize(self, previous, turns):
+        """
+        Summarizer for chatbot.context.refresh_summary: previous summary plus turns,
+        condensed by the LLM, or extractively while it is unavailable.
+        """
+        max_tokens = get_summary_tokens()
+        if self.client is not None and self.breaker.allow():
+            prompt = SUMMARY_PROMPT.format(
+                words=max_tokens * 3 // 4,
+                previous=f"Summary so far: {previous}\n" if previous else '',
+                conversation='\n'.join(f"{'User' if is_user else 'Assistant'}: {text}" for is_user, text in turns),
+            )
+            try:
+                summary = self.client.generate(prompt).strip()
+            except Exception as e:
+                logger.warning("Chatbot summary call failed: %s", e, exc_info=not isinstance(e, LLMError))
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+                if summary:
+                    return clip_tokens(summary, max_tokens)
+        return extractive_summary(previous, turns, max_tokens)
+
+    def get_response(self, input_text):
+        return self.respond(input_text).text
     
     def get_fallback_response(self, input_text):
         """Provide a fallback response when the API is not available"""
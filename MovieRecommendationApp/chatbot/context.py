@@ -0,0 +1,229 @@
+"""
+Token-budgeted conversation context for the chatbot.
+
+Sending a session's whole ChatMessage history with every message would make
+prompt size (and LLM latency) grow without limit. build_context() instead takes
+the newest turns that fit CHATBOT_CONTEXT_TOKENS, walking back from the end of
+the session one small batch at a time, and prepends the session's rolling
+summary of everything older. CHATBOT_SUMMARY_TOKENS of the budget are always
+kept for the summary, so the window doesn't shift when a summary appears.
+
+The summary lives on ChatSession: ``summary`` covers every message with
+``id <= summarized_through``. Once the turns that have fallen out of the window
+but are not yet summarized add up to CHATBOT_SUMMARY_BATCH_TOKENS,
+refresh_summary() folds just those turns into the existing summary, so each
+refresh costs the same however long the transcript gets. Token counts are
+estimated (about four characters per token) rather than exact.
+"""
+import logging
+import threading
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Sum
+from django.db.models.functions import Length
+
+from web.models import ChatMessage, ChatSession
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+TURN_OVERHEAD_TOKENS = 2  # the "User: " / "Assistant: " label and newline
+FETCH_BATCH = 50
+
+
+def get_context_tokens():
+    return getattr(settings, 'CHATBOT_CONTEXT_TOKENS', 1500)
+
+
+def get_summary_tokens():
+    return getattr(settings, 'CHATBOT_SUMMARY_TOKENS', 300)
+
+
+def get_summary_batch_tokens():
+    return getattr(settings, 'CHATBOT_SUMMARY_BATCH_TOKENS', 400)
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1 if text else 0
+
+
+def turn_tokens(text):
+    return estimate_tokens(text) + TURN_OVERHEAD_TOKENS
+
+
+def summary_budget(budget):
+    """Tokens reserved for the summary out of a context budget."""
+    return min(get_summary_tokens(), budget // 2)
+
+
+def clip_tokens(text, tokens):
+    """text cut to at most tokens estimated tokens, keeping the end (the most recent part)."""
+    limit = max(tokens - 1, 1) * CHARS_PER_TOKEN
+    return text if len(text) <= limit else '…' + text[-(limit - 1):]
+
+
+@dataclass
+class ConversationContext:
+    summary: str = ''
+    turns: list = field(default_factory=list)  # (is_user, text), oldest first
+    window_start_id: int = None  # id of the oldest message in turns
+    overflow_tokens: int = 0  # unsummarized turns older than the window
+
+    @property
+    def tokens(self):
+        return estimate_tokens(self.summary) + sum(turn_tokens(text) for _, text in self.turns)
+
+    def render(self):
+        """The context as prompt text, or '' for a new conversation."""
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of the earlier conversation: {self.summary}")
+        if self.turns:
+            parts.append("Recent conversation:\n" + '\n'.join(
+                f"{'User' if is_user else 'Assistant'}: {text}" for is_user, text in self.turns
+            ))
+        return '\n'.join(parts)
+
+
+def build_context(session, budget=None):
+    """
+    ConversationContext holding session's summary and the newest turns that fit in
+    budget tokens (default CHATBOT_CONTEXT_TOKENS). Call it before saving the
+    message being answered, so that message isn't repeated in its own context.
+    """
+    budget = budget or get_context_tokens()
+    reserved = summary_budget(budget)
+    summary = clip_tokens(session.summary, reserved) if session.summary else ''
+    remaining = budget - reserved
+    unsummarized = ChatMessage.objects.filter(session_id=session.id, id__gt=session.summarized_through)
+
+    turns = []
+    full = False
+    before = None
+    while not full:
+        page = unsummarized if before is None else unsummarized.filter(id__lt=before)
+        batch = list(page.order_by('-id').values_list('id', 'is_user', 'message_text')[:FETCH_BATCH])
+        for pk, is_user, text in batch:
+            cost = turn_tokens(text)
+            if cost > remaining:
+                full = True
+                if turns:
+                    break
+                # The newest message alone is over budget: keep its end rather than nothing
+                text = clip_tokens(text, remaining - TURN_OVERHEAD_TOKENS)
+            turns.append((pk, is_user, text))
+            remaining -= cost
+        if len(batch) < FETCH_BATCH:
+            break
+        before = batch[-1][0]
+    turns.reverse()
+
+    context = ConversationContext(summary=summary, turns=[(is_user, text) for _, is_user, text in turns])
+    if turns:
+        context.window_start_id = turns[0][0]
+    if full:
+        older = unsummarized.filter(id__lt=context.window_start_id).aggregate(
+            chars=Sum(Length('message_text')), count=Count('id'),
+        )
+        if older['count']:
+            context.overflow_tokens = older['chars'] // CHARS_PER_TOKEN + older['count'] * (TURN_OVERHEAD_TOKENS + 1)
+    return context
+
+
+def extractive_summary(previous, turns, max_tokens=None):
+    """
+    Summary without an LLM: the previous summary plus one shortened line per turn,
+    dropping the oldest lines once it is over max_tokens.
+    """
+    max_tokens = max_tokens or get_summary_tokens()
+    lines = previous.splitlines() if previous else []
+    for is_user, text in turns:
+        text = ' '.join(text.split())
+        limit = 160 if is_user else 80
+        if len(text) > limit:
+            text = text[:limit - 1] + '…'
+        lines.append(f"{'User' if is_user else 'Assistant'}: {text}")
+    while len(lines) > 1 and estimate_tokens('\n'.join(lines)) > max_tokens:
+        lines.pop(0)
+    return clip_tokens('\n'.join(lines), max_tokens)
+
+
+def refresh_summary(session_id, summarize=extractive_summary, budget=None):
+    """
+    Fold the session's unsummarized turns older than the context window into its
+    summary. summarize(previous_summary, turns) -> str is called once per
+    budget-sized chunk of turns. Returns True if the summary was updated; False
+    if there was nothing to fold or another worker updated it first.
+    """
+    session = ChatSession.objects.get(id=session_id)
+    context = build_context(session, budget)
+    if not context.overflow_tokens:
+        return False
+
+    summary, summarized_through = session.summary, session.summarized_through
+    chunk_tokens = budget = budget or get_context_tokens()
+    chunk, tokens, last_id = [], 0, summarized_through
+    rows = (ChatMessage.objects
+            .filter(session_id=session_id, id__gt=summarized_through, id__lt=context.window_start_id)
+            .order_by('id').values_list('id', 'is_user', 'message_text'))
+    for pk, is_user, text in rows.iterator():
+        chunk.append((is_user, text))
+        tokens += turn_tokens(text)
+        last_id = pk
+        if tokens >= chunk_tokens:
+            summary = summarize(summary, chunk)
+            chunk, tokens = [], 0
+    if chunk:
+        summary = summarize(summary, chunk)
+
+    # Only applies if nobody else advanced the summary since it was read
+    updated = ChatSession.objects.filter(id=session_id, summarized_through=summarized_through).update(
+        summary=clip_tokens(summary, summary_budget(budget)), summarized_through=last_id,
+    )
+    return updated == 1
+
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _refresh_in_background(session_id, summarize):
+    try:
+        refresh_summary(session_id, summarize)
+    except Exception:
+        logger.exception("Summarizing chat session %s failed", session_id)
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(session_id)
+        connection.close()
+
+
+def start_background_summary(session_id, summarize=extractive_summary):
+    """
+    Run refresh_summary in a daemon thread unless one is already running for this
+    session in this process. Returns the thread, or None.
+    """
+    with _refreshing_lock:
+        if session_id in _refreshing:
+            return None
+        _refreshing.add(session_id)
+    thread = threading.Thread(target=_refresh_in_background, args=(session_id, summarize),
+                              name=f'chat-summary-{session_id}', daemon=True)
+    thread.start()
+    return thread
+
+
+def summarize_if_needed(session_id, context, summarize=extractive_summary):
+    """
+    Refresh the session's summary once enough turns have overflowed context's
+    window: in the background by default, inline if CHATBOT_SUMMARY_IN_BACKGROUND
+    is False. Returns the background thread, if one was started.
+    """
+    if context.overflow_tokens < get_summary_batch_tokens():
+        return None
+    if getattr(settings, 'CHATBOT_SUMMARY_IN_BACKGROUND', True):
+        return start_background_summary(session_id, summarize)
+    refresh_summary(session_id, summarize)
+    return None
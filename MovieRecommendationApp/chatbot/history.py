@@ -0,0 +1,60 @@
+"""
+Keyset pagination for chat history and the session sidebar.
+
+Pages are fetched newest first with a (timestamp, id) cursor, so every page is
+one index range scan (ChatMessage(session, timestamp), ChatSession(user,
+start_time)) of a fixed size, however long the history is. Cursors are opaque
+strings "<microseconds since epoch>-<id>".
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from web.models import ChatMessage, ChatSession
+
+MESSAGES_PER_PAGE = 30
+SESSIONS_PER_PAGE = 30
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_cursor(moment, pk):
+    return f'{(moment - EPOCH) // timedelta(microseconds=1)}-{pk}'
+
+
+def decode_cursor(cursor):
+    """(datetime, id) from encode_cursor's output, or None if cursor is empty or malformed."""
+    try:
+        micros, pk = (int(part) for part in cursor.split('-'))
+    except (AttributeError, ValueError):
+        return None
+    return EPOCH + timedelta(microseconds=micros), pk
+
+
+def _page(queryset, field, before, limit):
+    """Up to limit rows older than the before cursor, newest first, plus the cursor for the next page."""
+    position = decode_cursor(before) if before else None
+    if position is not None:
+        moment, pk = position
+        # (field, id) < (moment, pk), phrased so the index serves it as a range on field
+        queryset = queryset.filter(**{f'{field}__lte': moment}).exclude(**{field: moment, 'id__gte': pk})
+    # One extra row tells us whether there is an older page
+    rows = list(queryset.order_by(f'-{field}', '-id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(getattr(rows[-1], field), rows[-1].id) if has_more else None
+    return rows, next_cursor
+
+
+def message_page(session, before=None, limit=MESSAGES_PER_PAGE):
+    """(messages oldest first, cursor for older messages or None) ending just before the cursor."""
+    messages, next_cursor = _page(ChatMessage.objects.filter(session=session), 'timestamp', before, limit)
+    messages.reverse()
+    return messages, next_cursor
+
+
+def session_page(user, before=None, limit=SESSIONS_PER_PAGE):
+    """(sessions newest first, cursor for older sessions or None)."""
+    return _page(ChatSession.objects.filter(user=user), 'start_time', before, limit)
+
+
+def latest_session(user):
+    return ChatSession.objects.filter(user=user).order_by('-start_time', '-id').first()
@@ -0,0 +1,186 @@
+"""
+LLM clients and upstream health tracking for the chatbot.
+
+SimpleChatBot talks to any object with a ``generate(prompt, json_output=False)``
+method returning the reply text, plus optionally a coroutine ``agenerate`` and
+an async generator ``astream`` (yielding text chunks) with the same signature
+for the async chat endpoints. GeminiClient is the production client;
+FakeLLMClient answers locally, so tests and benchmarks run without network or
+API quota. CircuitBreaker replaces a per-message health probe: after a run of
+failures it stops calling upstream for a cool-down period, then lets a single
+trial call through to decide whether to close again.
+"""
+import asyncio
+import json
+import threading
+import time
+
+from django.conf import settings
+
+try:
+    import google.generativeai as genai
+except ImportError:  # only needed for the real Gemini client
+    genai = None
+
+
+class LLMError(Exception):
+    """The LLM client could not produce a reply."""
+
+
+class GeminiClient:
+    def __init__(self, api_key=None, model_name=None, timeout=None):
+        if genai is None:
+            raise LLMError("google-generativeai is not installed")
+        genai.configure(api_key=api_key or settings.GOOGLE_AI_API_KEY)
+        # gemini-1.5-flash has higher quota limits than gemini-1.5-pro
+        self.model = genai.GenerativeModel(model_name or getattr(settings, 'CHATBOT_MODEL', 'models/gemini-1.5-flash'))
+        self.timeout = timeout or getattr(settings, 'CHATBOT_LLM_TIMEOUT', 20)
+
+    def generate(self, prompt, json_output=False):
+        config = {'response_mime_type': 'application/json'} if json_output else None
+        try:
+            response = self.model.generate_content(
+                prompt, generation_config=config, request_options={'timeout': self.timeout},
+            )
+            return response.text
+        except Exception as e:
+            raise LLMError(str(e)) from e
+
+    async def agenerate(self, prompt, json_output=False):
+        config = {'response_mime_type': 'application/json'} if json_output else None
+        try:
+            response = await self.model.generate_content_async(
+                prompt, generation_config=config, request_options={'timeout': self.timeout},
+            )
+            return response.text
+        except Exception as e:
+            raise LLMError(str(e)) from e
+
+    async def astream(self, prompt, json_output=False):
+        """Yield the reply text in chunks as Gemini generates it."""
+        config = {'response_mime_type': 'application/json'} if json_output else None
+        try:
+            response = await self.model.generate_content_async(
+                prompt, generation_config=config, request_options={'timeout': self.timeout}, stream=True,
+            )
+            async for chunk in response:
+                yield chunk.text
+        except Exception as e:
+            raise LLMError(str(e)) from e
+
+
+class FakeLLMClient:
+    """
+    Local stand-in for GeminiClient.
+
+    handler(prompt) -> str builds each reply; by default the reply is a
+    structured answer that echoes the prompt's user message. latency (seconds)
+    is slept per call, and fail=True makes every call raise LLMError. astream()
+    yields the reply in chunk_size pieces and, with fail_after_chunks, breaks
+    off after that many.
+    """
+
+    def __init__(self, handler=None, latency=0.0, fail=False, chunk_size=16, fail_after_chunks=None):
+        self.handler = handler or self.default_reply
+        self.latency = latency
+        self.fail = fail
+        self.chunk_size = chunk_size
+        self.fail_after_chunks = fail_after_chunks
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def default_reply(prompt):
+        message = prompt.rsplit('User message:', 1)[-1].strip()
+        return json.dumps({'movie_title': None, 'answer': f'You said: {message}'})
+
+    @property
+    def calls(self):
+        return len(self.prompts)
+
+    def generate(self, prompt, json_output=False):
+        with self._lock:
+            self.prompts.append(prompt)
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail:
+            raise LLMError("fake upstream failure")
+        return self.handler(prompt)
+
+    async def agenerate(self, prompt, json_output=False):
+        with self._lock:
+            self.prompts.append(prompt)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail:
+            raise LLMError("fake upstream failure")
+        return self.handler(prompt)
+
+    async def astream(self, prompt, json_output=False):
+        """The reply in chunk_size pieces, with latency spread evenly across them."""
+        with self._lock:
+            self.prompts.append(prompt)
+        if self.fail:
+            raise LLMError("fake upstream failure")
+        reply = self.handler(prompt)
+        chunks = [reply[i:i + self.chunk_size] for i in range(0, len(reply), self.chunk_size)] or ['']
+        for i, chunk in enumerate(chunks):
+            if self.latency:
+                await asyncio.sleep(self.latency / len(chunks))
+            if self.fail_after_chunks is not None and i >= self.fail_after_chunks:
+                raise LLMError("fake stream interrupted")
+            yield chunk
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. After failure_threshold consecutive failures it
+    opens and allow() is False for reset_timeout seconds; then one trial call is
+    allowed (half-open), whose outcome closes or re-opens the breaker.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, failure_threshold=None, reset_timeout=None, clock=time.monotonic):
+        self.failure_threshold = failure_threshold or getattr(settings, 'CHATBOT_BREAKER_FAILURES', 3)
+        self.reset_timeout = reset_timeout if reset_timeout is not None else getattr(settings, 'CHATBOT_BREAKER_RESET_SECONDS', 30)
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self._trial_running = False
+
+    def cancel(self):
+        """The allowed call was abandoned before it finished; count it as neither outcome."""
+        with self._lock:
+            self._trial_running = False
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from chatbot.bot import AnswerCache
+
+
+class Command(BaseCommand):
+    help = "Show hit-rate metrics for the chatbot's movie-answer cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help="Drop all cached answers and reset the counters.")
+
+    def handle(self, *args, **options):
+        answers = AnswerCache()
+        stats = answers.stats()
+        self.stdout.write(
+            f"{stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate); "
+            f"{stats['entries']}/{stats['max_entries']} titles cached."
+        )
+        if options['clear']:
+            answers.clear()
+            self.stdout.write(self.style.SUCCESS("Cleared the answer cache."))
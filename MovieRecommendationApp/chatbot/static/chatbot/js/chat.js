@@ -20,44 +20,119 @@ $(document).ready(function() {
         // Scroll to the bottom
         scrollToBottom();
         
-        // Send the message to the server
-        $.ajax({
-            type: 'POST',
-            url: window.location.pathname,
-            data: {
-                'message': userInput,
-                'session_id': sessionId,
-                'csrfmiddlewaretoken': $('input[name="csrfmiddlewaretoken"]').val()
-            },
-            success: function(data) {
-                // Add bot response to the chat box
-                addMessage(data.response, false);
-                
-                // Scroll to the bottom
-                scrollToBottom();
-            },
-            error: function(xhr, status, error) {
-                console.error('Error sending message:', error);
-                addMessage('Sorry, there was an error processing your request.', false);
-                scrollToBottom();
-            }
+        // Send the message to the server and render the reply as it streams in
+        const form = $('#chat-form');
+        const body = new URLSearchParams({
+            'message': userInput,
+            'session_id': sessionId,
+            'csrfmiddlewaretoken': $('input[name="csrfmiddlewaretoken"]').val()
+        });
+        const content = addMessage('', false);
+
+        streamReply(form.data('stream-url'), body, function(text) {
+            content.text(content.text() + text);
+            scrollToBottom();
+        }).then(function(finalText) {
+            if (finalText !== null) content.text(finalText);
+            scrollToBottom();
+        }).catch(function(error) {
+            console.error('Error sending message:', error);
+            content.text('Sorry, there was an error processing your request.');
+            scrollToBottom();
         });
     });
+
+    // POST to the streaming endpoint and parse its server-sent events.
+    // onDelta gets each text chunk; resolves with the full reply from the "done" event.
+    async function streamReply(url, body, onDelta) {
+        const response = await fetch(url, {
+            method: 'POST',
+            body: body,
+            headers: {'Accept': 'text/event-stream'},
+            credentials: 'same-origin'
+        });
+        if (!response.ok || !response.body) {
+            throw new Error('HTTP ' + response.status);
+        }
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let finalText = null;
+        while (true) {
+            const {value, done} = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, {stream: true});
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = 'message', data = '';
+                frame.split('\n').forEach(function(line) {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                });
+                const payload = JSON.parse(data);
+                if (event === 'delta') onDelta(payload.text);
+                else if (event === 'done') finalText = payload.response;
+            }
+        }
+        return finalText;
+    }
     
-    // Function to add a message to the chat box
-    function addMessage(text, isUser) {
-        const messageHtml = isUser ?
+    // Build a chat bubble; text is inserted as text, never as HTML
+    function buildMessage(text, isUser) {
+        const message = $(isUser ?
             `<div class="chat-message user-message">
-                <div class="message-content">${text}</div>
+                <div class="message-content"></div>
                 <div class="avatar user-avatar"><i class="fa fa-user"></i></div>
             </div>` :
             `<div class="chat-message bot-message">
                 <div class="avatar bot-avatar"><i class="fa fa-android"></i></div>
-                <div class="message-content">${text}</div>
-            </div>`;
-        
-        $('#chat-box').append(messageHtml);
+                <div class="message-content"></div>
+            </div>`);
+        message.find('.message-content').text(text);
+        return message;
     }
+
+    // Function to add a message to the chat box
+    function addMessage(text, isUser) {
+        const message = buildMessage(text, isUser);
+        $('#chat-box').append(message);
+        return message.find('.message-content');
+    }
+
+    // Load the previous page of messages when the chat box is scrolled to the top
+    let loadingHistory = false;
+    $('#chat-box').on('scroll', function() {
+        const chatBox = $(this);
+        const before = chatBox.data('before');
+        if (loadingHistory || !before || this.scrollTop > 50) return;
+        loadingHistory = true;
+        $.getJSON(chatBox.data('url'), {before: before}).done(function(data) {
+            const box = chatBox.get(0);
+            const previousHeight = box.scrollHeight;
+            chatBox.prepend(data.messages.map(function(m) { return buildMessage(m.text, m.is_user); }));
+            // Keep the messages the user was reading in place
+            box.scrollTop += box.scrollHeight - previousHeight;
+            chatBox.data('before', data.next_cursor || '');
+        }).always(function() {
+            loadingHistory = false;
+        });
+    });
+
+    // Append the next page of older conversations to the sidebar
+    $('#conversation-list').on('click', '#older-sessions', function(e) {
+        e.preventDefault();
+        const list = $('#conversation-list');
+        const more = $(this).closest('li');
+        $.getJSON(list.data('url'), {before: list.data('before')}).done(function(data) {
+            data.sessions.forEach(function(session) {
+                more.before($('<li>').append($('<a>').attr('href', session.url).text(session.label)));
+            });
+            list.data('before', data.next_cursor || '');
+            if (!data.next_cursor) more.remove();
+        });
+    });
     
     // Function to scroll to the bottom of the chat box
     function scrollToBottom() {
@@ -1,3 +1,575 @@
-from django.test import TestCase
-
-# Create your tests here.
+import asyncio
+import json
+import threading
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from web.models import ChatMessage, ChatSession
+
+from . import bot as bot_module
+from . import context as context_module
+from . import history
+from .bot import (AnswerCache, AnswerStreamDecoder, SimpleChatBot, build_prompt, info_request_keys, normalize_title,
+                  parse_structured_reply)
+from .llm import CircuitBreaker, FakeLLMClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def structured(title, answer):
+    return lambda prompt: json.dumps({'movie_title': title, 'answer': answer})
+
+
+class ChatBotFlowTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def make_bot(self, client, **breaker_options):
+        self.clock = FakeClock()
+        breaker_options.setdefault('failure_threshold', 2)
+        breaker_options.setdefault('reset_timeout', 30)
+        return SimpleChatBot(client=client, breaker=CircuitBreaker(clock=self.clock, **breaker_options))
+
+    def test_one_llm_call_per_message(self):
+        client = FakeLLMClient(structured('Heat', 'Heat (1995) is a crime epic.'))
+        bot = self.make_bot(client)
+        reply = bot.respond('Tell me about Heat')
+        self.assertEqual(client.calls, 1)
+        self.assertNotIn('Hello', client.prompts)
+        self.assertIn('Tell me about Heat', client.prompts[0])
+        self.assertEqual(reply.movie_title, 'Heat')
+        self.assertEqual(reply.text, 'Heat (1995) is a crime epic.')
+        self.assertEqual(reply.source, 'llm')
+
+    def test_records_stage_latency(self):
+        bot = self.make_bot(FakeLLMClient())
+        bot.respond('hi')
+        bot.respond('hi again')
+        stats = bot.latency.snapshot()
+        self.assertEqual(set(stats), {'cache', 'llm', 'parse', 'total'})
+        self.assertEqual(stats['total']['count'], 2)
+
+    def test_unstructured_reply_used_as_answer(self):
+        bot = self.make_bot(FakeLLMClient(lambda prompt: 'Just some text'))
+        reply = bot.respond('hello')
+        self.assertEqual((reply.movie_title, reply.text), (None, 'Just some text'))
+
+    def test_breaker_opens_after_failures_and_recovers(self):
+        client = FakeLLMClient(fail=True)
+        bot = self.make_bot(client)
+        with self.assertLogs('chatbot.bot', 'WARNING'):
+            for _ in range(2):
+                self.assertEqual(bot.respond('a movie please').source, 'fallback')
+        self.assertEqual(bot.breaker.state, CircuitBreaker.OPEN)
+
+        # While open, upstream is not called at all
+        bot.respond('a movie please')
+        self.assertEqual(client.calls, 2)
+        self.assertFalse(bot.api_available)
+
+        # After the cool-down one trial call goes through and closes the breaker
+        self.clock.now += 31
+        client.fail = False
+        self.assertEqual(bot.respond('hello').source, 'llm')
+        self.assertEqual(bot.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(client.calls, 3)
+
+    def test_failed_trial_reopens_breaker(self):
+        client = FakeLLMClient(fail=True)
+        bot = self.make_bot(client, failure_threshold=1)
+        with self.assertLogs('chatbot.bot', 'WARNING'):
+            bot.respond('hello')
+        self.clock.now += 31
+        self.assertTrue(bot.breaker.allow())
+        self.assertFalse(bot.breaker.allow())  # only one trial at a time
+        bot.breaker.record_failure()
+        self.assertEqual(bot.breaker.state, CircuitBreaker.OPEN)
+
+    def test_parse_structured_reply(self):
+        self.assertEqual(parse_structured_reply('```json\n{"movie_title": "Up", "answer": "Great"}\n```'), ('Up', 'Great'))
+        self.assertEqual(parse_structured_reply('{"movie_title": "NO_MOVIE", "answer": "Hi"}'), (None, 'Hi'))
+        self.assertEqual(parse_structured_reply('{"movie_title": null}'), (None, '{"movie_title": null}'))
+
+
+def title_from_prompt(prompt):
+    """Fake structured reply naming the movie after 'about' in the user message."""
+    message = prompt.rsplit('User message:', 1)[-1].strip()
+    title = message.split('about', 1)[1].strip() if 'about' in message else None
+    return json.dumps({'movie_title': title, 'answer': f'All about {title}' if title else 'Hi!'})
+
+
+class AnswerCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def make_bot(self, client, max_entries=3):
+        return SimpleChatBot(client=client, answer_cache=AnswerCache(max_entries=max_entries, timeout=60))
+
+    def test_normalize_title(self):
+        self.assertEqual(normalize_title('The Matrix (1999)'), 'matrix')
+        self.assertEqual(normalize_title('  AMÉLIE!! '), 'amelie')
+        self.assertEqual(normalize_title('Se7en'), 'se7en')
+
+    def test_repeat_question_served_from_cache(self):
+        client = FakeLLMClient(title_from_prompt)
+        bot = self.make_bot(client)
+        first = bot.respond('Tell me about The Matrix')
+        second = bot.respond('what do you know about the matrix (1999)?')
+        self.assertEqual((first.source, second.source), ('llm', 'cache'))
+        self.assertEqual(second.text, 'All about The Matrix')
+        self.assertEqual(second.movie_title, 'The Matrix')
+        self.assertEqual(client.calls, 1)
+        stats = bot.answers.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_rate']), (1, 1, 0.5))
+
+    def test_non_movie_messages_not_cached_or_counted(self):
+        bot = self.make_bot(FakeLLMClient(title_from_prompt))
+        bot.respond('hello there')
+        bot.respond('hello there')
+        self.assertEqual(bot.answers.stats()['entries'], 0)
+        self.assertEqual(bot.answers.stats()['misses'], 0)
+
+    def test_short_titles_need_an_exact_message(self):
+        answers = AnswerCache(max_entries=10, timeout=60)
+        answers.set('Up', 'A house with balloons')
+        self.assertIsNone(answers.lookup_message("what's up"))
+        self.assertEqual(answers.lookup_message('Up!'), ('Up', 'A house with balloons'))
+
+    def test_info_request_keys(self):
+        self.assertEqual(info_request_keys('The Matrix (1999)'), ['matrix'])
+        self.assertEqual(info_request_keys('Could you tell me more about the movie Heat, please?'),
+                         ['could you tell me more about the movie heat please', 'movie heat please', 'heat'])
+        self.assertEqual(info_request_keys('info on Alien'), ['info on alien', 'alien'])
+        self.assertEqual(info_request_keys('?!'), [])
+
+    def test_messages_that_only_mention_a_title_not_served(self):
+        answers = AnswerCache(max_entries=10, timeout=60)
+        answers.set('Love', 'A Gaspar Noé film')
+        answers.set('Titanic', 'The ship, the romance')
+        for message in ('I love this site, recommend me a comedy', 'Who directed Titanic?',
+                        'Is Titanic longer than Avatar?', 'titanic sequel', 'love actually'):
+            with self.subTest(message=message):
+                self.assertIsNone(answers.lookup_message(message))
+        self.assertEqual(answers.lookup_message('Titanic'), ('Titanic', 'The ship, the romance'))
+        self.assertEqual(answers.lookup_message('tell me about the film Love'), ('Love', 'A Gaspar Noé film'))
+        self.assertEqual(answers.stats()['entries'], 2)
+
+    def test_specific_questions_not_cached(self):
+        bot = self.make_bot(FakeLLMClient(structured('Titanic', 'James Cameron directed it.')))
+        for message in ('Who directed Titanic?', 'I liked Titanic, what else should I watch?'):
+            reply = bot.respond(message)
+            self.assertEqual((reply.source, reply.movie_title), ('llm', 'Titanic'))
+        self.assertEqual(bot.answers.stats()['entries'], 0)
+        self.assertEqual(bot.answers.stats()['misses'], 0)
+
+    def test_info_request_for_another_title_not_cached(self):
+        # The LLM picked a different movie than the one asked about
+        bot = self.make_bot(FakeLLMClient(structured('Alien', 'About Aliens, the sequel...')))
+        bot.respond('Tell me about Aliens')
+        self.assertIsNone(bot.answers.get('Alien'))
+        self.assertEqual(bot.answers.stats()['entries'], 0)
+
+    def test_least_recently_used_title_evicted(self):
+        client = FakeLLMClient(title_from_prompt)
+        bot = self.make_bot(client)
+        for title in ['Alien', 'Brazil', 'Casablanca']:
+            bot.respond(f'about {title}')
+        bot.respond('about Alien')  # hit: Alien becomes most recent
+        bot.respond('about Dune')   # evicts Brazil
+        self.assertEqual(client.calls, 4)
+        self.assertIsNone(bot.answers.get('Brazil'))
+        self.assertEqual(bot.answers.get('Alien'), 'All about Alien')
+        self.assertEqual(bot.answers.stats()['entries'], 3)
+
+        bot.respond('about Brazil')
+        self.assertEqual(client.calls, 5)
+
+    def test_hits_do_not_rewrite_the_index(self):
+        answers = AnswerCache(max_entries=2, timeout=60)
+        answers.set('Alien', 'Scary')
+        answers.set('Brazil', 'Bureaucratic')
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            self.assertEqual(answers.lookup_message('Alien'), ('Alien', 'Scary'))
+        self.assertEqual([c.args[0] for c in cache_set.call_args_list], [AnswerCache.used_key('alien')])
+
+        answers.set('Casablanca', 'Play it again')  # evicts Brazil, the least recently used
+        self.assertIsNone(answers.get('Brazil'))
+        self.assertIsNone(cache.get(AnswerCache.used_key('brazil')))
+        self.assertEqual(cache.get(AnswerCache.INDEX_KEY), ['alien', 'casablanca'])
+
+    def test_expired_entries_dropped_from_index(self):
+        answers = AnswerCache(max_entries=10, timeout=60)
+        answers.set('Alien', 'Scary')
+        cache.delete(AnswerCache.cache_key('alien'))
+        self.assertIsNone(answers.lookup_message('tell me about alien'))
+        self.assertEqual(answers.stats()['entries'], 0)
+
+    def test_follow_up_answers_not_cached(self):
+        bot = self.make_bot(FakeLLMClient(structured('Heat', 'Michael Mann directed it.')))
+        reply = bot.respond('who directed it?')
+        self.assertEqual(reply.movie_title, 'Heat')
+        self.assertEqual(bot.answers.stats()['entries'], 0)
+
+    def test_concurrent_requests(self):
+        client = FakeLLMClient(title_from_prompt, latency=0.01)
+        bot = self.make_bot(client, max_entries=5)
+        bot.respond('about Heat')
+        titles = ['Heat'] * 20 + [f'Movie {i}' for i in range(20)]
+        errors = []
+
+        def ask(title):
+            try:
+                bot.respond(f'about {title}')
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+
+        threads = [threading.Thread(target=ask, args=(title,)) for title in titles]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        stats = bot.answers.stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 41)
+        self.assertLessEqual(stats['entries'], 5)
+        self.assertEqual(client.calls, stats['misses'])
+
+
+class InFlightClient(FakeLLMClient):
+    """Fake client that records the peak number of concurrent agenerate calls."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.in_flight = self.peak = 0
+
+    async def agenerate(self, prompt, json_output=False):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            return await super().agenerate(prompt, json_output)
+        finally:
+            self.in_flight -= 1
+
+
+class AsyncChatTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_semaphore_caps_concurrent_upstream_calls(self):
+        client = InFlightClient(latency=0.02)
+        bot = SimpleChatBot(client=client, max_concurrent_calls=2)
+
+        async def ask_all():
+            return await asyncio.gather(*(bot.arespond(f'message {i}') for i in range(6)))
+
+        replies = asyncio.run(ask_all())
+        self.assertEqual([r.source for r in replies], ['llm'] * 6)
+        self.assertEqual(client.peak, 2)
+        self.assertIn('queue', replies[-1].timings)
+
+    def test_queue_timeout_gives_fallback(self):
+        bot = SimpleChatBot(client=FakeLLMClient(latency=0.2), max_concurrent_calls=1, queue_timeout=0.05)
+
+        async def ask_two():
+            return await asyncio.gather(bot.arespond('first'), bot.arespond('second'))
+
+        with self.assertLogs('chatbot.bot', 'WARNING'):
+            first, second = asyncio.run(ask_two())
+        self.assertEqual((first.source, second.source), ('llm', 'fallback'))
+
+    def test_send_endpoint_saves_both_messages(self):
+        user = User.objects.create_user('chatter', password='pw')
+        session = ChatSession.objects.create(user=user)
+        self.client.force_login(user)
+        with mock.patch.object(bot_module.chatbot, 'client', FakeLLMClient()):
+            response = self.client.post('/chatbot/send/', {'message': 'hi there', 'session_id': session.id})
+        self.assertEqual(response.json(), {'message': 'hi there', 'response': 'You said: hi there'})
+        self.assertEqual(
+            list(ChatMessage.objects.filter(session=session).order_by('id').values_list('is_user', 'message_text')),
+            [(True, 'hi there'), (False, 'You said: hi there')],
+        )
+
+    def test_send_endpoint_checks_login_and_session(self):
+        self.assertEqual(self.client.post('/chatbot/send/', {'message': 'hi', 'session_id': 1}).status_code, 401)
+        user = User.objects.create_user('chatter', password='pw')
+        other = ChatSession.objects.create(user=User.objects.create_user('other'))
+        self.client.force_login(user)
+        self.assertEqual(self.client.post('/chatbot/send/', {'message': 'hi', 'session_id': other.id}).status_code, 404)
+        self.assertEqual(self.client.get('/chatbot/send/').status_code, 405)
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+class StreamingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_decoder_extracts_answer_across_chunk_boundaries(self):
+        answer = 'Line one\nSays "hi" \\ caf\u00e9 \u2605'
+        raw = '```json\n' + json.dumps({'movie_title': 'X', 'answer': answer}) + '\n```'
+        decoder = AnswerStreamDecoder()
+        self.assertEqual(''.join(decoder.feed(ch) for ch in raw), answer)
+
+    def test_decoder_passes_plain_text_through(self):
+        decoder = AnswerStreamDecoder()
+        self.assertEqual(''.join(decoder.feed(chunk) for chunk in ['  ', 'Plain ', 'text']), 'Plain text')
+
+    def test_stream_yields_answer_in_chunks(self):
+        bot = SimpleChatBot(client=FakeLLMClient(structured('Heat', 'Heat is a 1995 crime epic.'), chunk_size=8))
+        stream = bot.astream('tell me about Heat')
+        chunks = asyncio.run(collect(stream))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), 'Heat is a 1995 crime epic.')
+        self.assertEqual((stream.reply.text, stream.reply.movie_title), ('Heat is a 1995 crime epic.', 'Heat'))
+        self.assertIn('first_token', stream.reply.timings)
+        # Cached now: the next stream is a single chunk with no upstream call
+        again = bot.astream('Heat')
+        self.assertEqual(asyncio.run(collect(again)), ['Heat is a 1995 crime epic.'])
+        self.assertEqual(again.reply.source, 'cache')
+
+    def test_interrupted_stream_keeps_partial_answer(self):
+        bot = SimpleChatBot(client=FakeLLMClient(structured(None, 'A long answer ' * 5), chunk_size=8, fail_after_chunks=6))
+        stream = bot.astream('hello')
+        with self.assertLogs('chatbot.bot', 'WARNING'):
+            chunks = asyncio.run(collect(stream))
+        self.assertEqual(stream.reply.source, 'partial')
+        self.assertTrue(stream.reply.text.startswith('A long'))
+        self.assertTrue(stream.reply.text.endswith(SimpleChatBot.STREAM_INTERRUPTED))
+        self.assertEqual(''.join(chunks), stream.reply.text)
+
+    def test_failed_stream_falls_back(self):
+        bot = SimpleChatBot(client=FakeLLMClient(fail=True))
+        stream = bot.astream('hello')
+        with self.assertLogs('chatbot.bot', 'WARNING'):
+            chunks = asyncio.run(collect(stream))
+        self.assertEqual(stream.reply.source, 'fallback')
+        self.assertEqual(chunks, [stream.reply.text])
+
+    async def test_stream_endpoint_sends_events_and_saves_reply(self):
+        user = await sync_to_async(User.objects.create_user)('streamer', password='pw')
+        session = await ChatSession.objects.acreate(user=user)
+        await sync_to_async(self.async_client.force_login)(user)
+        with mock.patch.object(bot_module.chatbot, 'client', FakeLLMClient(chunk_size=4)):
+            response = await self.async_client.post('/chatbot/stream/', {'message': 'hi there', 'session_id': session.id})
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+        events = [frame.split('\n') for frame in body.strip().split('\n\n')]
+        names = [lines[0][len('event: '):] for lines in events]
+        payloads = [json.loads(lines[1][len('data: '):]) for lines in events]
+        self.assertGreater(names.count('delta'), 1)
+        self.assertEqual(names[-1], 'done')
+        self.assertEqual(''.join(p['text'] for p in payloads[:-1]), 'You said: hi there')
+        self.assertEqual(payloads[-1], {'response': 'You said: hi there'})
+        saved = [m async for m in ChatMessage.objects.filter(session=session).order_by('id').values_list('is_user', 'message_text')]
+        self.assertEqual(saved, [(True, 'hi there'), (False, 'You said: hi there')])
+
+
+class ChatHistoryTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('historian', password='pw')
+        self.session = ChatSession.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+    def add_messages(self, session, count):
+        ChatMessage.objects.bulk_create(
+            ChatMessage(session=session, is_user=i % 2 == 0, message_text=f'message {i}') for i in range(count)
+        )
+        # bulk_create rows can share a timestamp; the cursor breaks ties by id
+        return list(ChatMessage.objects.filter(session=session).order_by('id').values_list('message_text', flat=True))
+
+    def test_message_pages_walk_back_through_history(self):
+        texts = self.add_messages(self.session, 75)
+        response = self.client.get(f'/chatbot/session/{self.session.id}/')
+        self.assertEqual([m.message_text for m in response.context['messages']], texts[-history.MESSAGES_PER_PAGE:])
+
+        seen = [m.message_text for m in response.context['messages']]
+        cursor = response.context['messages_cursor']
+        while cursor:
+            data = self.client.get(f'/chatbot/session/{self.session.id}/messages/', {'before': cursor}).json()
+            seen = [m['text'] for m in data['messages']] + seen
+            cursor = data['next_cursor']
+        self.assertEqual(seen, texts)
+
+    def test_page_cost_independent_of_history_length(self):
+        self.add_messages(self.session, 5)
+        for _ in range(3):
+            ChatSession.objects.create(user=self.user)
+        with CaptureQueriesContext(connection) as short:
+            self.client.get(f'/chatbot/session/{self.session.id}/')
+
+        self.add_messages(self.session, 300)
+        for _ in range(60):
+            ChatSession.objects.create(user=self.user)
+        with self.assertNumQueries(len(short.captured_queries)):
+            response = self.client.get(f'/chatbot/session/{self.session.id}/')
+        self.assertEqual(len(response.context['messages']), history.MESSAGES_PER_PAGE)
+        self.assertEqual(len(response.context['chat_sessions']), history.SESSIONS_PER_PAGE)
+
+    def test_session_list_pages(self):
+        for _ in range(40):
+            ChatSession.objects.create(user=self.user)
+        ChatSession.objects.create(user=User.objects.create_user('someone-else'))
+        expected = list(ChatSession.objects.filter(user=self.user).order_by('-start_time', '-id').values_list('id', flat=True))
+
+        first = self.client.get('/chatbot/sessions/').json()
+        second = self.client.get('/chatbot/sessions/', {'before': first['next_cursor']}).json()
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual([s['id'] for s in first['sessions'] + second['sessions']], expected)
+
+    def test_history_is_private_and_tolerates_bad_cursors(self):
+        other = ChatSession.objects.create(user=User.objects.create_user('someone-else'))
+        self.assertEqual(self.client.get(f'/chatbot/session/{other.id}/messages/').status_code, 404)
+        self.add_messages(self.session, 3)
+        data = self.client.get(f'/chatbot/session/{self.session.id}/messages/', {'before': 'garbage'}).json()
+        self.assertEqual(len(data['messages']), 3)
+
+    def test_cursor_round_trip(self):
+        message = ChatMessage.objects.create(session=self.session, message_text='x')
+        self.assertEqual(history.decode_cursor(history.encode_cursor(message.timestamp, message.id)),
+                         (message.timestamp, message.id))
+
+
+@override_settings(CHATBOT_SUMMARY_TOKENS=100)
+class ConversationContextTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('talker', password='pw')
+        self.session = ChatSession.objects.create(user=self.user)
+
+    def add_turns(self, count, start=0):
+        ChatMessage.objects.bulk_create(
+            ChatMessage(session=self.session, is_user=i % 2 == 0, message_text=f'turn {i} ' + 'words ' * 10)
+            for i in range(start, start + count)
+        )
+        self.session.refresh_from_db()
+
+    def test_window_keeps_newest_turns_within_budget(self):
+        self.add_turns(200)
+        context = context_module.build_context(self.session, budget=300)
+        self.assertLessEqual(context.tokens, 300)
+        self.assertTrue(context.turns[-1][1].startswith('turn 199 '))
+        self.assertGreater(context.overflow_tokens, 0)
+        self.assertEqual(context.render().splitlines()[0], 'Recent conversation:')
+
+        short = ChatSession.objects.create(user=self.user)
+        ChatMessage.objects.create(session=short, is_user=True, message_text='hello')
+        context = context_module.build_context(short, budget=300)
+        self.assertEqual((context.turns, context.overflow_tokens), ([(True, 'hello')], 0))
+
+    def test_prompt_size_independent_of_history_length(self):
+        self.add_turns(20)
+        small = len(build_prompt('next?', context_module.build_context(self.session, budget=300)))
+        self.add_turns(2000, start=20)
+        with self.assertNumQueries(2):
+            context = context_module.build_context(self.session, budget=300)
+        self.assertLess(abs(len(build_prompt('next?', context)) - small), 100)
+
+    def test_oversized_message_clipped(self):
+        ChatMessage.objects.create(session=self.session, is_user=True, message_text='x' * 10000)
+        context = context_module.build_context(self.session, budget=100)
+        self.assertEqual(len(context.turns), 1)
+        self.assertLessEqual(context.tokens, 100)
+
+    def test_summary_refreshed_incrementally(self):
+        folded = []
+
+        def summarize(previous, turns):
+            folded.extend(text for _, text in turns)
+            return context_module.extractive_summary(previous, turns)
+
+        self.add_turns(60)
+        self.assertTrue(context_module.refresh_summary(self.session.id, summarize, budget=300))
+        self.session.refresh_from_db()
+        first_pass = len(folded)
+        self.assertGreater(first_pass, 0)
+        self.assertIn('turn 0 ', folded[0])
+        self.assertIn(folded[-1].split()[1], self.session.summary)
+        context = context_module.build_context(self.session, budget=300)
+        self.assertEqual(context.overflow_tokens, 0)
+        self.assertTrue(context.render().startswith('Summary of the earlier conversation: '))
+
+        # Nothing new has overflowed: no work at all
+        self.assertFalse(context_module.refresh_summary(self.session.id, summarize, budget=300))
+        self.add_turns(20, start=60)
+        self.assertTrue(context_module.refresh_summary(self.session.id, summarize, budget=300))
+        # Only turns not folded before, and each turn exactly once
+        self.assertEqual(len(folded), len(set(folded)))
+        self.assertLessEqual(len(folded) - first_pass, 20)
+
+    def test_concurrent_refresh_loses_cleanly(self):
+        self.add_turns(60)
+
+        def summarize(previous, turns):
+            # Another worker finishes first
+            ChatSession.objects.filter(id=self.session.id).update(summary='theirs', summarized_through=5)
+            return 'ours'
+
+        self.assertFalse(context_module.refresh_summary(self.session.id, summarize, budget=300))
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.summary, 'theirs')
+
+    def test_summarize_falls_back_to_extractive(self):
+        bot = SimpleChatBot(client=FakeLLMClient(fail=True))
+        with self.assertLogs('chatbot.bot', 'WARNING'):
+            summary = bot.summarize('', [(True, 'I love Heat'), (False, 'Great pick!')])
+        self.assertEqual(summary, 'User: I love Heat\nAssistant: Great pick!')
+        bot = SimpleChatBot(client=FakeLLMClient(lambda prompt: 'They like crime films.'))
+        self.assertEqual(bot.summarize('', [(True, 'I love Heat')]), 'They like crime films.')
+
+    @override_settings(CHATBOT_CONTEXT_TOKENS=200, CHATBOT_SUMMARY_BATCH_TOKENS=100,
+                       CHATBOT_SUMMARY_IN_BACKGROUND=False)
+    def test_send_endpoint_uses_context_and_summarizes(self):
+        self.client.force_login(self.user)
+        client = FakeLLMClient()
+        with mock.patch.object(bot_module.chatbot, 'client', client):
+            for i in range(30):
+                self.client.post('/chatbot/send/', {'message': f'message number {i}', 'session_id': self.session.id})
+        self.assertNotIn('Recent conversation', client.prompts[0])
+        self.assertIn('User: message number 0', client.prompts[1])
+        self.assertIn('Assistant: You said: message number 0', client.prompts[1])
+        self.assertNotIn('User message: message number 29', client.prompts[-1].split('Recent conversation')[0])
+
+        self.session.refresh_from_db()
+        self.assertGreater(self.session.summarized_through, 0)
+        self.assertIn('Summary of the earlier conversation', client.prompts[-1])
+        overhead = len(bot_module.CONTEXT_SECTION) + len('Summary of the earlier conversation: Recent conversation:\n')
+        self.assertLess(len(client.prompts[-1]) - len(client.prompts[0]), 200 * context_module.CHARS_PER_TOKEN + overhead)
+
+    def test_background_summary_runs_once_per_session(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_summarize(previous, turns):
+            started.set()
+            release.wait(5)
+            return 'done'
+
+        with mock.patch.object(context_module, 'refresh_summary', side_effect=lambda sid, fn: fn('', [])):
+            first = context_module.start_background_summary(self.session.id, slow_summarize)
+            started.wait(5)
+            self.assertIsNone(context_module.start_background_summary(self.session.id, slow_summarize))
+            release.set()
+            first.join()
+            self.assertIsNotNone(context_module.start_background_summary(self.session.id, lambda *a: ''))
@@ -6,5 +6,9 @@ from . import views
 urlpatterns = [
     path('', views.chat_view, name='chat'),
     path('session/<int:session_id>/', views.chat_view, name='chat_session'),
+    path('session/<int:session_id>/messages/', views.message_history, name='chat_history'),
+    path('sessions/', views.session_list, name='chat_sessions'),
     path('new/', views.new_chat_session, name='new_chat'),
+    path('send/', views.send_message, name='chat_send'),
+    path('stream/', views.stream_message, name='chat_stream'),
 ]
\ No newline at end of file
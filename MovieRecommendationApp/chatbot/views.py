@@ -1,14 +1,20 @@
-from django.shortcuts import render, redirect
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.utils.formats import date_format
+from django.http import JsonResponse, StreamingHttpResponse
+from django.contrib.auth import get_user
 from django.contrib.auth.decorators import login_required
 from web.models import ChatSession, ChatMessage
 from .bot import chatbot
+from .context import build_context, summarize_if_needed
+from .history import latest_session, message_page, session_page
+import json
 import traceback
 
 @login_required
 def chat_view(request, session_id=None):
     user = request.user
-    chat_sessions = ChatSession.objects.filter(user=user).order_by('-start_time')
 
     if session_id:
         try:
@@ -17,12 +23,10 @@ def chat_view(request, session_id=None):
             return redirect('chat') # Redirect if session doesn't exist or belong to user
     else:
         # Get the most recent session, or create a new one if none exist
-        active_session = chat_sessions.first()
+        active_session = latest_session(user)
         if not active_session:
             active_session = ChatSession.objects.create(user=user)
 
-    messages = active_session.messages.all().order_by('timestamp')
-
     if request.method == 'POST':
         user_message = request.POST.get('message')
         session_id_from_post = request.POST.get('session_id')
@@ -30,13 +34,17 @@ def chat_view(request, session_id=None):
         try:
             session = ChatSession.objects.get(id=session_id_from_post, user=user)
 
+            # Earlier turns for the prompt, read before this message joins them
+            context = build_context(session)
+
             # Save user message
             ChatMessage.objects.create(session=session, is_user=True, message_text=user_message)
 
             # Get and save bot response from your AI adapter
             try:
-                bot_response = chatbot.get_response(user_message)
+                bot_response = chatbot.respond(user_message, context).text
                 ChatMessage.objects.create(session=session, is_user=False, message_text=str(bot_response))
+                summarize_if_needed(session.id, context, chatbot.summarize)
                 
                 return JsonResponse({'message': user_message, 'response': str(bot_response)})
             except Exception as e:
@@ -58,15 +66,113 @@ def chat_view(request, session_id=None):
         except ChatSession.DoesNotExist:
             return JsonResponse({'error': 'Session not found'}, status=404)
 
+    # Only the newest page of each; chat.js fetches older ones on demand
+    chat_sessions, sessions_cursor = session_page(user)
+    messages, messages_cursor = message_page(active_session)
     context = {
         'chat_sessions': chat_sessions,
+        'sessions_cursor': sessions_cursor,
         'active_session': active_session,
-        'messages': messages
+        'messages': messages,
+        'messages_cursor': messages_cursor,
     }
     return render(request, 'chatbot/chat.html', context)
 
+@login_required
+def message_history(request, session_id):
+    """JSON page of a session's messages older than ?before=<cursor>, oldest first."""
+    session = get_object_or_404(ChatSession, id=session_id, user=request.user)
+    messages, next_cursor = message_page(session, before=request.GET.get('before'))
+    return JsonResponse({
+        'messages': [
+            {'id': m.id, 'is_user': m.is_user, 'text': m.message_text, 'timestamp': m.timestamp.isoformat()}
+            for m in messages
+        ],
+        'next_cursor': next_cursor,
+    })
+
+@login_required
+def session_list(request):
+    """JSON page of the user's chat sessions older than ?before=<cursor>, newest first."""
+    sessions, next_cursor = session_page(request.user, before=request.GET.get('before'))
+    return JsonResponse({
+        'sessions': [
+            {'id': s.id, 'url': reverse('chat_session', args=[s.id]),
+             'label': f"Conversation on {date_format(s.start_time, 'M d, Y')}"}
+            for s in sessions
+        ],
+        'next_cursor': next_cursor,
+    })
+
 @login_required
 def new_chat_session(request):
     # Create a new session and redirect to the chat view, which will load it
     new_session = ChatSession.objects.create(user=request.user)
-    return redirect('chat_session', session_id=new_session.id)
\ No newline at end of file
+    return redirect('chat_session', session_id=new_session.id)
+
+
+async def _chat_post(request):
+    """(session, message) for a chat POST, or (None, error JsonResponse)."""
+    # login_required and require_POST don't wrap async views in this Django version
+    if request.method != 'POST':
+        return None, JsonResponse({'error': 'POST required'}, status=405)
+    user = await sync_to_async(get_user)(request)
+    if not user.is_authenticated:
+        return None, JsonResponse({'error': 'Login required'}, status=401)
+
+    user_message = (request.POST.get('message') or '').strip()
+    if not user_message:
+        return None, JsonResponse({'error': 'Empty message'}, status=400)
+    try:
+        session = await ChatSession.objects.aget(id=request.POST.get('session_id'), user=user)
+    except (ChatSession.DoesNotExist, ValueError, TypeError):
+        return None, JsonResponse({'error': 'Session not found'}, status=404)
+    return session, user_message
+
+
+async def send_message(request):
+    """
+    Async chat endpoint returning the whole reply as JSON. While the LLM call is
+    awaited the worker keeps serving other requests (under ASGI), and the database
+    writes run in Django's sync thread instead of blocking the event loop.
+    """
+    session, user_message = await _chat_post(request)
+    if session is None:
+        return user_message
+
+    context = await sync_to_async(build_context)(session)
+    await ChatMessage.objects.acreate(session=session, is_user=True, message_text=user_message)
+    reply = await chatbot.arespond(user_message, context)
+    await ChatMessage.objects.acreate(session=session, is_user=False, message_text=reply.text)
+    await sync_to_async(summarize_if_needed)(session.id, context, chatbot.summarize)
+    return JsonResponse({'message': user_message, 'response': reply.text})
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_message(request):
+    """
+    Like send_message, but streams the reply as server-sent events while the LLM
+    generates it: "delta" events carry text chunks, then a "done" event carries the
+    full reply, which is saved as a ChatMessage once the stream completes.
+    """
+    session, user_message = await _chat_post(request)
+    if session is None:
+        return user_message
+    context = await sync_to_async(build_context)(session)
+    await ChatMessage.objects.acreate(session=session, is_user=True, message_text=user_message)
+
+    async def events():
+        stream = chatbot.astream(user_message, context)
+        async for chunk in stream:
+            yield _sse('delta', {'text': chunk})
+        await ChatMessage.objects.acreate(session=session, is_user=False, message_text=stream.reply.text)
+        await sync_to_async(summarize_if_needed)(session.id, context, chatbot.summarize)
+        yield _sse('done', {'response': stream.reply.text})
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+    return response
\ No newline at end of file
@@ -0,0 +1,18 @@
+"""
+ASGI config for main project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn main.asgi:application``) so the
+async chat endpoint can hold many slow LLM calls without pinning a worker each.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings")
+
+application = get_asgi_application()
@@ -1,37 +1,30 @@
 from django.contrib import admin
+from django.db import transaction
 from django.urls import path
 from django.shortcuts import render
-from django.db.models import Count, Avg
 from .models import Movie, Myrating
-from django.contrib.auth.models import User
-from .models import Feedback, ChatSession, ChatMessage
+from .models import Feedback, ChatSession, ChatMessage, RecommenderVersion
+from .dashboard import get_dashboard_metrics
+from .model_store import load_active_model, refold_changed_users
 
 
 # This is the custom view for our dashboard
 def custom_admin_index(request, extra_context=None):
     # --- Data Gathering ---
-    movie_count = Movie.objects.count()
-
-    # NEW: Get count of all non-superuser users
-    user_count = User.objects.filter(is_superuser=False).count()
-
-    rating_count = Myrating.objects.count()
-    average_rating = Myrating.objects.aggregate(avg=Avg('rating'))['avg'] or 0.0
-    top_genres = Movie.objects.values('genre').annotate(movie_count=Count('id')).order_by('-movie_count')[:10]
-    
-    # Existing: Recent user ratings log (across all users) - still useful for recent activity
-    user_ratings_log = Myrating.objects.select_related('user', 'movie').order_by('-id')[:10].values('user__username', 'movie__title', 'rating')
-
-    # NEW: Get Top Active Non-Admin Users with their total ratings
-    # Filters users who have made ratings and are not superusers
-    # Annotates each with the count of their ratings
-    # Orders by rating count (descending) and limits to top 5
-    top_active_users = User.objects.filter(
-        myrating__isnull=False, # Ensures we only consider users who have rated at least once
-        is_superuser=False # Exclude superusers (admins)
-    ).annotate(
-        total_ratings_by_user=Count('myrating') # Count ratings per user
-    ).order_by('-total_ratings_by_user')[:5] # Get top 5 by rating count
+    # Totals, genre breakdown and top users come from the precomputed snapshot (web.dashboard)
+    metrics = get_dashboard_metrics()
+    movie_count = metrics.movie_count
+    user_count = metrics.user_count  # non-superusers
+    rating_count = metrics.rating_count
+    average_rating = metrics.average_rating or 0.0
+    top_genres = metrics.genres[:10]
+
+    # Recent user ratings log (across all users): the newest ten by primary key, so
+    # its cost doesn't grow with the number of ratings
+    user_ratings_log = Myrating.objects.order_by('-id')[:10].values('user__username', 'movie__title', 'rating')
+
+    # Top 5 non-admin users by number of ratings
+    top_active_users = metrics.top_users
 
 
     # --- Progress Bar Calculation (already correctly placed in views.py) ---
@@ -58,6 +51,8 @@ def custom_admin_index(request, extra_context=None):
         'user_ratings_log': user_ratings_log,
         'calculated_percentage': calculated_percentage,
         'top_active_users': top_active_users, # NEW: Add the list of top active users to context
+        'metrics_updated_at': metrics.updated_at,
+        'metrics_refreshed_at': metrics.refreshed_at,
     }
 
     if extra_context:
@@ -81,15 +76,12 @@ class MovieAdmin(admin.ModelAdmin):
         return custom_urls + urls
 
     def movie_report(self, request):
-        genre_data = Movie.objects.values('genre').annotate(
-            movie_count=Count('id'),
-            total_ratings=Count('myrating'),
-            average_rating=Avg('myrating__rating')
-        ).order_by('-movie_count')
-
+        # Same snapshot as the dashboard (web.dashboard)
+        metrics = get_dashboard_metrics()
         context = dict(
            self.admin_site.each_context(request),
-           genre_data=genre_data,
+           genre_data=metrics.genres,
+           metrics_refreshed_at=metrics.refreshed_at,
         )
         return render(request, "admin/movie_report.html", context)
 
@@ -97,4 +89,28 @@ admin.site.register(Movie, MovieAdmin)
 admin.site.register(Myrating)
 admin.site.register(Feedback)
 admin.site.register(ChatSession)
-admin.site.register(ChatMessage)
\ No newline at end of file
+admin.site.register(ChatMessage)
+
+
+class RecommenderVersionAdmin(admin.ModelAdmin):
+    list_display = ('version', 'is_active', 'created_at', 'num_users', 'num_movies', 'num_ratings', 'training_seconds')
+    list_filter = ('is_active',)
+    readonly_fields = ('version', 'artifact_path', 'created_at', 'num_users', 'num_movies', 'num_ratings', 'training_seconds')
+    actions = ['make_active']
+
+    def make_active(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(request, "Select exactly one model version to activate.", level='error')
+            return
+        # One transaction, as in model_store.save_model, so no request sees zero or two active versions
+        with transaction.atomic():
+            RecommenderVersion.objects.filter(is_active=True).update(is_active=False)
+            queryset.update(is_active=True)
+        # Users who rated since this version was trained get their fold-ins redone against it
+        model = load_active_model(queryset.get())
+        if model is not None:
+            refold_changed_users(model)
+        self.message_user(request, "Active recommender model updated.")
+    make_active.short_description = "Serve the selected model version"
+
+admin.site.register(RecommenderVersion, RecommenderVersionAdmin)
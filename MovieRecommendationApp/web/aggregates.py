@@ -0,0 +1,42 @@
+"""
+Keep Movie.rating_sum / Movie.rating_count in step with Myrating.
+
+Changes are applied as single-row F() updates in the same transaction as the
+rating write, so concurrent raters never lose an increment.
+recompute_rating_aggregates() rebuilds every movie from scratch (backfill/repair).
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Movie, Myrating
+
+
+def apply_rating_delta(movie_id, sum_delta, count_delta):
+    if movie_id is None or (sum_delta == 0 and count_delta == 0):
+        return
+    Movie.objects.filter(pk=movie_id).update(
+        rating_sum=F('rating_sum') + sum_delta,
+        rating_count=F('rating_count') + count_delta,
+    )
+
+
+def stored_rating(instance):
+    """(movie_id, rating) currently in the database for instance, or (None, None) if it is new."""
+    stored = getattr(instance, '_stored', None)
+    if stored is not None and None not in stored:
+        return stored
+    if instance.pk is None:
+        return None, None
+    row = Myrating.objects.filter(pk=instance.pk).values_list('movie_id', 'rating').first()
+    return row or (None, None)
+
+
+def recompute_rating_aggregates():
+    """Recompute every movie's rating_sum/rating_count from Myrating. Returns movies updated."""
+    ratings = Myrating.objects.filter(movie=OuterRef('pk')).order_by().values('movie')
+    return Movie.objects.update(
+        rating_sum=Coalesce(Subquery(ratings.annotate(total=Sum('rating')).values('total')), Value(0),
+                            output_field=IntegerField()),
+        rating_count=Coalesce(Subquery(ratings.annotate(total=Count('id')).values('total')), Value(0),
+                              output_field=IntegerField()),
+    )
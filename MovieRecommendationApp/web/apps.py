@@ -1,5 +1,17 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_index(sender, using, **kwargs):
+    # SQLite table rebuilds in later migrations drop the FTS triggers; put them back
+    from .search import ensure_fts_index
+    ensure_fts_index(connections[using])
 
 
 class WebConfig(AppConfig):
     name = 'web'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (connects the Myrating receivers)
+        post_migrate.connect(ensure_search_index, sender=self)
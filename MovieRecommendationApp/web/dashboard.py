@@ -0,0 +1,117 @@
+"""
+Precomputed metrics for the admin dashboard and the genre report.
+
+Both pages read the single DashboardMetrics row instead of aggregating over
+Myrating on every view. Signals (web.signals) keep its user, movie and rating
+totals current with one F() update per change. The per-genre breakdown and the
+most active users are recomputed by refresh_dashboard_metrics(), which also
+resets the totals to exact counts (repairing any drift from bulk writes that
+skip signals). Run it from cron with ``manage.py refresh_dashboard_metrics``;
+a dashboard view that finds the snapshot older than DASHBOARD_REFRESH_SECONDS
+also starts a refresh in a background thread and serves the current snapshot.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import DashboardMetrics, Movie, Myrating
+
+logger = logging.getLogger(__name__)
+
+METRICS_ID = 1
+TOP_USERS = 5
+
+
+def get_refresh_seconds():
+    return getattr(settings, 'DASHBOARD_REFRESH_SECONDS', 15 * 60)
+
+
+def compute_genres():
+    """Per-genre movie count, rating count and average, from the denormalized Movie aggregates."""
+    rows = (Movie.objects.values('genre')
+            .annotate(movie_count=Count('id'), total_ratings=Sum('rating_count'), rating_total=Sum('rating_sum'))
+            .order_by('-movie_count', 'genre'))
+    return [
+        {**row, 'average_rating': row['rating_total'] / row['total_ratings'] if row['total_ratings'] else None}
+        for row in rows
+    ]
+
+
+def compute_top_users(n=TOP_USERS):
+    rows = (Myrating.objects.filter(user__is_superuser=False)
+            .values('user_id', 'user__username').annotate(total=Count('id'))
+            .order_by('-total', 'user__username')[:n])
+    return [{'username': row['user__username'], 'total_ratings_by_user': row['total']} for row in rows]
+
+
+def refresh_dashboard_metrics():
+    """Recompute every metric from scratch and store it. Returns the DashboardMetrics row."""
+    totals = Myrating.objects.aggregate(count=Count('id'), total=Sum('rating'))
+    now = timezone.now()
+    metrics, _ = DashboardMetrics.objects.update_or_create(id=METRICS_ID, defaults={
+        'user_count': User.objects.filter(is_superuser=False).count(),
+        'movie_count': Movie.objects.count(),
+        'rating_count': totals['count'],
+        'rating_sum': totals['total'] or 0,
+        'genres': compute_genres(),
+        'top_users': compute_top_users(),
+        'refreshed_at': now,
+        'updated_at': now,
+    })
+    return metrics
+
+
+def apply_metrics_delta(**deltas):
+    """
+    Add deltas to the stored totals, e.g. apply_metrics_delta(rating_count=1, rating_sum=4).
+    Before the first refresh there is no row and this does nothing.
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    DashboardMetrics.objects.filter(id=METRICS_ID).update(
+        updated_at=timezone.now(), **{name: F(name) + delta for name, delta in deltas.items()},
+    )
+
+
+_refresh_lock = threading.Lock()
+
+
+def _background_refresh():
+    try:
+        refresh_dashboard_metrics()
+    except Exception:
+        logger.exception("Background dashboard metrics refresh failed")
+    finally:
+        connection.close()
+        _refresh_lock.release()
+
+
+def start_background_refresh():
+    """Refresh in a daemon thread unless one is already running. Returns True if started."""
+    if not getattr(settings, 'DASHBOARD_BACKGROUND_REFRESH', True):
+        return False
+    if not _refresh_lock.acquire(blocking=False):
+        return False
+    thread = threading.Thread(target=_background_refresh, name='dashboard-refresh', daemon=True)
+    thread.start()
+    return True
+
+
+def get_dashboard_metrics():
+    """
+    The stored snapshot. Computed inline only when there is none yet; a snapshot
+    older than DASHBOARD_REFRESH_SECONDS is returned as-is while a background
+    refresh replaces it.
+    """
+    metrics = DashboardMetrics.objects.filter(id=METRICS_ID).first()
+    if metrics is None:
+        return refresh_dashboard_metrics()
+    if (timezone.now() - metrics.refreshed_at).total_seconds() > get_refresh_seconds():
+        start_background_refresh()
+    return metrics
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from web.snapshot import export_snapshot, get_snapshot_dir
+
+
+class Command(BaseCommand):
+    help = ("Bring the columnar training snapshot (RECOMMENDER_SNAPSHOT_DIR) up to date, "
+            "appending ratings changed since the last export.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Rewrite the snapshot from scratch.")
+
+    def handle(self, *args, **options):
+        stats = export_snapshot(full=options['full'])
+        action = "Rewrote" if stats.rebuilt else "Appended to"
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} the training snapshot in {get_snapshot_dir()}: {stats.appended:,} rows written, "
+            f"{stats.rows:,} in total, in {stats.seconds:.2f}s."
+        ))
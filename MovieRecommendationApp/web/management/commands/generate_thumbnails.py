@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from web import thumbnails
+from web.models import Movie
+
+
+class Command(BaseCommand):
+    help = "Generate resized poster variants for every movie (backfill)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Re-encode variants even if they already exist.")
+        parser.add_argument('--missing', action='store_true',
+                            help="Only process movies without a poster hash or width.")
+
+    def handle(self, *args, **options):
+        if thumbnails.Image is None:
+            raise CommandError("Pillow is not installed; `pip install Pillow` to generate thumbnails.")
+
+        movies = Movie.objects.exclude(movie_logo='').only('id', 'movie_logo', 'poster_hash', 'poster_width').order_by('id')
+        if options['missing']:
+            movies = movies.filter(Q(poster_hash='') | Q(poster_width__isnull=True))
+
+        done = failed = 0
+        for movie in movies.iterator(chunk_size=500):
+            if thumbnails.generate_thumbnails(movie, force=options['force']):
+                done += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(f"Thumbnails ready for {done} movies ({failed} failed)."))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from web import model_store
+from web.materialize import get_top_k, materialize_recommendations
+from web.parallel import POOL_KINDS
+
+
+class Command(BaseCommand):
+    help = "Precompute and store every user's top-K recommendations from the active model."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=None,
+                            help="Movies to store per user (default: RECOMMENDER_MATERIALIZED_TOP_K).")
+        parser.add_argument('--chunk-size', type=int, default=1024,
+                            help="Users scored per Theta @ X.T block (default: 1024).")
+        parser.add_argument('--workers', '--processes', type=int, default=None,
+                            help="Workers scoring chunks in parallel (default: RECOMMENDER_WORKERS).")
+        parser.add_argument('--pool', choices=POOL_KINDS, default=None,
+                            help="Run the workers as threads or processes (default: RECOMMENDER_POOL).")
+
+    def handle(self, *args, **options):
+        model = model_store.load_active_model()
+        if model is None:
+            raise CommandError("No trained recommender model; run train_recommender first.")
+
+        started = time.monotonic()
+
+        def progress(done, total):
+            self.stdout.write(f"  {done}/{total} users", ending='\r')
+
+        written = materialize_recommendations(
+            model,
+            k=options['top_k'] or get_top_k(),
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+            pool=options['pool'],
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored recommendations for {written} users from model {model.version} in {elapsed:.2f}s."
+        ))
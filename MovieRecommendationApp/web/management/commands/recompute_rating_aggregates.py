@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from web.aggregates import recompute_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = "Rebuild Movie.rating_sum / Movie.rating_count from the Myrating table (backfill or repair)."
+
+    def handle(self, *args, **options):
+        updated = recompute_rating_aggregates()
+        self.stdout.write(self.style.SUCCESS(f"Recomputed rating aggregates for {updated} movies."))
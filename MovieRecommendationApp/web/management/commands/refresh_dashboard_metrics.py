@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from web.dashboard import refresh_dashboard_metrics
+
+
+class Command(BaseCommand):
+    help = "Recompute the admin dashboard metrics snapshot (totals, genre report, top users)."
+
+    def handle(self, *args, **options):
+        metrics = refresh_dashboard_metrics()
+        self.stdout.write(self.style.SUCCESS(
+            f"Dashboard metrics refreshed: {metrics.user_count} users, {metrics.movie_count} movies, "
+            f"{metrics.rating_count} ratings, {len(metrics.genres)} genres."
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from web.popularity import ALL_GENRES, refresh_popularity
+
+
+class Command(BaseCommand):
+    help = "Recompute the cached popularity ranking used for cold-start recommendations."
+
+    def handle(self, *args, **options):
+        ranking = refresh_popularity()
+        self.stdout.write(self.style.SUCCESS(
+            f"Cached popularity ranking: {len(ranking[ALL_GENRES])} movies overall, "
+            f"{len(ranking) - 1} genre slices."
+        ))
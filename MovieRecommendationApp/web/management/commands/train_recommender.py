@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from web import model_store
+from web.recommendation import TRAINERS
+
+
+class Command(BaseCommand):
+    help = "Train the collaborative-filtering model and publish it as the active recommender version."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--if-stale', action='store_true',
+                            help="Only train when the active model is missing or older than RECOMMENDER_MODEL_MAX_AGE.")
+        parser.add_argument('--keep', type=int, default=3,
+                            help="Number of old inactive artifacts to keep on disk (default: 3).")
+        parser.add_argument('--trainer', choices=sorted(TRAINERS),
+                            help="Optimizer to use (default: the RECOMMENDER_TRAINER setting).")
+        parser.add_argument('--no-materialize', action='store_true',
+                            help="Don't refresh the per-user top-K lists after training.")
+
+    def handle(self, *args, **options):
+        if options['if_stale'] and not model_store.is_stale(model_store.get_active_record()):
+            self.stdout.write("Active recommender model is fresh; nothing to do.")
+            return
+
+        record = model_store.train_and_save(
+            trainer=options['trainer'],
+            materialize=False if options['no_materialize'] else None,
+        )
+        if record is None:
+            self.stdout.write(self.style.WARNING("No ratings in the database yet; no model trained."))
+            return
+
+        removed = model_store.prune_artifacts(keep=options['keep'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Trained model {record.version}: {record.num_users} users x {record.num_movies} movies "
+            f"from {record.num_ratings} ratings in {record.training_seconds:.2f}s "
+            f"(pruned {removed} old artifacts)."
+        ))
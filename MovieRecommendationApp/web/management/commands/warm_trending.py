@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from web.trending import TrendingUnavailable, refresh_trending
+
+
+class Command(BaseCommand):
+    help = "Fetch trending movies from Trakt into the cache so page views never wait on it."
+
+    def handle(self, *args, **options):
+        try:
+            movies = refresh_trending()
+        except TrendingUnavailable as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Cached {len(movies)} trending movies."))
@@ -0,0 +1,132 @@
+"""
+Precompute every user's top-K recommendations after a training run.
+
+Users are scored in chunks of the Theta @ X.T product, so memory is bounded by
+chunk_size x num_movies regardless of how many users there are, and chunks can
+be spread over a thread or process pool (web.parallel). The results go to
+UserRecommendation, one row per user, which is all /recommend/ has to read.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .models import Myrating, UserRecommendation
+from .parallel import WorkerPool
+from .recommendation import load_ratings
+
+
+def get_top_k():
+    return getattr(settings, 'RECOMMENDER_MATERIALIZED_TOP_K', 50)
+
+
+def top_k_chunk(X, Ymean, Theta_chunk, rated_rows, rated_cols, k):
+    """
+    Top-k movie indices and scores for a chunk of users, best first.
+
+    rated_rows/rated_cols are (user within chunk, movie index) pairs to exclude.
+    Excluded movies that still make the cut (users who rated nearly everything)
+    come back with a score of -inf.
+    """
+    scores = Theta_chunk.dot(X.T).astype(np.float32)
+    scores += Ymean.astype(np.float32)
+    scores[rated_rows, rated_cols] = -np.inf
+
+    k = min(k, scores.shape[1])
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+
+def _top_k_task(X, Ymean, Theta_chunk, rated_rows, rated_cols, k):
+    """Pool task: top_k_chunk with X and Ymean passed as shared handles."""
+    return top_k_chunk(X.array, Ymean.array, Theta_chunk, rated_rows, rated_cols, k)
+
+
+def _rated_by_user_index(model):
+    """Observed ratings as (user index, movie index) arrays sorted by user, plus per-user bounds."""
+    user_ids, movie_ids, _ = load_ratings()
+    user_idx = np.searchsorted(model.user_ids, user_ids)
+    movie_idx = np.searchsorted(model.movie_ids, movie_ids)
+    user_idx = np.minimum(user_idx, len(model.user_ids) - 1)
+    movie_idx = np.minimum(movie_idx, len(model.movie_ids) - 1)
+    known = (model.user_ids[user_idx] == user_ids) & (model.movie_ids[movie_idx] == movie_ids)
+    user_idx, movie_idx = user_idx[known], movie_idx[known]
+
+    order = np.argsort(user_idx, kind='stable')
+    user_idx, movie_idx = user_idx[order], movie_idx[order]
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(user_idx, minlength=len(model.user_ids)))))
+    return movie_idx, bounds
+
+
+def _save_chunk(model, start, top_idx, top_scores):
+    """Replace the stored lists of a chunk of users. Returns the number of lists written."""
+    rows = []
+    for offset in range(top_idx.shape[0]):
+        keep = np.isfinite(top_scores[offset])
+        rows.append(UserRecommendation(
+            user_id=int(model.user_ids[start + offset]),
+            model_version=model.version or '',
+            movie_ids=model.movie_ids[top_idx[offset][keep]].astype(np.int32).tobytes(),
+            scores=top_scores[offset][keep].astype(np.float32).tobytes(),
+        ))
+    user_ids = [row.user_id for row in rows]
+    with transaction.atomic():
+        if model.ratings_as_of is not None:
+            # Users who rated since training read the ratings would get a list that is
+            # already out of date; they are served from their fold-in on the live model
+            changed = set(Myrating.objects.filter(user_id__in=user_ids, updated_at__gte=model.ratings_as_of)
+                          .values_list('user_id', flat=True))
+            rows = [row for row in rows if row.user_id not in changed]
+        UserRecommendation.objects.filter(user_id__in=user_ids).delete()
+        UserRecommendation.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def score_top_k(X, Ymean, Theta, rated_movies, bounds, k, chunk_size=1024, workers=None, pool=None):
+    """
+    Yield (first user index, top-k movie indices, scores) for consecutive chunks of
+    chunk_size users, in order. rated_movies[bounds[u]:bounds[u + 1]] are the
+    movies user u rated, which are excluded. Chunks are scored on a
+    web.parallel.WorkerPool (default RECOMMENDER_WORKERS / RECOMMENDER_POOL), with
+    X and Ymean shared rather than sent with every chunk.
+    """
+    num_users = Theta.shape[0]
+
+    def chunk_args(start):
+        stop = min(start + chunk_size, num_users)
+        lo, hi = bounds[start], bounds[stop]
+        rated_rows = np.repeat(np.arange(stop - start), np.diff(bounds[start:stop + 1]))
+        return Theta[start:stop], rated_rows, rated_movies[lo:hi]
+
+    starts = range(0, num_users, chunk_size)
+    with WorkerPool(workers, pool) as worker_pool:
+        X_shared, Ymean_shared = worker_pool.share(X), worker_pool.share(Ymean)
+        tasks = ((X_shared, Ymean_shared, *chunk_args(start), k) for start in starts)
+        for start, (top_idx, top_scores) in zip(starts, worker_pool.starmap(_top_k_task, tasks)):
+            yield start, top_idx, top_scores
+
+
+def materialize_recommendations(model, k=None, chunk_size=1024, workers=None, pool=None, progress=None):
+    """
+    Store the top-k list of every user in model. Returns the number of lists written.
+
+    Users whose ratings changed after model.ratings_as_of are skipped. Scoring
+    runs on workers threads or processes (see score_top_k) while this process
+    writes the results. progress, if given, is called with (users_done,
+    total_users) after each chunk.
+    """
+    k = k or get_top_k()
+    num_users = len(model.user_ids)
+    if num_users == 0:
+        return 0
+    rated_movies, bounds = _rated_by_user_index(model)
+
+    done = written = 0
+    for start, top_idx, top_scores in score_top_k(model.X, model.Ymean, model.Theta, rated_movies, bounds, k,
+                                                  chunk_size, workers, pool):
+        written += _save_chunk(model, start, top_idx, top_scores)
+        done += top_idx.shape[0]
+        if progress:
+            progress(done, num_users)
+    return written
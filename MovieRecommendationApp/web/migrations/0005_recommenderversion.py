@@ -0,0 +1,30 @@
+# Generated by Django 4.2.23 on 2026-10-17 22:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0004_watchlist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommenderVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.CharField(max_length=32, unique=True)),
+                ('artifact_path', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('num_users', models.IntegerField(default=0)),
+                ('num_movies', models.IntegerField(default=0)),
+                ('num_ratings', models.IntegerField(default=0)),
+                ('training_seconds', models.FloatField(default=0)),
+                ('is_active', models.BooleanField(default=False)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
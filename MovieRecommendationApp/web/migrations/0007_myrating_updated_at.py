@@ -0,0 +1,20 @@
+# Generated by Django 4.2.23 on 2026-10-17 22:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0006_userrecommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='myrating',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.23 on 2026-10-17 22:11
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Movie = apps.get_model('web', 'Movie')
+    Myrating = apps.get_model('web', 'Myrating')
+    ratings = Myrating.objects.filter(movie=OuterRef('pk')).order_by().values('movie')
+    Movie.objects.update(
+        rating_sum=Coalesce(Subquery(ratings.annotate(total=Sum('rating')).values('total')), Value(0),
+                            output_field=IntegerField()),
+        rating_count=Coalesce(Subquery(ratings.annotate(total=Count('id')).values('total')), Value(0),
+                              output_field=IntegerField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0007_myrating_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
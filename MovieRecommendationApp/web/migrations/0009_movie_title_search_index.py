@@ -0,0 +1,24 @@
+# Generated by Django 4.2.23 on 2026-10-17 22:20
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from web.search import ensure_fts_index
+    ensure_fts_index(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from web.search import drop_fts_index
+    drop_fts_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0008_movie_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
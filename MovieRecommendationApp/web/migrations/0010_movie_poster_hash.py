@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-17 22:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0009_movie_title_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='poster_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=16),
+        ),
+    ]
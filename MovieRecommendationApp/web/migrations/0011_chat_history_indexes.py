@@ -0,0 +1,21 @@
+# Generated by Django 4.2.23 on 2026-10-17 22:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0010_movie_poster_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session', 'timestamp'], name='web_chatmessage_session_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['user', 'start_time'], name='web_chatsession_user_start'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.23 on 2026-10-17 22:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0011_chat_history_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='summarized_through',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='summary',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
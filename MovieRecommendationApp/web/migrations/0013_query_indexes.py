@@ -0,0 +1,66 @@
+# Generated by Django 4.2.23 on 2026-10-17 22:33
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def remove_duplicate_ratings(apps, schema_editor):
+    """Keep the newest row of each duplicated (user, movie) pair so the unique constraint can be added."""
+    Movie = apps.get_model('web', 'Movie')
+    Myrating = apps.get_model('web', 'Myrating')
+    duplicates = (Myrating.objects.values('user_id', 'movie_id')
+                  .annotate(num=Count('id'), keep=Max('id')).filter(num__gt=1))
+    movie_ids = set()
+    for row in duplicates.iterator():
+        Myrating.objects.filter(user_id=row['user_id'], movie_id=row['movie_id'], id__lt=row['keep']).delete()
+        movie_ids.add(row['movie_id'])
+    if not movie_ids:
+        return
+    # Historical models have no signals, so repair the denormalized aggregates here
+    ratings = Myrating.objects.filter(movie=OuterRef('pk')).order_by().values('movie')
+    Movie.objects.filter(id__in=movie_ids).update(
+        rating_sum=Coalesce(Subquery(ratings.annotate(total=Sum('rating')).values('total')), Value(0),
+                            output_field=IntegerField()),
+        rating_count=Coalesce(Subquery(ratings.annotate(total=Count('id')).values('total')), Value(0),
+                              output_field=IntegerField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('web', '0012_chatsession_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_ratings, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='myrating',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(fields=['created_at'], name='web_feedback_created'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['genre'], name='web_movie_genre'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['title'], name='web_movie_title'),
+        ),
+        migrations.AddIndex(
+            model_name='watchlist',
+            index=models.Index(fields=['user', 'added_at'], name='web_watchlist_user_added'),
+        ),
+        migrations.AddConstraint(
+            model_name='myrating',
+            constraint=models.UniqueConstraint(fields=('user', 'movie'), name='web_myrating_user_movie_uniq'),
+        ),
+    ]
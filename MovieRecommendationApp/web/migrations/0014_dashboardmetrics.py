@@ -0,0 +1,27 @@
+# Generated by Django 4.2.23 on 2026-10-17 22:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0013_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardMetrics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_count', models.IntegerField(default=0)),
+                ('movie_count', models.IntegerField(default=0)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('genres', models.JSONField(default=list)),
+                ('top_users', models.JSONField(default=list)),
+                ('refreshed_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+    ]
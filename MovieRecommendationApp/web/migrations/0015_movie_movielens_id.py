@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-17 22:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0014_dashboardmetrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='movielens_id',
+            field=models.IntegerField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
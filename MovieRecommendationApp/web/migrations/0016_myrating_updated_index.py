@@ -0,0 +1,17 @@
+# Generated by Django 4.2.23 on 2026-10-17 22:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0015_movie_movielens_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='myrating',
+            index=models.Index(fields=['updated_at'], name='web_myrating_updated'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-17 23:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0016_myrating_updated_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='poster_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,316 @@
+"""
+Persisted factor store for the collaborative-filtering recommender.
+
+Training runs offline (``manage.py train_recommender`` or the background job
+below) and writes a versioned ``.npz`` artifact. Requests only load the active
+artifact once per process and do a top-N lookup against it.
+"""
+import datetime
+import logging
+import os
+import threading
+import time
+from itertools import groupby
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Myrating, RecommenderVersion
+from .recommendation import fold_in_user, top_n_items, train_factors
+from .similarity import build_similarity_index
+from .snapshot import HIGH_WATER_OVERLAP
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_KEYS = ('X', 'Theta', 'Ymean', 'movie_ids', 'user_ids')
+
+
+def get_model_dir():
+    return getattr(settings, 'RECOMMENDER_MODEL_DIR', os.path.join(settings.BASE_DIR, 'recommender_models'))
+
+
+def get_max_age():
+    """Seconds after which the active model counts as stale (None disables the check)."""
+    return getattr(settings, 'RECOMMENDER_MODEL_MAX_AGE', 60 * 60)
+
+
+class FactorModel:
+    """
+    Trained factors plus the id <-> matrix index maps needed to serve them.
+
+    Users whose ratings changed since training are folded in (see fold_in): their
+    new Theta row is kept in an overlay and in Django's cache, without touching the
+    trained arrays. Other workers see it only if CACHES is a shared backend; with the
+    default local-memory cache a fold-in is per process, and the others serve the
+    trained row until they fold the user in themselves or the model is retrained.
+    ratings_as_of is when training read the ratings; changes from then on may be
+    missing from Theta.
+    """
+
+    def __init__(self, version, X, Theta, Ymean, movie_ids, user_ids, trained_at=None, ratings_as_of=None):
+        self.version = version
+        self.X = X
+        self.Theta = Theta
+        self.Ymean = Ymean
+        self.movie_ids = movie_ids
+        self.user_ids = user_ids
+        self.trained_at = trained_at
+        self.ratings_as_of = ratings_as_of
+        self.user_index = {int(user_id): idx for idx, user_id in enumerate(user_ids)}
+        self.movie_index = {int(movie_id): idx for idx, movie_id in enumerate(movie_ids)}
+        self.folded_users = {}
+        # "More like this" index over the movie factors, rebuilt with every model version
+        self.similarity = build_similarity_index(X, movie_ids)
+
+    @classmethod
+    def load(cls, path, version=None, trained_at=None, ratings_as_of=None):
+        with np.load(path) as data:
+            arrays = {key: data[key] for key in ARTIFACT_KEYS}
+        return cls(version, trained_at=trained_at, ratings_as_of=ratings_as_of, **arrays)
+
+    def _fold_in_cache_key(self, user_id):
+        return f'recommender:theta:{self.version}:{user_id}'
+
+    def user_factors(self, user_id):
+        """The user's Theta row, preferring a folded-in row over the trained one."""
+        theta = self.folded_users.get(user_id)
+        if theta is None:
+            theta = cache.get(self._fold_in_cache_key(user_id))
+        if theta is None:
+            idx = self.user_index.get(user_id)
+            theta = self.Theta[idx] if idx is not None else None
+        return theta
+
+    def has_user(self, user_id):
+        return self.user_factors(user_id) is not None
+
+    def predict(self, user_id):
+        """Predicted rating for every movie in the model, or None for an unknown user."""
+        theta = self.user_factors(user_id)
+        if theta is None:
+            return None
+        return self.X.dot(theta) + self.Ymean
+
+    def fold_in(self, user_id, movie_ids, ratings):
+        """
+        Re-solve user_id's Theta row from their current ratings with X fixed.
+
+        Movies the model has never seen are skipped until the next full retrain.
+        """
+        pairs = [(self.movie_index[movie_id], rating)
+                 for movie_id, rating in zip(movie_ids, ratings) if movie_id in self.movie_index]
+        movie_idx = [idx for idx, _ in pairs]
+        theta = fold_in_user(self.X, self.Ymean, movie_idx, [rating for _, rating in pairs])
+        self.folded_users[user_id] = theta
+        cache.set(self._fold_in_cache_key(user_id), theta, get_max_age())
+        return theta
+
+    def movie_mask(self, movie_ids):
+        """Boolean mask over the model's movies that is True for the given movie ids."""
+        mask = np.zeros(len(self.movie_ids), dtype=bool)
+        idx = [self.movie_index[movie_id] for movie_id in movie_ids if movie_id in self.movie_index]
+        mask[idx] = True
+        return mask
+
+    def recommend(self, user_id, exclude_movie_ids=(), n=12):
+        """Movie ids of the n best predictions for user_id, best first, skipping exclude_movie_ids."""
+        predictions = self.predict(user_id)
+        if predictions is None:
+            return []
+        return top_n_items(predictions, self.movie_ids, self.movie_mask(exclude_movie_ids), n)
+
+
+    def similar_movies(self, movie_id, n=10):
+        """Movie ids closest to movie_id in the learned factor space, best first."""
+        return self.similarity.similar(movie_id, n)
+
+
+def save_model(factors, training_seconds=0.0):
+    """Write factors to a new versioned artifact and make it the active model."""
+    model_dir = get_model_dir()
+    os.makedirs(model_dir, exist_ok=True)
+
+    version = timezone.now().strftime('%Y%m%d%H%M%S%f')
+    path = os.path.join(model_dir, f'factors-{version}.npz')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as fh:
+        np.savez(fh, **{key: factors[key] for key in ARTIFACT_KEYS})
+    os.replace(tmp_path, path)  # readers never see a half-written artifact
+
+    with transaction.atomic():
+        RecommenderVersion.objects.filter(is_active=True).update(is_active=False)
+        record = RecommenderVersion.objects.create(
+            version=version,
+            artifact_path=path,
+            num_users=len(factors['user_ids']),
+            num_movies=len(factors['movie_ids']),
+            num_ratings=factors.get('num_ratings', 0),
+            training_seconds=training_seconds,
+            is_active=True,
+        )
+    return record
+
+
+def ratings_cutoff(record):
+    """
+    When training of record's model read the ratings, less HIGH_WATER_OVERLAP for
+    rows saved just before but committed after; ratings changed since may be
+    missing from its Theta.
+    """
+    return record.created_at - datetime.timedelta(seconds=record.training_seconds) - HIGH_WATER_OVERLAP
+
+
+def train_and_save(trainer=None, materialize=None):
+    """
+    Run a full training pass and publish the result. Returns None if there are no ratings.
+
+    Users who rated during training are folded into the new model, so their
+    changes survive the switch. materialize (default:
+    RECOMMENDER_MATERIALIZE_AFTER_TRAINING) also refreshes every user's
+    precomputed top-K list from the new model.
+    """
+    started = time.monotonic()
+    factors = train_factors(trainer=trainer)
+    if factors is None:
+        return None
+    record = save_model(factors, training_seconds=time.monotonic() - started)
+    model = load_active_model(record)
+    if model is not None:
+        refold_changed_users(model)
+
+    if materialize is None:
+        materialize = getattr(settings, 'RECOMMENDER_MATERIALIZE_AFTER_TRAINING', True)
+    if materialize and model is not None:
+        from .materialize import materialize_recommendations
+        materialize_recommendations(model)
+    return record
+
+
+def prune_artifacts(keep=3):
+    """Delete all but the `keep` newest inactive artifacts (the active one is always kept)."""
+    stale = RecommenderVersion.objects.filter(is_active=False).order_by('-created_at')[keep:]
+    removed = 0
+    for record in stale:
+        try:
+            os.remove(record.artifact_path)
+        except FileNotFoundError:
+            pass
+        record.delete()
+        removed += 1
+    return removed
+
+
+def is_stale(record):
+    max_age = get_max_age()
+    if record is None:
+        return True
+    if max_age is None:
+        return False
+    return (timezone.now() - record.created_at).total_seconds() > max_age
+
+
+# --- Per-process cache of the loaded active model ---
+_loaded = {'version': None, 'model': None}
+_load_lock = threading.Lock()
+
+
+def get_active_record():
+    return RecommenderVersion.objects.filter(is_active=True).order_by('-created_at').first()
+
+
+def load_active_model(record=None):
+    """Return the active FactorModel, loading it from disk only when the version changes."""
+    record = record or get_active_record()
+    if record is None:
+        return None
+    with _load_lock:
+        if _loaded['version'] != record.version:
+            try:
+                model = FactorModel.load(record.artifact_path, version=record.version, trained_at=record.created_at,
+                                         ratings_as_of=ratings_cutoff(record))
+            except (OSError, KeyError, ValueError):
+                logger.exception("Could not load recommender artifact %s", record.artifact_path)
+                return _loaded['model']
+            _loaded['version'] = record.version
+            _loaded['model'] = model
+        return _loaded['model']
+
+
+def fold_in_user_ratings(user_id):
+    """Refresh one user's factors in the served model from their stored ratings."""
+    model = load_active_model()
+    if model is None:
+        return None
+    rated = list(Myrating.objects.filter(user_id=user_id).values_list('movie_id', 'rating'))
+    return model.fold_in(user_id, [movie_id for movie_id, _ in rated], [rating for _, rating in rated])
+
+
+def refold_changed_users(model):
+    """
+    Fold every user whose ratings changed since model.ratings_as_of into model.
+
+    Fold-ins are cached per model version, so those made against the previous
+    model are not served by this one; run this when a model is activated.
+    Returns the number of users folded in.
+    """
+    if model.ratings_as_of is None:
+        return 0
+    changed = Myrating.objects.filter(updated_at__gte=model.ratings_as_of).values('user_id')
+    rated = (Myrating.objects.filter(user_id__in=changed)
+             .order_by('user_id').values_list('user_id', 'movie_id', 'rating'))
+    folded = 0
+    for user_id, rows in groupby(rated.iterator(), key=lambda row: row[0]):
+        rows = list(rows)
+        model.fold_in(user_id, [movie_id for _, movie_id, _ in rows], [rating for _, _, rating in rows])
+        folded += 1
+    return folded
+
+
+def similar_movies(movie_id, n=10):
+    """Movies most similar to movie_id according to the active model ([] if unknown)."""
+    model = load_active_model()
+    if model is None:
+        return []
+    return model.similar_movies(movie_id, n)
+
+
+# --- Background retraining ---
+_training_lock = threading.Lock()
+
+
+def _background_train():
+    try:
+        train_and_save()
+    except Exception:
+        logger.exception("Background recommender training failed")
+    finally:
+        connection.close()
+        _training_lock.release()
+
+
+def start_background_training():
+    """Kick off a training thread unless one is already running. Returns True if started."""
+    if not getattr(settings, 'RECOMMENDER_BACKGROUND_TRAINING', True):
+        return False
+    if not _training_lock.acquire(blocking=False):
+        return False
+    thread = threading.Thread(target=_background_train, name='recommender-training', daemon=True)
+    thread.start()
+    return True
+
+
+def get_serving_model():
+    """
+    Model to serve the current request from.
+
+    Never trains inline: if the active model is missing or older than
+    RECOMMENDER_MODEL_MAX_AGE a background retrain is started and the current
+    (possibly stale, possibly None) model is returned.
+    """
+    record = get_active_record()
+    if is_stale(record):
+        start_background_training()
+    return load_active_model(record) if record is not None else None
@@ -1,3 +1,4 @@
+import numpy as np
 from django.contrib.auth.models import User
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
@@ -7,14 +8,58 @@ class Movie(models.Model):
     title = models.CharField(max_length=200)
     genre = models.CharField(max_length=100)
     movie_logo = models.FileField()
+    # Denormalized from Myrating (kept in sync by web.signals, repaired by recompute_rating_aggregates)
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    # Content hash naming the resized poster variants (see web.thumbnails); blank until generated
+    poster_hash = models.CharField(max_length=16, blank=True, default='', editable=False)
+    # Pixel width of the original poster; no variant is generated wider than this
+    poster_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    # movieId of titles loaded by `manage.py import_movielens`, so re-imports update them in place
+    movielens_id = models.IntegerField(null=True, blank=True, unique=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Genre filters in recommend, and the genre breakdowns in the admin
+            models.Index(fields=['genre'], name='web_movie_genre'),
+            # The manual-recommendation movie picker lists every title in order
+            models.Index(fields=['title'], name='web_movie_title'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the post_save hook tell whether a new poster was uploaded
+        instance._stored_logo = dict(zip(field_names, values)).get('movie_logo')
+        return instance
+
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.rating_count if self.rating_count else None
 
     def __str__(self):
         return self.title
 
 class Myrating(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # No index of its own: the (user, movie) constraint below leads with user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
     rating = models.IntegerField(default=1, validators=[MaxValueValidator(5), MinValueValidator(0)])
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # One rating per user and movie; also serves every per-user lookup
+        constraints = [models.UniqueConstraint(fields=['user', 'movie'], name='web_myrating_user_movie_uniq')]
+        # High-water mark of incremental training-snapshot exports (web.snapshot)
+        indexes = [models.Index(fields=['updated_at'], name='web_myrating_updated')]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what is stored so a later save can apply the right delta to Movie's aggregates
+        loaded = dict(zip(field_names, values))
+        instance._stored = (loaded.get('movie_id'), loaded.get('rating'))
+        return instance
 
 class Feedback(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -22,6 +67,10 @@ class Feedback(models.Model):
     comment = models.TextField(max_length=500)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # The landing page shows the newest feedback
+        indexes = [models.Index(fields=['created_at'], name='web_feedback_created')]
+
     def __str__(self):
         return f'Feedback from {self.user.username}'
 
@@ -35,6 +84,7 @@ class Watchlist(models.Model):
     class Meta:
         unique_together = ('user', 'movie_id')  # Prevent duplicate entries
         ordering = ['-added_at']  # Most recently added first
+        indexes = [models.Index(fields=['user', 'added_at'], name='web_watchlist_user_added')]
     
     def __str__(self):
         return f'{self.user.username} - {self.movie_title}'
@@ -43,6 +93,14 @@ class Watchlist(models.Model):
 class ChatSession(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     start_time = models.DateTimeField(auto_now_add=True)
+    # Rolling summary of the turns that no longer fit the chatbot's context window,
+    # covering every message with id <= summarized_through (see chatbot.context)
+    summary = models.TextField(blank=True, default='')
+    summarized_through = models.IntegerField(default=0)
+
+    class Meta:
+        # The chat sidebar pages through a user's sessions newest first
+        indexes = [models.Index(fields=['user', 'start_time'], name='web_chatsession_user_start')]
 
     def __str__(self):
         return f"{self.user.username}'s session on {self.start_time.strftime('%Y-%m-%d')}"
@@ -53,6 +111,67 @@ class ChatMessage(models.Model):
     message_text = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Chat history is paged newest first within a session (see chatbot.history)
+        indexes = [models.Index(fields=['session', 'timestamp'], name='web_chatmessage_session_ts')]
+
     def __str__(self):
         sender = "User" if self.is_user else "Bot"
-        return f"{sender}: {self.message_text[:30]}..."
\ No newline at end of file
+        return f"{sender}: {self.message_text[:30]}..."
+
+class RecommenderVersion(models.Model):
+    """One trained factor artifact on disk; the row with is_active=True is served."""
+    version = models.CharField(max_length=32, unique=True)
+    artifact_path = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+    num_users = models.IntegerField(default=0)
+    num_movies = models.IntegerField(default=0)
+    num_ratings = models.IntegerField(default=0)
+    training_seconds = models.FloatField(default=0)
+    is_active = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Recommender model {self.version}{' (active)' if self.is_active else ''}"
+
+
+class DashboardMetrics(models.Model):
+    """
+    Single-row snapshot behind the admin dashboard and genre report (see web.dashboard).
+    The totals are kept current by signals; the rankings are recomputed periodically.
+    """
+    user_count = models.IntegerField(default=0)  # non-superusers
+    movie_count = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    genres = models.JSONField(default=list)  # per-genre movie and rating totals, most movies first
+    top_users = models.JSONField(default=list)  # most active raters
+    refreshed_at = models.DateTimeField()  # last full recompute
+    updated_at = models.DateTimeField()  # last change of any kind
+
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.rating_count if self.rating_count else None
+
+    def __str__(self):
+        return f"Dashboard metrics as of {self.updated_at:%Y-%m-%d %H:%M}"
+
+
+class UserRecommendation(models.Model):
+    """Top-K movies for one user, precomputed after each training run."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='recommendation')
+    model_version = models.CharField(max_length=32)
+    movie_ids = models.BinaryField()  # int32 array, best first
+    scores = models.BinaryField()  # float32 array aligned with movie_ids
+    created_at = models.DateTimeField(auto_now=True)
+
+    def movie_id_list(self):
+        return np.frombuffer(bytes(self.movie_ids), dtype=np.int32).tolist()
+
+    def score_list(self):
+        return np.frombuffer(bytes(self.scores), dtype=np.float32).tolist()
+
+    def __str__(self):
+        return f"Recommendations for {self.user.username} (model {self.model_version})"
@@ -0,0 +1,160 @@
+"""
+Worker pools and shared-memory arrays for the recommender's parallel paths.
+
+Blocked ALS (web.recommendation.ALSTrainer), cross-validation folds
+(cross_validate) and batched top-K scoring (web.materialize) hand independent
+pieces of work to a WorkerPool. RECOMMENDER_WORKERS sets how many run at once
+(1 runs everything inline, with no pool) and RECOMMENDER_POOL picks threads or
+processes. Threads suit the NumPy-heavy steps, which release the GIL; processes
+sidestep it entirely at the cost of start-up and of sharing inputs.
+
+Large inputs and outputs are passed with pool.share() / pool.empty(): for a
+process pool they live in multiprocessing shared memory and pickle as a small
+handle that workers attach to, so factor matrices and rating arrays are never
+copied per task, and workers write results straight into the shared output.
+For threads and inline runs the handle just wraps the array. Either way a task
+reads the array through handle.array.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from django.conf import settings
+
+POOL_KINDS = ('thread', 'process')
+
+
+def get_workers():
+    return getattr(settings, 'RECOMMENDER_WORKERS', 1)
+
+
+def get_pool_kind():
+    return getattr(settings, 'RECOMMENDER_POOL', 'thread')
+
+
+class LocalArray:
+    """Handle to an array the workers can already see (threads, or no pool at all)."""
+
+    def __init__(self, array):
+        self.array = array
+
+    def close(self):
+        pass
+
+
+# Segments this worker process has attached to, by name; kept open for the process's lifetime
+_attached = {}
+
+
+class SharedArray:
+    """
+    A NumPy array in multiprocessing shared memory. Pickling sends only the
+    segment's name, shape and dtype; unpickling in a worker attaches to it.
+    """
+
+    def __init__(self, shape, dtype):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)  # zero-size segments are not allowed
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self.name = self._shm.name
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+
+    @classmethod
+    def copy_of(cls, array):
+        array = np.asarray(array)
+        shared = cls(array.shape, array.dtype)
+        shared.array[...] = array
+        return shared
+
+    def __getstate__(self):
+        return {'name': self.name, 'shape': self.shape, 'dtype': self.dtype.str}
+
+    def __setstate__(self, state):
+        self.name, self.shape, self.dtype = state['name'], state['shape'], np.dtype(state['dtype'])
+        shm = _attached.get(self.name)
+        if shm is None:
+            # Pool workers share the creating process's resource tracker, so attaching
+            # registers nothing new and the creator's close() still unlinks the segment
+            shm = _attached[self.name] = shared_memory.SharedMemory(name=self.name)
+        self._shm = None
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+
+    def close(self):
+        """Release and delete the segment (creator only)."""
+        if self._shm is not None:
+            self.array = None
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+class WorkerPool:
+    """
+    Run tasks on workers threads or processes (defaults: RECOMMENDER_WORKERS,
+    RECOMMENDER_POOL); with one worker, inline. Use as a context manager: arrays
+    from share()/empty() are released when it exits.
+    """
+
+    def __init__(self, workers=None, kind=None):
+        self.workers = max(int(workers or get_workers()), 1)
+        self.kind = kind or get_pool_kind()
+        if self.kind not in POOL_KINDS:
+            raise ValueError(f"Unknown pool kind {self.kind!r}; expected one of {', '.join(POOL_KINDS)}")
+        self._executor = None
+        self._arrays = []
+
+    @property
+    def uses_processes(self):
+        return self.workers > 1 and self.kind == 'process'
+
+    def __enter__(self):
+        if self.workers > 1:
+            executor = ProcessPoolExecutor if self.kind == 'process' else ThreadPoolExecutor
+            self._executor = executor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        for shared in self._arrays:
+            shared.close()
+        self._arrays = []
+
+    def share(self, array):
+        """A handle to array that tasks can read (and write) through .array."""
+        if not self.uses_processes:
+            return LocalArray(array)
+        shared = SharedArray.copy_of(array)
+        self._arrays.append(shared)
+        return shared
+
+    def empty(self, shape, dtype=np.float64, fill=0):
+        """A handle to a new array filled with fill, e.g. for workers to write results into."""
+        if not self.uses_processes:
+            return LocalArray(np.full(shape, fill, dtype=dtype))
+        shared = SharedArray(shape, dtype)
+        shared.array.fill(fill)
+        self._arrays.append(shared)
+        return shared
+
+    def starmap(self, fn, arg_tuples):
+        """Iterator over fn(*args) for each tuple in arg_tuples, in order. fn must be a module-level function."""
+        if self._executor is None:
+            return (fn(*args) for args in arg_tuples)
+        return self._executor.map(_call, ((fn, args) for args in arg_tuples))
+
+
+def _call(task):
+    fn, args = task
+    return fn(*args)
+
+
+def default_workers():
+    """Number of CPUs this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        return os.cpu_count() or 1
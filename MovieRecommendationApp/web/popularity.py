@@ -0,0 +1,156 @@
+"""
+Maintained popularity ranking used for cold-start and fallback recommendations.
+
+The ranking is computed with one aggregate over Myrating and kept in Django's
+cache. Ratings do not invalidate it: for POPULARITY_CACHE_TIMEOUT seconds it is
+served as-is, then for up to POPULARITY_STALE_TTL more seconds the stale ranking
+is still served while one background thread recomputes it (or run
+``manage.py refresh_popularity`` from cron to replace it ahead of time). Serving
+a fallback list then costs a cache read plus one in_bulk query for the Movie rows,
+however many ratings exist. Only a cold cache computes inline, in one worker;
+the others rank by the denormalized Movie.rating_count until it is published.
+"""
+import logging
+import threading
+import time
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Movie, Myrating
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'popularity:ranking'
+REFRESH_LOCK_KEY = 'popularity:refreshing'
+REFRESH_LOCK_TIMEOUT = 10 * 60  # outlives any recompute, so a crashed one cannot block refreshes for long
+ALL_GENRES = '__all__'
+MAX_RANKED = 200  # movies kept per slice
+
+
+def get_cache_timeout():
+    return getattr(settings, 'POPULARITY_CACHE_TIMEOUT', 15 * 60)
+
+
+def get_stale_ttl():
+    return getattr(settings, 'POPULARITY_STALE_TTL', 24 * 60 * 60)
+
+
+def get_half_life_days():
+    """Ratings lose half their weight after this many days; None counts every rating equally."""
+    return getattr(settings, 'POPULARITY_HALF_LIFE_DAYS', None)
+
+
+def _movie_scores(half_life_days):
+    """(movie_ids, scores) arrays: rating counts, or exponentially time-decayed counts."""
+    if half_life_days is None:
+        counts = Myrating.objects.values('movie_id').annotate(num_ratings=Count('id')).values_list('movie_id', 'num_ratings')
+        data = np.array(list(counts), dtype=np.float64).reshape(-1, 2)
+        return data[:, 0].astype(np.int64), data[:, 1]
+
+    now = timezone.now()
+    rows = Myrating.objects.values_list('movie_id', 'updated_at').iterator(chunk_size=10000)
+    dtype = [('movie_id', np.int64), ('age_days', np.float64)]
+    data = np.fromiter(((movie_id, (now - updated_at).total_seconds() / 86400.0) for movie_id, updated_at in rows), dtype=dtype)
+    movie_ids, inverse = np.unique(data['movie_id'], return_inverse=True)
+    weights = np.power(0.5, data['age_days'] / half_life_days)
+    return movie_ids, np.bincount(inverse, weights=weights, minlength=len(movie_ids))
+
+
+def compute_popularity(half_life_days=None):
+    """
+    Ranked movie ids overall and per genre: {ALL_GENRES: [...], 'Comedy': [...], ...}.
+
+    Multi-genre titles ("Comedy|Romance") count towards each of their genres.
+    """
+    movie_ids, scores = _movie_scores(half_life_days)
+    order = np.lexsort((movie_ids, -scores))  # most popular first, ties by id
+    ranked = movie_ids[order].tolist()
+
+    genres = dict(Movie.objects.values_list('id', 'genre').iterator(chunk_size=10000))
+    # Pad with unrated titles so a young catalog still fills the fallback grid
+    top = ranked[:MAX_RANKED]
+    if len(top) < MAX_RANKED:
+        rated = set(top)
+        top += [movie_id for movie_id in sorted(genres) if movie_id not in rated][:MAX_RANKED - len(top)]
+    ranking = {ALL_GENRES: top}
+    for movie_id in ranked:
+        for genre in (genres.get(movie_id) or '').split('|'):
+            if genre:
+                ranked_genre = ranking.setdefault(genre, [])
+                if len(ranked_genre) < MAX_RANKED:
+                    ranked_genre.append(movie_id)
+    return ranking
+
+
+def refresh_popularity():
+    """Recompute the ranking and publish it to the cache. Returns the ranking."""
+    ranking = compute_popularity(get_half_life_days())
+    cache.set(CACHE_KEY, {'ranking': ranking, 'computed_at': time.time()}, get_cache_timeout() + get_stale_ttl())
+    return ranking
+
+
+def _background_refresh():
+    try:
+        refresh_popularity()
+    except Exception:
+        logger.exception("Background popularity refresh failed")
+    finally:
+        connection.close()
+        cache.delete(REFRESH_LOCK_KEY)
+
+
+def start_background_refresh():
+    """
+    Recompute the ranking in a daemon thread unless a refresh is already running.
+    Returns True if started.
+    """
+    if not getattr(settings, 'POPULARITY_BACKGROUND_REFRESH', True):
+        return False
+    # cache.add is atomic, so only one worker recomputes even with many concurrent stale hits
+    if not cache.add(REFRESH_LOCK_KEY, True, REFRESH_LOCK_TIMEOUT):
+        return False
+    thread = threading.Thread(target=_background_refresh, name='popularity-refresh', daemon=True)
+    thread.start()
+    return True
+
+
+def get_ranking():
+    """
+    The cached ranking. A stale one is returned as-is while a background refresh
+    replaces it; a cold cache is computed inline by whichever caller takes the
+    refresh lock. Returns None to the others while that computation runs.
+    """
+    entry = cache.get(CACHE_KEY)
+    if entry is None:
+        if not cache.add(REFRESH_LOCK_KEY, True, REFRESH_LOCK_TIMEOUT):
+            return None
+        try:
+            return refresh_popularity()
+        finally:
+            cache.delete(REFRESH_LOCK_KEY)
+    if time.time() - entry['computed_at'] > get_cache_timeout():
+        start_background_refresh()
+    return entry['ranking']
+
+
+def _most_rated_movie_ids(n, genre=None):
+    """Stand-in ranking by the denormalized Movie.rating_count (no time decay), most rated first."""
+    movies = Movie.objects.order_by('-rating_count', 'id')
+    if genre is None:
+        return list(movies.values_list('id', flat=True)[:n])
+    rows = movies.filter(genre__contains=genre).values_list('id', 'genre').iterator(chunk_size=n)
+    return list(islice((movie_id for movie_id, genres in rows if genre in genres.split('|')), n))
+
+
+def popular_movie_ids(n=12, genre=None):
+    """Ids of the n most popular movies, optionally within one genre."""
+    ranking = get_ranking()
+    if ranking is None:
+        return _most_rated_movie_ids(n, genre)
+    return ranking.get(genre or ALL_GENRES, [])[:n]
@@ -0,0 +1,105 @@
+"""
+Indexed movie-title search.
+
+On SQLite the titles are mirrored into an FTS5 table (web_movie_fts) kept in
+sync by triggers on web_movie, so inserts, updates, deletes and bulk_create are
+all indexed without application code. Each search word is matched as a token
+prefix ("star wa" finds "Star Wars"). Other databases, or SQLite builds without
+FTS5, fall back to title__icontains.
+
+Results come back ordered by movie id so they can be paged with the same
+keyset cursor as the unfiltered list.
+"""
+import re
+
+from django.db import connection
+
+FTS_TABLE = 'web_movie_fts'
+
+FTS_SCHEMA = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"title, content='web_movie', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON web_movie BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, title) VALUES (new.id, new.title); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON web_movie BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title) VALUES ('delete', old.id, old.title); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title ON web_movie BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title) VALUES ('delete', old.id, old.title); "
+    f"INSERT INTO {FTS_TABLE}(rowid, title) VALUES (new.id, new.title); END",
+]
+
+TRIGGER_NAMES = [f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au']
+
+
+def ensure_fts_index(using=connection):
+    """
+    Create the FTS table and triggers if they are missing, rebuilding the index when
+    anything had to be (re)created. SQLite migrations that remake web_movie drop its
+    triggers, so this runs after every migrate. Returns True if FTS is in place.
+    """
+    if using.vendor != 'sqlite':
+        return False
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (%s)" % ', '.join(['%s'] * (len(TRIGGER_NAMES) + 1)),
+            [FTS_TABLE] + TRIGGER_NAMES,
+        )
+        if len(cursor.fetchall()) == len(TRIGGER_NAMES) + 1:
+            return True
+        try:
+            for statement in FTS_SCHEMA:
+                cursor.execute(statement)
+        except Exception:  # SQLite compiled without FTS5
+            return False
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+_fts_ready = set()  # aliases known to have the FTS table; avoids a lookup per search
+
+
+def fts_available(using=connection):
+    if using.vendor != 'sqlite':
+        return False
+    if using.alias in _fts_ready:
+        return True
+    with using.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [FTS_TABLE])
+        if cursor.fetchone() is None:
+            return False
+    _fts_ready.add(using.alias)
+    return True
+
+
+def drop_fts_index(using=connection):
+    if using.vendor != 'sqlite':
+        return
+    with using.cursor() as cursor:
+        for name in TRIGGER_NAMES:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    _fts_ready.discard(using.alias)
+
+
+def build_match_query(text):
+    """FTS5 MATCH expression: every word must appear as a token prefix."""
+    words = re.findall(r'\w+', text.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_movie_ids(text, after=0, limit=50):
+    """Ids (ascending, greater than after) of up to limit movies whose title matches text."""
+    from .models import Movie
+
+    match = build_match_query(text)
+    if not match:
+        return []
+    if fts_available():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid > %s ORDER BY rowid LIMIT %s",
+                [match, after, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+    return list(Movie.objects.filter(title__icontains=text, id__gt=after)
+                .order_by('id').values_list('id', flat=True)[:limit])
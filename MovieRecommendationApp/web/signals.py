@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .aggregates import apply_rating_delta, stored_rating
+from .dashboard import apply_metrics_delta
+from .models import Movie, Myrating, UserRecommendation
+from .thumbnails import generate_thumbnails
+
+
+def _ratings_changed(user_id):
+    # The precomputed list no longer reflects this user's ratings; serve from the live model
+    UserRecommendation.objects.filter(user_id=user_id).delete()
+    if not getattr(settings, 'RECOMMENDER_FOLD_IN', True):
+        return
+    from .model_store import fold_in_user_ratings
+    transaction.on_commit(lambda: fold_in_user_ratings(user_id))
+
+
+@receiver(pre_save, sender=Myrating)
+def rating_about_to_save(sender, instance, **kwargs):
+    instance._previous = stored_rating(instance)
+
+
+@receiver(post_save, sender=Myrating)
+def rating_saved(sender, instance, created, **kwargs):
+    # Keep Movie.rating_sum/rating_count in step; an update_or_create that changes a rating applies only the delta
+    old_movie_id, old_rating = (None, None) if created else instance._previous
+    if old_movie_id == instance.movie_id:
+        apply_rating_delta(instance.movie_id, instance.rating - old_rating, 0)
+    else:
+        apply_rating_delta(old_movie_id, -(old_rating or 0), -1)
+        apply_rating_delta(instance.movie_id, instance.rating, 1)
+    instance._stored = (instance.movie_id, instance.rating)
+    apply_metrics_delta(rating_count=1 if created else 0, rating_sum=instance.rating - (old_rating or 0))
+
+    # Re-solve only this user's factors so the new rating shows up without a full retrain
+    _ratings_changed(instance.user_id)
+
+
+@receiver(post_delete, sender=Myrating)
+def rating_deleted(sender, instance, **kwargs):
+    movie_id, rating = getattr(instance, '_stored', None) or (instance.movie_id, instance.rating)
+    apply_rating_delta(movie_id, -rating, -1)
+    apply_metrics_delta(rating_count=-1, rating_sum=-rating)
+    _ratings_changed(instance.user_id)
+
+
+@receiver(post_save, sender=Movie)
+def movie_saved(sender, instance, created, **kwargs):
+    # Build the resized poster variants whenever a poster is uploaded or replaced, once the row is committed
+    # so a rolled-back save leaves no files behind and the save itself never waits on image resizing
+    poster_changed = created or instance.movie_logo.name != getattr(instance, '_stored_logo', None)
+    if instance.movie_logo and (poster_changed or not instance.poster_hash):
+        transaction.on_commit(lambda: generate_thumbnails(instance))
+    instance._stored_logo = instance.movie_logo.name
+    if created:
+        apply_metrics_delta(movie_count=1)
+
+
+@receiver(post_delete, sender=Movie)
+def movie_deleted(sender, instance, **kwargs):
+    apply_metrics_delta(movie_count=-1)
+
+
+# The dashboard's user total counts non-superusers
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created and not instance.is_superuser:
+        apply_metrics_delta(user_count=1)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    if not instance.is_superuser:
+        apply_metrics_delta(user_count=-1)
@@ -0,0 +1,259 @@
+"""
+Columnar snapshot of the ratings the recommender trains on.
+
+Reading every Myrating row through the ORM builds a Python tuple per rating;
+at MovieLens scale that dominates training input time. export_snapshot()
+instead keeps (user_id, movie_id, rating) in three typed ``.npy`` columns
+(int32, int32, int8) under RECOMMENDER_SNAPSHOT_DIR, and load_snapshot()
+memory-maps them, so training reads its input sequentially straight from disk.
+
+The snapshot is an append-only log: a later row for the same (user, movie)
+overrides an earlier one, which build_rating_index() already resolves by
+keeping the last occurrence. manifest.json records how many rows are valid and
+a high-water mark (when the last export read the table, and the highest id it
+saw), so an incremental export only reads and appends ratings whose updated_at
+is later. Deletions
+leave no trace to append; they are detected by comparing row counts and
+trigger a full rewrite, as does a log grown to COMPACT_RATIO times the live
+ratings. A full rewrite writes a new generation of files before switching the
+manifest to it, so a trainer still mapping the old files is unaffected.
+Exports hold an flock on LOCK_FILE in the snapshot directory, so a management
+command and a web worker never append to or rewrite the same files at once.
+"""
+import datetime
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Myrating
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; exports are then only serialized within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+COLUMNS = (('user_id', np.int32), ('movie_id', np.int32), ('rating', np.int8))
+EXPORT_BATCH = 50000
+COMPACT_RATIO = 2
+# Re-read this far behind the high-water mark, for rows whose updated_at was set
+# before the last export but committed after it; re-appending a row is harmless
+HIGH_WATER_OVERLAP = datetime.timedelta(minutes=1)
+
+MANIFEST = 'manifest.json'
+LOCK_FILE = '.export.lock'
+_WIDE_DTYPE = [(name, np.int64) for name, _ in COLUMNS]
+_INT32_MAX = np.iinfo(np.int32).max
+
+
+def get_snapshot_dir():
+    return getattr(settings, 'RECOMMENDER_SNAPSHOT_DIR', os.path.join(settings.BASE_DIR, 'training_snapshot'))
+
+
+@dataclass
+class SnapshotStats:
+    rows: int = 0  # valid rows in the snapshot, including superseded ones
+    appended: int = 0  # rows written by this export
+    rebuilt: bool = False  # True for a full rewrite, False for an incremental append
+    seconds: float = 0.0
+
+
+def column_path(directory, name, generation):
+    return os.path.join(directory, f'{name}-{generation}.npy')
+
+
+def read_manifest(directory=None):
+    """The snapshot's manifest dict, or None if there is no (readable) snapshot."""
+    try:
+        with open(os.path.join(directory or get_snapshot_dir(), MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)  # readers see the old manifest or the new one, never half of one
+
+
+def _database_name():
+    return str(connection.settings_dict['NAME'])
+
+
+def _is_usable(directory, manifest):
+    """False if manifest is missing, from another format or database, or names missing files."""
+    return (
+        manifest is not None
+        and manifest.get('format') == FORMAT_VERSION
+        and manifest.get('database') == _database_name()
+        and all(os.path.isfile(column_path(directory, name, manifest['generation'])) for name, _ in COLUMNS)
+    )
+
+
+def _read_batches(rows):
+    """Yield (user_id, movie_id, rating) int64 record arrays of up to EXPORT_BATCH rows from a values_list."""
+    iterator = rows.iterator(chunk_size=EXPORT_BATCH)
+    while (batch := np.fromiter(islice(iterator, EXPORT_BATCH), dtype=_WIDE_DTYPE)).size:
+        if max(batch['user_id'].max(), batch['movie_id'].max()) > _INT32_MAX:
+            raise ValueError("User or movie id too large for the int32 training snapshot")
+        yield batch
+
+
+def _high_water(started, max_id):
+    return {'max_id': max_id or 0, 'high_water': started.isoformat()}
+
+
+def _write_full(directory, previous):
+    """Write every rating to a new generation of column files and switch the manifest to it."""
+    generation = previous.get('generation', 0) + 1 if previous else 1
+    started = timezone.now()
+    with transaction.atomic():  # count and rows from one consistent read
+        count = Myrating.objects.count()
+        max_id = Myrating.objects.aggregate(max_id=Max('id'))['max_id']
+        columns = {}
+        for name, dtype in COLUMNS:
+            path = column_path(directory, name, generation)
+            if count:
+                columns[name] = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(count,))
+            else:
+                np.save(path, np.empty(0, dtype=dtype))
+        filled = 0
+        for batch in _read_batches(Myrating.objects.order_by('id').values_list('user_id', 'movie_id', 'rating')):
+            for name, _ in COLUMNS:
+                columns[name][filled:filled + batch.size] = batch[name]
+            filled += batch.size
+    for column in columns.values():
+        column.flush()
+    del columns
+
+    _write_manifest(directory, {
+        'format': FORMAT_VERSION,
+        'database': _database_name(),
+        'generation': generation,
+        'rows': filled,
+        'live_rows': count,
+        **_high_water(started, max_id),
+    })
+    # Old generations can go: a reader that still maps them keeps its open file
+    for path in glob.glob(os.path.join(directory, '*-*.npy')):
+        if not path.endswith(f'-{generation}.npy'):
+            os.remove(path)
+    return SnapshotStats(rows=filled, appended=filled, rebuilt=True)
+
+
+def _append_column(path, values, valid_rows):
+    """Append values to the .npy file at path after its first valid_rows rows, then update its header."""
+    with open(path, 'r+b') as f:
+        version = np.lib.format.read_magic(f)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        _, _, dtype = read_header(f)
+        offset = f.tell()
+        # Drop anything a crashed export appended past the manifest's row count
+        f.truncate(offset + valid_rows * dtype.itemsize)
+        f.seek(0, os.SEEK_END)
+        f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+        # Header last, so it never claims more rows than the file holds; numpy pads
+        # headers to leave room for the shape to grow, so this rewrites it in place
+        f.seek(0)
+        np.lib.format.write_array_header_1_0(
+            f, {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False,
+                'shape': (valid_rows + len(values),)},
+        )
+        if f.tell() != offset:
+            raise ValueError(f"{path}: header no longer fits in place")
+
+
+def _append_changes(directory, manifest):
+    """
+    Append ratings changed since manifest's high-water mark. Returns None (so
+    the caller rewrites the snapshot) if ratings were deleted since, or the log
+    would grow past COMPACT_RATIO times the live ratings.
+    """
+    since = datetime.datetime.fromisoformat(manifest['high_water']) - HIGH_WATER_OVERLAP
+    changed = Myrating.objects.filter(updated_at__gte=since)
+    started = timezone.now()
+    with transaction.atomic():
+        live = Myrating.objects.count()
+        inserted = Myrating.objects.filter(id__gt=manifest['max_id']).count()
+        if live != manifest['live_rows'] + inserted:
+            return None
+        max_id = Myrating.objects.aggregate(max_id=Max('id'))['max_id']
+        batches = list(_read_batches(changed.order_by('id').values_list('user_id', 'movie_id', 'rating')))
+    appended = sum(batch.size for batch in batches)
+    if manifest['rows'] + appended > COMPACT_RATIO * max(live, 1):
+        return None
+
+    if appended:
+        batch = np.concatenate(batches)
+        for name, _ in COLUMNS:
+            _append_column(column_path(directory, name, manifest['generation']), batch[name], manifest['rows'])
+    manifest = {**manifest, 'rows': manifest['rows'] + appended, 'live_rows': live, **_high_water(started, max_id)}
+    _write_manifest(directory, manifest)
+    return SnapshotStats(rows=manifest['rows'], appended=appended)
+
+
+_export_lock = threading.Lock()
+
+
+@contextmanager
+def _exclusive(directory):
+    """Hold the export lock for directory across threads and, where fcntl exists, processes."""
+    with _export_lock, open(os.path.join(directory, LOCK_FILE), 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)  # released when the file is closed
+        yield
+
+
+def export_snapshot(directory=None, full=False):
+    """
+    Bring the snapshot up to date with Myrating: append what changed since the
+    last export, or rewrite it from scratch when full is set or an append can't
+    be used. Returns SnapshotStats.
+    """
+    directory = directory or get_snapshot_dir()
+    os.makedirs(directory, exist_ok=True)
+    started = time.perf_counter()
+    with _exclusive(directory):
+        manifest = read_manifest(directory)
+        stats = None
+        if not full and _is_usable(directory, manifest):
+            try:
+                stats = _append_changes(directory, manifest)
+            except (OSError, ValueError):
+                logger.exception("Appending to the training snapshot failed; rewriting it")
+        if stats is None:
+            stats = _write_full(directory, manifest)
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def load_snapshot(directory=None):
+    """
+    (user_ids, movie_ids, ratings) memory-mapped from the snapshot, or None if
+    there is none. Rows are in export order; later rows override earlier ones
+    for the same (user, movie).
+    """
+    directory = directory or get_snapshot_dir()
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return None
+    rows = manifest['rows']
+    return tuple(
+        np.load(column_path(directory, name, manifest['generation']), mmap_mode='r')[:rows] for name, _ in COLUMNS
+    )
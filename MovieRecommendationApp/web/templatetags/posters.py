@@ -0,0 +1,30 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+from web.thumbnails import thumbnail_urls
+
+register = template.Library()
+
+PLACEHOLDER = 'web/img/poster_placeholder.svg'
+
+
+@register.simple_tag
+def poster_url(movie):
+    """URL of the movie's poster upload, or of a placeholder for movies without one (e.g. imported titles)."""
+    if not movie.movie_logo:
+        return static(PLACEHOLDER)
+    return movie.movie_logo.url
+
+
+@register.simple_tag
+def poster_srcset(movie, sizes='(max-width: 768px) 50vw, 220px'):
+    """
+    srcset/sizes attributes for a movie poster <img>, pointing at its resized variants.
+    Usage: <img src="{% poster_url movie %}" {% poster_srcset movie %} ...>
+    Emits nothing until the variants have been generated, leaving the original upload.
+    """
+    if not movie.poster_hash:
+        return ''
+    srcset = ', '.join(f'{url} {width}w' for width, url in thumbnail_urls(movie.poster_hash, movie.poster_width))
+    return format_html('srcset="{}" sizes="{}"', srcset, sizes)
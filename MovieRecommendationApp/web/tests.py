@@ -0,0 +1,1286 @@
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from unittest import mock
+
+import numpy as np
+
+from . import aggregates, dashboard, importer, model_store, popularity, search, snapshot, thumbnails, trending
+from .materialize import score_top_k
+from .models import (ChatMessage, ChatSession, DashboardMetrics, Feedback, Movie, Myrating, RecommenderVersion,
+                     UserRecommendation, Watchlist)
+from .parallel import WorkerPool
+from .recommendation import (ALSTrainer, CGTrainer, CofiObjective, SparseCofiObjective, build_rating_index,
+                             cofiCostFunc, cofiCostFuncSparse, cofiGradFunc, cofiGradFuncSparse, cross_validate,
+                             index_held_out, normalizeRatings, normalizeRatingsSparse, ranking_metrics, rmse,
+                             top_n_items, train_factors)
+from .similarity import BruteForceIndex, LSHIndex, build_similarity_index
+from .templatetags.posters import poster_srcset
+from .views import MOVIES_PER_PAGE
+
+
+class ModelStoreTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.model_dir = directory.name
+        overrides = self.settings(RECOMMENDER_MODEL_DIR=directory.name, RECOMMENDER_SNAPSHOT_DIR=directory.name,
+                                  RECOMMENDER_MODEL_MAX_AGE=3600)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def factors(self, num_movies=3, num_users=2):
+        rng = np.random.default_rng(num_movies)
+        return {
+            'X': rng.random((num_movies, 2)), 'Theta': rng.random((num_users, 2)), 'Ymean': np.zeros(num_movies),
+            'movie_ids': np.arange(1, num_movies + 1), 'user_ids': np.arange(1, num_users + 1), 'num_ratings': 4,
+        }
+
+    def test_each_save_is_a_new_active_version(self):
+        first = model_store.save_model(self.factors())
+        second = model_store.save_model(self.factors(num_movies=4), training_seconds=1.5)
+        self.assertNotEqual(first.version, second.version)
+        self.assertEqual(list(RecommenderVersion.objects.filter(is_active=True)), [second])
+        self.assertEqual((second.num_movies, second.num_users, second.num_ratings), (4, 2, 4))
+        self.assertEqual(sorted(os.listdir(self.model_dir)),
+                         sorted(os.path.basename(r.artifact_path) for r in (first, second)))
+        model = model_store.load_active_model()
+        self.assertEqual(model.version, second.version)
+        np.testing.assert_array_equal(model.X, self.factors(num_movies=4)['X'])
+
+    def test_failed_switch_keeps_the_previous_version_active(self):
+        first = model_store.save_model(self.factors())
+        with mock.patch.object(RecommenderVersion.objects, 'create', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            model_store.save_model(self.factors())
+        self.assertEqual(list(RecommenderVersion.objects.filter(is_active=True)), [first])
+
+    def test_prune_keeps_active_and_newest_inactive(self):
+        records = [model_store.save_model(self.factors()) for _ in range(5)]
+        os.remove(records[0].artifact_path)  # already gone from disk
+        self.assertEqual(model_store.prune_artifacts(keep=2), 2)
+        kept = set(RecommenderVersion.objects.values_list('version', flat=True))
+        self.assertEqual(kept, {record.version for record in records[2:]})
+        self.assertEqual(sorted(os.listdir(self.model_dir)),
+                         sorted(os.path.basename(record.artifact_path) for record in records[2:]))
+        self.assertEqual(model_store.prune_artifacts(keep=2), 0)
+
+    def test_staleness(self):
+        self.assertTrue(model_store.is_stale(None))
+        record = model_store.save_model(self.factors())
+        self.assertFalse(model_store.is_stale(record))
+        record.created_at = timezone.now() - timezone.timedelta(hours=2)
+        self.assertTrue(model_store.is_stale(record))
+        with self.settings(RECOMMENDER_MODEL_MAX_AGE=None):
+            self.assertFalse(model_store.is_stale(record))
+
+    def test_serving_model_never_trains_inline(self):
+        with mock.patch.object(model_store, 'train_and_save', side_effect=AssertionError("trained inline")), \
+                mock.patch.object(model_store, 'start_background_training') as start:
+            self.assertIsNone(model_store.get_serving_model())
+            self.assertEqual(start.call_count, 1)
+
+            record = model_store.save_model(self.factors())
+            self.assertEqual(model_store.get_serving_model().version, record.version)
+            self.assertEqual(start.call_count, 1)  # fresh: nothing started
+
+            RecommenderVersion.objects.update(created_at=timezone.now() - timezone.timedelta(hours=2))
+            self.assertEqual(model_store.get_serving_model().version, record.version)  # stale, still served
+            self.assertEqual(start.call_count, 2)
+
+    def test_background_training_disabled_or_already_running(self):
+        with self.settings(RECOMMENDER_BACKGROUND_TRAINING=False):
+            self.assertFalse(model_store.start_background_training())
+        with model_store._training_lock:
+            self.assertFalse(model_store.start_background_training())
+
+    def test_train_command_writes_a_loadable_artifact(self):
+        out = io.StringIO()
+        call_command('train_recommender', stdout=out)
+        self.assertIn('No ratings', out.getvalue())
+
+        users = [User.objects.create_user(f'trainee-{i}') for i in range(3)]
+        movies = [Movie.objects.create(title=f'Trained {i}') for i in range(4)]
+        for i, user in enumerate(users):
+            for j, movie in enumerate(movies[:3]):
+                Myrating.objects.create(user=user, movie=movie, rating=1 + (i + j) % 5)
+        call_command('train_recommender', trainer='als', no_materialize=True, stdout=out)
+        record = RecommenderVersion.objects.get(is_active=True)
+        self.assertIn(f'Trained model {record.version}: 3 users x 3 movies from 9 ratings', out.getvalue())
+        model = model_store.FactorModel.load(record.artifact_path)
+        self.assertEqual(model.X.shape, (3, 10))
+        self.assertEqual(sorted(model.user_ids.tolist()), sorted(user.id for user in users))
+
+        out = io.StringIO()
+        call_command('train_recommender', if_stale=True, stdout=out)
+        self.assertIn('fresh; nothing to do', out.getvalue())
+        self.assertEqual(RecommenderVersion.objects.count(), 1)
+
+
+class SparseTrainingTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.num_movies, self.num_users, self.num_features = 7, 5, 3
+        R = rng.random((self.num_movies, self.num_users)) < 0.5
+        R[-1] = False  # a movie nobody rated keeps a zero mean
+        self.rows, self.cols = np.nonzero(R)
+        self.vals = rng.integers(1, 6, size=self.rows.size).astype(np.float64)
+        self.Y = np.zeros(R.shape)
+        self.Y[self.rows, self.cols] = self.vals
+        self.R = R.astype(np.float64)
+        self.params = rng.standard_normal((self.num_movies + self.num_users) * self.num_features)
+
+    def test_normalization_matches_dense(self):
+        Ynorm, Ymean = normalizeRatings(self.Y, self.R)
+        vals_norm, Ymean_sparse = normalizeRatingsSparse(self.rows, self.vals, self.num_movies)
+        np.testing.assert_allclose(Ymean_sparse, Ymean)
+        np.testing.assert_allclose(vals_norm, Ynorm[self.rows, self.cols])
+        self.assertEqual(Ymean_sparse[-1, 0], 0)
+
+    def test_cost_and_gradient_match_dense(self):
+        vals_norm, _ = normalizeRatingsSparse(self.rows, self.vals, self.num_movies)
+        Ynorm = np.zeros(self.Y.shape)
+        Ynorm[self.rows, self.cols] = vals_norm
+        dense_args = (Ynorm, self.R, self.num_features, 1.5)
+        sparse_args = (self.rows, self.cols, vals_norm, self.num_movies, self.num_users, self.num_features, 1.5)
+        J, grad = cofiCostFunc(self.params, *dense_args), cofiGradFunc(self.params, *dense_args)
+
+        self.assertAlmostEqual(cofiCostFuncSparse(self.params, *sparse_args), J)
+        np.testing.assert_allclose(cofiGradFuncSparse(self.params, *sparse_args), grad)
+        # The fused objective sorts its entries into CSR order; shuffled input must not matter
+        order = np.random.default_rng(1).permutation(self.rows.size)
+        objective = SparseCofiObjective(self.rows[order], self.cols[order], vals_norm[order], *sparse_args[3:])
+        J_fused, grad_fused = objective(self.params)
+        self.assertAlmostEqual(J_fused, J)
+        np.testing.assert_allclose(grad_fused, grad)
+
+    def test_rating_index_keeps_last_duplicate(self):
+        rows, cols, vals, movie_ids, user_ids = build_rating_index(
+            np.array([7, 3, 7]), np.array([20, 10, 20]), np.array([1, 4, 5]))
+        self.assertEqual(movie_ids.tolist(), [10, 20])
+        self.assertEqual(user_ids.tolist(), [3, 7])
+        self.assertEqual(sorted(zip(rows.tolist(), cols.tolist(), vals.tolist())), [(0, 0, 4.0), (1, 1, 5.0)])
+
+
+class ALSTrainerTests(SimpleTestCase):
+
+    def setUp(self):
+        # Rank-2 ratings with 60% of the entries observed
+        rng = np.random.default_rng(0)
+        ratings = rng.standard_normal((30, 2)).dot(rng.standard_normal((2, 20)))
+        self.rows, self.cols = np.nonzero(rng.random(ratings.shape) < 0.6)
+        self.vals = ratings[self.rows, self.cols]
+
+    def fit(self, trainer, seed=0):
+        X, Theta = trainer.fit(self.rows, self.cols, self.vals, 30, 20, 2, 0.01, np.random.default_rng(seed))
+        return X, Theta, rmse(X, Theta, np.zeros(30), self.rows, self.cols, self.vals)
+
+    def test_rmse_decreases_and_converges(self):
+        errors = [self.fit(ALSTrainer(max_iter=n, tol=0))[2] for n in (1, 3, 10, 40)]
+        self.assertEqual(errors, sorted(errors, reverse=True))
+        self.assertLess(errors[-1], 0.05)
+
+        trainer = ALSTrainer(max_iter=200)
+        self.fit(trainer)
+        self.assertLess(trainer.n_iter_, trainer.max_iter)  # stopped on tol, not max_iter
+
+    def test_fixed_seed_is_reproducible(self):
+        X, Theta, _ = self.fit(ALSTrainer(max_iter=5))
+        X_again, Theta_again, _ = self.fit(ALSTrainer(max_iter=5))
+        np.testing.assert_array_equal(X_again, X)
+        np.testing.assert_array_equal(Theta_again, Theta)
+        X_other, _, _ = self.fit(ALSTrainer(max_iter=5), seed=1)
+        self.assertFalse(np.allclose(X_other, X))
+
+    def test_matches_cg_objective(self):
+        _, _, als_error = self.fit(ALSTrainer(max_iter=40, tol=0))
+        _, _, cg_error = self.fit(CGTrainer(max_iter=500))
+        self.assertAlmostEqual(als_error, cg_error, places=2)
+
+
+class FusedObjectiveTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        self.num_movies, self.num_users, self.num_features = 6, 4, 3
+        self.R = (rng.random((self.num_movies, self.num_users)) < 0.6).astype(np.float64)
+        self.Y = rng.integers(1, 6, size=self.R.shape) * self.R - 3 * self.R
+        self.params = rng.standard_normal((self.num_movies + self.num_users) * self.num_features)
+        self.args = (self.Y, self.R, self.num_features, 0.7)
+
+    def test_matches_separate_cost_and_gradient(self):
+        objective = CofiObjective(*self.args)
+        for params in (self.params, 2 * self.params):  # buffers reused across calls
+            J, grad = objective(params)
+            self.assertAlmostEqual(J, cofiCostFunc(params, *self.args))
+            np.testing.assert_allclose(grad, cofiGradFunc(params, *self.args))
+        self.assertIsNot(objective(self.params)[1], objective(self.params)[1])
+
+    def test_gradient_matches_finite_differences(self):
+        objective = CofiObjective(*self.args)
+        _, grad = objective(self.params)
+        eps = 1e-6
+        numeric = np.empty_like(self.params)
+        for i in range(self.params.size):
+            step = np.zeros_like(self.params)
+            step[i] = eps
+            numeric[i] = (objective(self.params + step)[0] - objective(self.params - step)[0]) / (2 * eps)
+        np.testing.assert_allclose(grad, numeric, rtol=1e-5, atol=1e-6)
+
+    def test_fused_trainer_matches_fmin_cg(self):
+        rows, cols = np.nonzero(self.R)
+        vals = self.Y[rows, cols]
+        fit_args = (rows, cols, vals, self.num_movies, self.num_users, self.num_features, 0.7)
+        fits = {}
+        for sparse in (False, True):
+            for fused in (False, True):
+                X, Theta = CGTrainer(sparse=sparse, fused=fused).fit(*fit_args, np.random.default_rng(0))
+                fits[sparse, fused] = cofiCostFunc(np.concatenate((X.ravel(), Theta.ravel())), *self.args)
+        for key, cost in fits.items():
+            with self.subTest(sparse=key[0], fused=key[1]):
+                self.assertAlmostEqual(cost, fits[False, False], places=4)
+
+
+class FoldInTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        rng = np.random.default_rng(3)
+        self.model = model_store.FactorModel(
+            'v1', rng.standard_normal((4, 2)), rng.standard_normal((2, 2)), np.full(4, 3.0),
+            np.array([10, 20, 30, 40]), np.array([1, 2]),
+        )
+
+    def test_fold_in_changes_predictions(self):
+        before = self.model.predict(1)
+        self.model.fold_in(1, [10, 20], [5, 1])
+        after = self.model.predict(1)
+        self.assertFalse(np.allclose(after, before))
+        self.assertGreater(after[0], after[1])  # the 5-star movie now predicts above the 1-star one
+
+        self.assertIsNone(self.model.predict(99))
+        self.model.fold_in(99, [30], [4])
+        self.assertEqual(self.model.predict(99).shape, (4,))
+        # Shared through the cache with other processes serving the same version
+        same_version = model_store.FactorModel('v1', self.model.X, self.model.Theta, self.model.Ymean,
+                                               self.model.movie_ids, self.model.user_ids)
+        np.testing.assert_allclose(same_version.predict(99), self.model.predict(99))
+
+    def test_unknown_movies_skipped(self):
+        theta = self.model.fold_in(1, [10, 20, 999], [5, 1, 3])
+        np.testing.assert_allclose(theta, self.model.fold_in(1, [10, 20], [5, 1]))
+        np.testing.assert_array_equal(self.model.fold_in(2, [999], [4]), np.zeros(2))
+
+    def test_ratings_changed_during_training_folded_into_new_model(self):
+        users = [User.objects.create_user(f'folder-{i}') for i in range(3)]
+        movies = [Movie.objects.create(title=f'Fold {i}') for i in range(4)]
+        for i, user in enumerate(users):
+            for j, movie in enumerate(movies):
+                Myrating.objects.create(user=user, movie=movie, rating=1 + (i + j) % 5)
+        Myrating.objects.update(updated_at=timezone.now() - timezone.timedelta(days=1))
+        late = users[0]
+        train_factors = model_store.train_factors
+
+        def train_then_rate(**kwargs):
+            factors = train_factors(**kwargs)
+            # Rated after training read the ratings, before the new model went live
+            Myrating.objects.filter(user=late, movie=movies[0]).update(rating=5, updated_at=timezone.now())
+            return factors
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with self.settings(RECOMMENDER_MODEL_DIR=directory.name, RECOMMENDER_SNAPSHOT_DIR=directory.name), \
+                mock.patch.object(model_store, 'train_factors', train_then_rate):
+            record = model_store.train_and_save(trainer='als', materialize=False)
+        model = model_store.load_active_model(record)
+        self.assertIsNotNone(cache.get(model._fold_in_cache_key(late.id)))
+        self.assertIsNone(cache.get(model._fold_in_cache_key(users[1].id)))
+        rated = Myrating.objects.filter(user=late).order_by('movie_id').values_list('movie_id', 'rating')
+        expected = model.fold_in(late.id, [m for m, _ in rated], [r for _, r in rated])
+        np.testing.assert_allclose(model.user_factors(late.id), expected)
+
+
+class TopNTests(SimpleTestCase):
+
+    def test_top_n_items(self):
+        scores = [0.5, 2.0, -1.0, 3.0, 1.0]
+        ids = [10, 20, 30, 40, 50]
+        self.assertEqual(top_n_items(scores, ids, n=3), [40, 20, 50])
+        exclude = np.array([False, False, False, True, False])
+        self.assertEqual(top_n_items(scores, ids, exclude, n=3), [20, 50, 10])
+        # n beyond the candidates left after exclusion returns just those
+        self.assertEqual(top_n_items(scores, ids, exclude, n=10), [20, 50, 10, 30])
+        self.assertEqual(top_n_items(scores, ids, np.ones(5, dtype=bool)), [])
+        self.assertEqual(top_n_items(scores, ids, n=0), [])
+
+    def test_factor_model_recommend(self):
+        cache.clear()
+        # One feature: user 7's predictions are X * 1 + Ymean = [1, 4, 2, 3] for movies [100, 200, 300, 400]
+        model = model_store.FactorModel('top-n', np.array([[1.0], [4.0], [2.0], [3.0]]), np.array([[1.0]]),
+                                        np.zeros(4), np.array([100, 200, 300, 400]), np.array([7]))
+        self.assertEqual(model.recommend(7, n=2), [200, 400])
+        self.assertEqual(model.recommend(7, exclude_movie_ids=[200, 999], n=2), [400, 300])
+        self.assertEqual(model.recommend(7, exclude_movie_ids=[200], n=12), [400, 300, 100])
+        self.assertEqual(model.recommend(8), [])
+
+
+class SimilarityIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(4)
+        self.X = rng.standard_normal((400, 5))
+        self.X[1] = 2 * self.X[0] + 0.01 * rng.standard_normal(5)  # same direction as movie 0, other length
+        self.ids = np.arange(1000, 1400)
+
+    def build(self, limit):
+        with self.settings(RECOMMENDER_SIMILARITY_BRUTE_FORCE_LIMIT=limit):
+            return build_similarity_index(self.X, self.ids)
+
+    def cosine(self, a, b):
+        x, y = self.X[a - 1000], self.X[b - 1000]
+        return x.dot(y) / np.linalg.norm(x) / np.linalg.norm(y)
+
+    def test_brute_force_and_lsh_paths(self):
+        for limit, index_class in ((400, BruteForceIndex), (399, LSHIndex)):
+            with self.subTest(index=index_class.__name__):
+                index = self.build(limit)
+                self.assertIs(type(index), index_class)
+                similar = index.similar(1000, n=10)
+                self.assertEqual(len(similar), 10)
+                self.assertNotIn(1000, similar)
+                self.assertEqual(similar[0], 1001)  # cosine ignores vector length
+                cosines = [self.cosine(1000, movie_id) for movie_id in similar]
+                self.assertEqual(cosines, sorted(cosines, reverse=True))
+                self.assertEqual(index.similar(5, n=10), [])
+
+    def test_brute_force_is_exact(self):
+        similar = self.build(400).similar(1000, n=5)
+        cosines = self.X.dot(self.X[0]) / np.linalg.norm(self.X, axis=1) / np.linalg.norm(self.X[0])
+        cosines[0] = -np.inf
+        self.assertEqual(similar, (1000 + np.argsort(-cosines)[:5]).tolist())
+
+    def test_lsh_small_buckets_fall_back_to_every_movie(self):
+        index = self.build(0)
+        self.assertEqual(len(index.similar(1000, n=399)), 399)
+
+
+@override_settings(RECOMMENDER_BACKGROUND_TRAINING=False, RECOMMENDER_MODEL_MAX_AGE=None)
+class MaterializedRecommendationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = self.settings(RECOMMENDER_MODEL_DIR=directory.name, RECOMMENDER_SNAPSHOT_DIR=directory.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.users = [User.objects.create_user(f'listed-{i}', password='pw') for i in range(4)]
+        self.movies = [Movie.objects.create(title=f'Listed {i}', movie_logo='x.jpg') for i in range(8)]
+        for i, user in enumerate(self.users):
+            for j, movie in enumerate(self.movies[:5]):
+                Myrating.objects.create(user=user, movie=movie, rating=1 + (i * j) % 5)
+        Myrating.objects.update(updated_at=timezone.now() - timezone.timedelta(days=1))
+
+    def test_users_who_rated_during_training_are_skipped(self):
+        late = self.users[0]
+        train_factors = model_store.train_factors
+
+        def train_then_rate(**kwargs):
+            factors = train_factors(**kwargs)
+            Myrating.objects.filter(user=late, movie=self.movies[0]).update(rating=5, updated_at=timezone.now())
+            return factors
+
+        with mock.patch.object(model_store, 'train_factors', train_then_rate):
+            record = model_store.train_and_save(trainer='als', materialize=True)
+        stored = dict(UserRecommendation.objects.values_list('user_id', 'model_version'))
+        self.assertEqual(stored, {user.id: record.version for user in self.users[1:]})
+
+    def test_lists_from_another_model_version_ignored(self):
+        model_store.train_and_save(trainer='als', materialize=True)
+        user = self.users[1]
+        model = model_store.load_active_model()
+        live = model.recommend(user.id, exclude_movie_ids=[movie.id for movie in self.movies[:5]], n=12)
+        stored = UserRecommendation.objects.get(user=user)
+        self.assertEqual(stored.movie_id_list()[:12], live)
+        # A list that differs from the live model shows which one the view served
+        stored.movie_ids = np.array(live[::-1], dtype=np.int32).tobytes()
+        stored.save()
+
+        self.client.force_login(user)
+        self.assertEqual(self.served_ids(), live[::-1])
+        UserRecommendation.objects.filter(user=user).update(model_version='older')
+        self.assertEqual(self.served_ids(), live)
+
+    def served_ids(self):
+        return [movie.id for movie in self.client.get('/recommend/').context['ai_movie_list']]
+
+
+class PopularityTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create_user(f'fan-{i}') for i in range(3)]
+        self.comedy = Movie.objects.create(title='Comedy', genre='Comedy')
+        self.drama = Movie.objects.create(title='Drama', genre='Drama')
+        self.both = Movie.objects.create(title='Both', genre='Comedy|Drama')
+        self.unrated = Movie.objects.create(title='Unrated', genre='Drama')
+        for movie, fans in ((self.comedy, 1), (self.drama, 3), (self.both, 2)):
+            for user in self.users[:fans]:
+                Myrating.objects.create(user=user, movie=movie, rating=3)
+
+    def test_ranking_overall_and_per_genre(self):
+        ranking = popularity.compute_popularity()
+        self.assertEqual(ranking[popularity.ALL_GENRES], [self.drama.id, self.both.id, self.comedy.id, self.unrated.id])
+        self.assertEqual(ranking['Comedy'], [self.both.id, self.comedy.id])
+        self.assertEqual(ranking['Drama'], [self.drama.id, self.both.id])
+        self.assertEqual(popularity.popular_movie_ids(2), [self.drama.id, self.both.id])
+        self.assertEqual(popularity.popular_movie_ids(genre='Comedy'), [self.both.id, self.comedy.id])
+        self.assertEqual(popularity.popular_movie_ids(genre='Western'), [])
+
+    def test_time_decay_favours_recent_ratings(self):
+        Myrating.objects.filter(movie=self.drama).update(updated_at=timezone.now() - timezone.timedelta(days=30))
+        ranking = popularity.compute_popularity(half_life_days=7)
+        self.assertEqual(ranking[popularity.ALL_GENRES][:3], [self.both.id, self.comedy.id, self.drama.id])
+
+    def test_ratings_do_not_invalidate_the_cached_ranking(self):
+        self.assertEqual(popularity.popular_movie_ids(1), [self.drama.id])
+        with self.assertNumQueries(0):
+            popularity.popular_movie_ids(1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for user in self.users:
+                Myrating.objects.update_or_create(user=user, movie=self.comedy, defaults={'rating': 5})
+            Myrating.objects.create(user=User.objects.create_user('fan-late'), movie=self.comedy, rating=4)
+        with self.assertNumQueries(0):
+            self.assertEqual(popularity.popular_movie_ids(1), [self.drama.id])
+
+        call_command('refresh_popularity', stdout=io.StringIO())
+        self.assertEqual(popularity.popular_movie_ids(1), [self.comedy.id])
+
+    def test_stale_ranking_served_while_refreshed_in_background(self):
+        popularity.refresh_popularity()
+        Myrating.objects.create(user=self.users[1], movie=self.comedy, rating=4)
+        Myrating.objects.create(user=self.users[2], movie=self.comedy, rating=4)
+        entry = cache.get(popularity.CACHE_KEY)
+        entry['computed_at'] -= popularity.get_cache_timeout() + 1
+        cache.set(popularity.CACHE_KEY, entry)
+
+        with mock.patch.object(popularity, 'start_background_refresh') as start, self.assertNumQueries(0):
+            self.assertEqual(popularity.popular_movie_ids(1), [self.drama.id])
+        start.assert_called_once_with()
+
+    def test_one_background_refresh_at_a_time(self):
+        with mock.patch('threading.Thread') as thread:
+            self.assertTrue(popularity.start_background_refresh())
+            self.assertFalse(popularity.start_background_refresh())
+        thread.return_value.start.assert_called_once_with()
+        with self.settings(POPULARITY_BACKGROUND_REFRESH=False):
+            cache.delete(popularity.REFRESH_LOCK_KEY)
+            self.assertFalse(popularity.start_background_refresh())
+
+    def test_cold_cache_ranks_by_rating_count_while_another_worker_computes(self):
+        cache.add(popularity.REFRESH_LOCK_KEY, True)
+        with self.assertNumQueries(1):
+            self.assertEqual(popularity.popular_movie_ids(2), [self.drama.id, self.both.id])
+        self.assertEqual(popularity.popular_movie_ids(genre='Comedy'), [self.both.id, self.comedy.id])
+        self.assertIsNone(cache.get(popularity.CACHE_KEY))
+
+        cache.delete(popularity.REFRESH_LOCK_KEY)
+        self.assertEqual(popularity.popular_movie_ids(1), [self.drama.id])
+        self.assertIsNotNone(cache.get(popularity.CACHE_KEY))
+        self.assertIsNone(cache.get(popularity.REFRESH_LOCK_KEY))
+
+
+class RatingAggregateTests(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create_user(f'scorer-{i}') for i in range(3)]
+        self.movies = [Movie.objects.create(title=f'Scored {i}') for i in range(3)]
+        for i, user in enumerate(self.users):
+            Myrating.objects.create(user=user, movie=self.movies[0], rating=i + 2)
+
+    def assertAggregatesFresh(self):
+        """Denormalized sum/count equal a fresh aggregate over Myrating, and a recompute changes nothing."""
+        stored = {movie.id: (movie.rating_sum, movie.rating_count) for movie in Movie.objects.all()}
+        aggregates.recompute_rating_aggregates()
+        self.assertEqual({movie.id: (movie.rating_sum, movie.rating_count) for movie in Movie.objects.all()}, stored)
+        for movie in self.movies:
+            ratings = list(Myrating.objects.filter(movie=movie).values_list('rating', flat=True))
+            self.assertEqual(stored[movie.id], (sum(ratings), len(ratings)))
+        return stored
+
+    def test_update_or_create_applies_the_difference(self):
+        self.assertEqual(self.assertAggregatesFresh()[self.movies[0].id], (9, 3))
+        Myrating.objects.update_or_create(user=self.users[0], movie=self.movies[0], defaults={'rating': 5})
+        Myrating.objects.update_or_create(user=self.users[0], movie=self.movies[1], defaults={'rating': 1})
+        stored = self.assertAggregatesFresh()
+        self.assertEqual(stored[self.movies[0].id], (12, 3))
+        self.assertEqual(stored[self.movies[1].id], (1, 1))
+
+    def test_rating_moved_to_another_movie(self):
+        rating = Myrating.objects.get(user=self.users[1], movie=self.movies[0])
+        rating.movie = self.movies[2]
+        rating.rating = 1
+        rating.save()
+        stored = self.assertAggregatesFresh()
+        self.assertEqual(stored[self.movies[0].id], (6, 2))
+        self.assertEqual(stored[self.movies[2].id], (1, 1))
+
+    def test_deletes(self):
+        Myrating.objects.get(user=self.users[2], movie=self.movies[0]).delete()
+        self.assertEqual(self.assertAggregatesFresh()[self.movies[0].id], (5, 2))
+        Myrating.objects.filter(movie=self.movies[0]).delete()
+        self.assertEqual(self.assertAggregatesFresh()[self.movies[0].id], (0, 0))
+
+
+class MovieSearchTests(TestCase):
+
+    def setUp(self):
+        if not search.fts_available():
+            self.skipTest("SQLite without FTS5")
+
+    def test_index_follows_orm_inserts_updates_and_deletes(self):
+        star_wars = Movie.objects.create(title='Star Wars')
+        Movie.objects.bulk_create([Movie(title='Star Trek'), Movie(title='Amélie')])
+        trek = Movie.objects.get(title='Star Trek')
+        self.assertEqual(search.search_movie_ids('star'), [star_wars.id, trek.id])
+        self.assertEqual(search.search_movie_ids('amelie'), [Movie.objects.get(title='Amélie').id])  # accents folded
+
+        star_wars.title = 'A New Hope'
+        star_wars.save()
+        self.assertEqual(search.search_movie_ids('star'), [trek.id])
+        self.assertEqual(search.search_movie_ids('hope'), [star_wars.id])
+        Movie.objects.filter(pk=trek.pk).update(title='Trek Beyond')
+        self.assertEqual(search.search_movie_ids('star'), [])
+
+        star_wars.delete()
+        Movie.objects.filter(title='Trek Beyond').delete()
+        self.assertEqual(search.search_movie_ids('hope'), [])
+        self.assertEqual(search.search_movie_ids('trek'), [])
+
+    def test_prefix_queries(self):
+        movie = Movie.objects.create(title='The Empire Strikes Back')
+        Movie.objects.create(title='Empirical Evidence')
+        self.assertEqual(search.build_match_query('Star wa!'), '"star"* "wa"*')
+        self.assertEqual(search.search_movie_ids('emp strik'), [movie.id])
+        self.assertEqual(len(search.search_movie_ids('empir')), 2)
+        self.assertEqual(search.search_movie_ids('mpire'), [])  # prefixes only, not substrings
+        self.assertEqual(search.search_movie_ids('!!'), [])
+
+    def test_cursor_pages_without_duplicates_or_gaps(self):
+        self.client.force_login(User.objects.create_user('pager'))
+        Movie.objects.bulk_create(
+            Movie(title=f'{"Page" if i % 3 else "Other"} {i}', movie_logo='x.jpg')
+            for i in range(2 * MOVIES_PER_PAGE + 5)
+        )
+        cases = (({}, Movie.objects.all()), ({'q': 'page'}, Movie.objects.filter(title__startswith='Page')))
+        for params, expected in cases:
+            with self.subTest(**params):
+                seen, after, pages = [], None, 0
+                while True:
+                    response = self.client.get('/movies/', {**params, **({'after': after} if after else {})})
+                    seen += [movie.id for movie in response.context['movies']]
+                    pages += 1
+                    after = response.context['next_cursor']
+                    if after is None:
+                        break
+                    self.assertEqual(after, seen[-1])
+                self.assertEqual(seen, sorted(expected.values_list('id', flat=True)))
+                self.assertEqual(pages, -(-len(seen) // MOVIES_PER_PAGE))
+
+
+class PosterThumbnailTests(TestCase):
+
+    def setUp(self):
+        if thumbnails.Image is None:
+            self.skipTest("Pillow is not installed")
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        overrides = self.settings(MEDIA_ROOT=media.name, THUMBNAIL_WIDTHS=(160, 320, 480), THUMBNAIL_FORMAT='WEBP')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def poster(self, name, width):
+        out = io.BytesIO()
+        thumbnails.Image.new('RGB', (width, width * 3 // 2), 'navy').save(out, format='PNG')
+        with open(os.path.join(self.media_root, name), 'wb') as f:
+            f.write(out.getvalue())
+        with self.captureOnCommitCallbacks(execute=True):
+            return Movie.objects.create(title=name, movie_logo=name)
+
+    def variant_widths(self, movie):
+        directory = os.path.join(self.media_root, thumbnails.THUMBNAIL_DIR)
+        widths = []
+        for name in sorted(os.listdir(directory)):
+            if name.startswith(movie.poster_hash):
+                with thumbnails.Image.open(os.path.join(directory, name)) as image:
+                    widths.append(image.width)
+        return sorted(widths)
+
+    def test_variants_for_a_large_poster(self):
+        movie = self.poster('large.png', 600)
+        self.assertEqual((len(movie.poster_hash), movie.poster_width), (16, 600))
+        self.assertEqual(self.variant_widths(movie), [160, 320, 480])
+        srcset = poster_srcset(Movie.objects.get(pk=movie.pk))
+        self.assertEqual(re.findall(r' (\d+)w', srcset), ['160', '320', '480'])
+
+    def test_small_poster_descriptors_capped_at_its_width(self):
+        movie = self.poster('small.png', 200)
+        self.assertEqual(movie.poster_width, 200)
+        self.assertEqual(self.variant_widths(movie), [160, 200])
+        srcset = poster_srcset(Movie.objects.get(pk=movie.pk))
+        self.assertEqual(re.findall(r' (\d+)w', srcset), ['160', '200'])
+        self.assertIn(f'{movie.poster_hash}-200.webp 200w', srcset)
+
+    def test_missing_poster_logs_one_line(self):
+        with self.assertLogs('web.thumbnails', 'WARNING') as logs, self.captureOnCommitCallbacks(execute=True):
+            movie = Movie.objects.create(title='Lost', movie_logo='lost.png')
+        self.assertEqual(movie.poster_hash, '')
+        self.assertEqual(len(logs.records), 1)
+        self.assertIsNone(logs.records[0].exc_info)
+        self.assertIn('lost.png', logs.records[0].getMessage())
+        self.assertEqual(poster_srcset(movie), '')
+
+    def test_unreadable_poster_keeps_the_traceback(self):
+        with open(os.path.join(self.media_root, 'broken.png'), 'wb') as f:
+            f.write(b'not an image')
+        with self.assertLogs('web.thumbnails', 'WARNING') as logs, self.captureOnCommitCallbacks(execute=True):
+            Movie.objects.create(title='Broken', movie_logo='broken.png')
+        self.assertIsNotNone(logs.records[0].exc_info)
+
+    def test_generated_after_commit(self):
+        with self.assertNoLogs('web.thumbnails'), self.captureOnCommitCallbacks() as callbacks:
+            movie = Movie.objects.create(title='Pending', movie_logo='pending.png')
+        self.assertEqual(len(callbacks), 1)
+        with self.assertLogs('web.thumbnails', 'WARNING'):
+            callbacks[0]()
+        self.assertEqual(movie.poster_hash, '')
+
+TRENDING_PAYLOAD = [
+    {'watchers': 10, 'movie': {'title': 'Stub Movie', 'year': 2024, 'ids': {'trakt': 1}}},
+    {'watchers': 5, 'movie': {'title': 'Another Stub', 'year': 2023, 'ids': {'trakt': 2}}},
+]
+
+
+class StubTraktHandler(BaseHTTPRequestHandler):
+    """Answers /movies/trending with the server's configured status, body and delay."""
+
+    def do_GET(self):
+        server = self.server
+        server.hits += 1
+        server.api_keys.append(self.headers.get('trakt-api-key'))
+        time.sleep(server.delay)
+        body = json.dumps(server.payload).encode()
+        self.send_response(server.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubTraktServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubTraktHandler)
+        self.status, self.payload, self.delay = 200, TRENDING_PAYLOAD, 0
+        self.hits, self.api_keys = 0, []
+
+    def handle_error(self, request, client_address):
+        pass  # clients that time out hang up before the delayed response is written
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class StubTraktMixin:
+    def setUp(self):
+        super().setUp()
+        self.server = StubTraktServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        settings_override = override_settings(
+            TRAKT_API_URL=self.server.url,
+            TRAKT_CLIENT_ID='test-client',
+            TRAKT_TIMEOUT=(0.5, 0.5),
+            TRENDING_CACHE_TTL=60,
+            TRENDING_STALE_TTL=600,
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                'LOCATION': 'trending-tests'}},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+    def make_stale(self):
+        entry = cache.get(trending.CACHE_KEY)
+        entry['fetched_at'] -= 120
+        cache.set(trending.CACHE_KEY, entry)
+
+
+class TrendingServiceTests(StubTraktMixin, SimpleTestCase):
+
+    def test_fetches_movies_with_client_id(self):
+        movies = trending.get_trending()
+        self.assertEqual([m['title'] for m in movies], ['Stub Movie', 'Another Stub'])
+        self.assertEqual(self.server.api_keys, ['test-client'])
+
+    def test_fresh_cache_skips_upstream(self):
+        trending.get_trending()
+        trending.get_trending()
+        self.assertEqual(self.server.hits, 1)
+
+    def test_stale_entry_served_while_refreshing(self):
+        trending.get_trending()
+        self.make_stale()
+        self.server.payload = [{'movie': {'title': 'Fresh Movie'}}]
+        self.server.delay = 0.2
+
+        started = time.monotonic()
+        movies = trending.get_trending()
+        self.assertLess(time.monotonic() - started, 0.2)
+        self.assertEqual(movies[0]['title'], 'Stub Movie')
+
+        # Wait for the background refresh to publish the new list
+        deadline = time.monotonic() + 5
+        while cache.get(trending.CACHE_KEY)['movies'][0]['title'] != 'Fresh Movie':
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.02)
+        self.assertEqual(trending.get_trending()[0]['title'], 'Fresh Movie')
+
+    def test_only_one_background_refresh_at_a_time(self):
+        trending.get_trending()
+        self.make_stale()
+        self.server.delay = 0.2
+        first = trending.start_background_refresh()
+        self.assertIsNotNone(first)
+        self.assertIsNone(trending.start_background_refresh())
+        first.join()
+        self.assertIsNone(cache.get(trending.REFRESH_LOCK_KEY))
+
+    def test_failed_background_refresh_keeps_stale_data(self):
+        trending.get_trending()
+        self.make_stale()
+        self.server.status, self.server.payload = 500, {'error': 'down'}
+        with self.assertLogs('web.trending', 'WARNING'):
+            trending.start_background_refresh().join()
+        self.assertEqual(cache.get(trending.CACHE_KEY)['movies'][0]['title'], 'Stub Movie')
+
+    def test_slow_upstream_times_out(self):
+        self.server.delay = 1.5
+        started = time.monotonic()
+        with self.assertRaises(trending.TrendingUnavailable):
+            trending.get_trending()
+        self.assertLess(time.monotonic() - started, 1.5)
+
+    def test_error_status_reports_message(self):
+        self.server.status, self.server.payload = 403, {'error': 'invalid api key'}
+        with self.assertRaisesMessage(trending.TrendingUnavailable, 'status 403'):
+            trending.get_trending()
+        self.assertIsNone(cache.get(trending.CACHE_KEY))
+
+    def test_warm_command_fills_cache(self):
+        call_command('warm_trending', stdout=io.StringIO())
+        self.assertEqual(len(cache.get(trending.CACHE_KEY)['movies']), 2)
+
+
+class TrendingViewTests(StubTraktMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('viewer', password='pw')
+        self.client.force_login(self.user)
+
+    def test_renders_cached_movies(self):
+        response = self.client.get('/trending/')
+        self.assertContains(response, 'Stub Movie')
+        self.client.get('/trending/')
+        self.assertEqual(self.server.hits, 1)
+
+    def test_upstream_error_shown_as_message(self):
+        self.server.status, self.server.payload = 500, {'error': 'boom'}
+        response = self.client.get('/trending/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Trakt API error (status 500)')
+
+
+class QueryRecorder:
+    """
+    Execute wrapper that records every query run inside ``with connection.execute_wrapper(recorder)``,
+    together with its SQLite EXPLAIN QUERY PLAN (for SELECTs).
+    """
+    FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)$')
+
+    def __init__(self):
+        self.queries = []  # (sql, plan details)
+
+    def __call__(self, execute, sql, params, many, context):
+        plan = []
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            # The raw cursor, so the EXPLAIN itself isn't recorded
+            raw = context['cursor'].cursor
+            raw.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in raw.fetchall()]
+        self.queries.append((sql, plan))
+        return execute(sql, params, many, context)
+
+    def full_scans(self):
+        """[(table or alias, sql)] for every full table scan in the recorded plans."""
+        return [(match.group(1), sql) for sql, plan in self.queries for detail in plan
+                for match in [self.FULL_SCAN.match(detail)] if match]
+
+    def report(self):
+        return '\n\n'.join(f"{sql}\n    " + '\n    '.join(plan) for sql, plan in self.queries)
+
+
+@override_settings(
+    RECOMMENDER_BACKGROUND_TRAINING=False,
+    DASHBOARD_BACKGROUND_REFRESH=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'query-audit'}},
+)
+class QueryAuditTests(TestCase):
+    """
+    Query counts and plans of the hot views against a seeded catalog, measured on
+    a warm request (caches filled by a first request). A new query, or a plan
+    that falls back to scanning a whole table, fails here; if the change is
+    intended, update QUERY_BUDGETS / ALLOWED_SCANS alongside it.
+    """
+    NUM_MOVIES = 3000
+    NUM_USERS = 300
+    RATINGS_PER_USER = 40
+    GENRES = ['Action', 'Comedy', 'Drama', 'Horror', 'Romance', 'Sci-Fi', 'Thriller', 'Animation']
+
+    # view -> most queries one warm request may run (session and user lookups included)
+    QUERY_BUDGETS = {
+        'landing': 1,
+        'movie_list': 4,
+        'movie_list_search': 5,
+        'detail': 5,
+        'rate': 8,
+        'recommend': 8,
+        'trending': 3,
+        'chat': 5,
+        'admin_index': 4,
+        'movie_report': 3,
+    }
+    # Tables any view may scan: old recommender versions are pruned, so it stays a handful of rows
+    ALWAYS_ALLOWED_SCANS = {'web_recommenderversion'}
+    # view -> further tables (or query aliases) it may scan in full
+    ALLOWED_SCANS = {
+        # The recent-ratings log walks the primary key backwards and stops after LIMIT 10
+        'admin_index': {'web_myrating'},
+        # U0 is the active-version subquery over web_recommenderversion, which has a handful of rows
+        'recommend': {'U0'},
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('auditor', password='pw')
+        cls.admin = User.objects.create_superuser('audit-admin', password='pw')
+        User.objects.bulk_create(User(username=f'seed-{i}') for i in range(cls.NUM_USERS))
+        user_ids = list(User.objects.values_list('id', flat=True))
+        Movie.objects.bulk_create(
+            Movie(title=f'Seed Movie {i}', genre=cls.GENRES[i % len(cls.GENRES)], movie_logo='x.jpg',
+                  rating_sum=i % 50, rating_count=i % 13)
+            for i in range(cls.NUM_MOVIES)
+        )
+        movie_ids = list(Movie.objects.values_list('id', flat=True))
+        Myrating.objects.bulk_create(
+            (Myrating(user_id=user_id, movie_id=movie_ids[(u * 37 + k * 101) % len(movie_ids)], rating=1 + (u + k) % 5)
+             for u, user_id in enumerate(user_ids) for k in range(cls.RATINGS_PER_USER)),
+            batch_size=2000,
+        )
+        Feedback.objects.bulk_create(Feedback(user_id=user_ids[i], rating=5, comment='Great') for i in range(200))
+        Watchlist.objects.bulk_create(
+            Watchlist(user=cls.user, movie_id=str(i), movie_title=f'Watch {i}') for i in range(50)
+        )
+        cls.session = ChatSession.objects.create(user=cls.user)
+        ChatMessage.objects.bulk_create(
+            ChatMessage(session=cls.session, is_user=i % 2 == 0, message_text=f'message {i}') for i in range(500)
+        )
+        cls.movie = Movie.objects.get(title='Seed Movie 1234')
+
+    def setUp(self):
+        cache.clear()
+        # Trending is served from a primed cache entry, so Trakt is never called
+        cache.set(trending.CACHE_KEY, {'movies': [{'title': 'Cached'}], 'fetched_at': time.time()})
+
+    def requests(self):
+        """view -> (method, path, data, user) of the request to audit."""
+        return {
+            'landing': ('get', '/', None, None),
+            'movie_list': ('get', '/movies/', {'after': 1500}, self.user),
+            'movie_list_search': ('get', '/movies/', {'q': 'Movie 12'}, self.user),
+            'detail': ('get', f'/movie/{self.movie.id}/', None, self.user),
+            'rate': ('post', f'/movie/{self.movie.id}/', {'rating': 4}, self.user),
+            'recommend': ('get', '/recommend/', None, self.user),
+            'trending': ('get', '/trending/', None, self.user),
+            'chat': ('get', f'/chatbot/session/{self.session.id}/', None, self.user),
+            'admin_index': ('get', '/admin/', None, self.admin),
+            'movie_report': ('get', '/admin/web/movie/movie_report/', None, self.admin),
+        }
+
+    def audit(self, name):
+        method, path, data, user = self.requests()[name]
+        if user is not None:
+            self.client.force_login(user)
+        getattr(self.client, method)(path, data)  # warm-up
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = getattr(self.client, method)(path, data)
+        self.assertLess(response.status_code, 400)
+        return recorder
+
+    def test_query_counts_and_plans(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("plans are checked with SQLite's EXPLAIN QUERY PLAN")
+        for name in self.requests():
+            with self.subTest(view=name):
+                recorder = self.audit(name)
+                self.assertLessEqual(len(recorder.queries), self.QUERY_BUDGETS[name], recorder.report())
+                scans = [(table, sql) for table, sql in recorder.full_scans()
+                         if table not in self.ALWAYS_ALLOWED_SCANS | self.ALLOWED_SCANS.get(name, set())]
+                self.assertEqual(scans, [], recorder.report())
+
+    def test_rating_lookups_use_user_movie_index(self):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            Myrating.objects.filter(user=self.user, movie=self.movie).first()
+            list(Myrating.objects.values_list('user_id', flat=True).distinct().order_by('user_id'))
+        plans = [detail for _, plan in recorder.queries for detail in plan]
+        self.assertTrue(any('web_myrating_user_movie_uniq' in detail or 'autoindex_web_myrating' in detail
+                            for detail in plans[:1]), plans)
+        self.assertEqual(recorder.full_scans(), [], recorder.report())
+
+
+@override_settings(DASHBOARD_BACKGROUND_REFRESH=False)
+class DashboardMetricsTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('boss', password='pw')
+        self.users = [User.objects.create_user(f'rater-{i}') for i in range(3)]
+        self.movies = [Movie.objects.create(title=f'Film {i}', genre='Drama' if i else 'Comedy') for i in range(3)]
+        for user in self.users:
+            Myrating.objects.create(user=user, movie=self.movies[0], rating=4)
+        Myrating.objects.create(user=self.users[0], movie=self.movies[1], rating=2)
+
+    def snapshot(self):
+        metrics = DashboardMetrics.objects.get()
+        return metrics.user_count, metrics.movie_count, metrics.rating_count, metrics.rating_sum
+
+    def test_refresh_computes_metrics(self):
+        metrics = dashboard.refresh_dashboard_metrics()
+        self.assertEqual(self.snapshot(), (3, 3, 4, 14))
+        self.assertEqual(metrics.average_rating, 3.5)
+        self.assertEqual([g['genre'] for g in metrics.genres], ['Drama', 'Comedy'])
+        self.assertEqual(metrics.genres[1]['total_ratings'], 3)
+        self.assertEqual(metrics.top_users[0], {'username': 'rater-0', 'total_ratings_by_user': 2})
+
+    def test_signals_keep_totals_current(self):
+        dashboard.refresh_dashboard_metrics()
+        User.objects.create_user('newcomer')
+        User.objects.create_superuser('another-admin', password='pw')
+        movie = Movie.objects.create(title='Film 9', genre='Horror')
+        rating = Myrating.objects.create(user=self.users[1], movie=movie, rating=5)
+        rating.rating = 1
+        rating.save()
+        Myrating.objects.filter(user=self.users[2]).delete()
+        self.movies[2].delete()
+        self.users[0].delete()
+
+        live = self.snapshot()
+        dashboard.refresh_dashboard_metrics()
+        self.assertEqual(live, self.snapshot())
+
+    def test_admin_pages_read_the_snapshot(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/admin/')
+        self.assertEqual((response.context['rating_count'], response.context['user_count']), (4, 3))
+        self.assertContains(response, 'Last updated')
+
+        # Totals follow new ratings at once; the genre report waits for the next refresh
+        Myrating.objects.create(user=self.users[1], movie=self.movies[1], rating=3)
+        response = self.client.get('/admin/')
+        self.assertEqual(response.context['rating_count'], 5)
+        report = self.client.get('/admin/web/movie/movie_report/')
+        self.assertEqual([g['total_ratings'] for g in report.context['genre_data']], [1, 3])
+
+    def test_stale_snapshot_refreshed_in_background(self):
+        dashboard.refresh_dashboard_metrics()
+        DashboardMetrics.objects.update(refreshed_at=timezone.now() - timezone.timedelta(hours=1))
+        with mock.patch.object(dashboard, 'start_background_refresh') as start:
+            dashboard.get_dashboard_metrics()
+        start.assert_called_once()
+
+    def test_refresh_command(self):
+        out = io.StringIO()
+        call_command('refresh_dashboard_metrics', stdout=out)
+        self.assertIn('3 users, 3 movies, 4 ratings', out.getvalue())
+
+
+@override_settings(DASHBOARD_BACKGROUND_REFRESH=False)
+class MovieLensImportTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='latin-1' if name.endswith('.dat') else 'utf-8') as f:
+            f.write(text)
+        return path
+
+    def import_csv(self, ratings='userId,movieId,rating,timestamp\n1,10,4.0,1\n1,20,2.5,2\n2,10,5.0,3\n2,99,3.0,4\n'):
+        self.write('movies.csv', 'movieId,title,genres\n10,Heat (1995),Action|Crime\n20,"Up, Up and Away (2000)",Comedy\n')
+        self.write('ratings.csv', ratings)
+        out = io.StringIO()
+        call_command('import_movielens', self.directory.name, chunk_size=2, stdout=out)
+        return out.getvalue()
+
+    def test_imports_movies_users_and_ratings(self):
+        out = self.import_csv()
+        self.assertIn('Imported ratings: 3 written, 1 skipped, 4 rows', out)
+        self.assertIn('rows/s', out)
+        heat = Movie.objects.get(movielens_id=10)
+        self.assertEqual((heat.title, heat.genre), ('Heat (1995)', 'Action|Crime'))
+        self.assertEqual(Movie.objects.get(movielens_id=20).title, 'Up, Up and Away (2000)')
+        self.assertEqual(sorted(Myrating.objects.values_list('user__username', 'movie__movielens_id', 'rating')),
+                         [('ml1', 10, 4), ('ml1', 20, 3), ('ml2', 10, 5)])
+        self.assertFalse(User.objects.get(username='ml1').has_usable_password())
+        # bulk_create skips the signals, so the command rebuilds the aggregates itself
+        self.assertEqual((heat.rating_sum, heat.rating_count), (9, 2))
+        self.assertEqual(DashboardMetrics.objects.get().rating_count, 3)
+
+    def test_reimport_updates_in_place(self):
+        self.import_csv()
+        self.import_csv(ratings='userId,movieId,rating,timestamp\n1,10,1.0,5\n3,20,5.0,6\n3,20,4.0,7\n')
+        self.assertEqual(Movie.objects.count(), 2)
+        self.assertEqual(Myrating.objects.count(), 4)
+        self.assertEqual(Myrating.objects.get(user__username='ml1', movie__movielens_id=10).rating, 1)
+        # A pair repeated within one file keeps its last rating
+        self.assertEqual(Myrating.objects.get(user__username='ml3').rating, 4)
+        self.assertEqual(Movie.objects.get(movielens_id=10).rating_sum, 6)
+
+    def test_reads_dat_files(self):
+        self.write('movies.dat', '1::Amélie (2001)::Comedy|Romance\n')
+        self.write('ratings.dat', '7::1::5::978300760\n')
+        call_command('import_movielens', self.directory.name, stdout=io.StringIO())
+        rating = Myrating.objects.get()
+        self.assertEqual((rating.user.username, rating.movie.title, rating.rating), ('ml7', 'Amélie (2001)', 5))
+
+    @override_settings(RECOMMENDER_BACKGROUND_TRAINING=False)
+    def test_imported_movies_render_with_placeholder_poster(self):
+        self.import_csv()
+        heat = Movie.objects.get(movielens_id=10)
+        viewer = User.objects.create_user('viewer', password='pw')
+        self.client.force_login(viewer)
+        placeholder = '/static/web/img/poster_placeholder.svg'
+        for path, data in (('/movies/', None), ('/movies/', {'q': 'heat'}), (f'/movie/{heat.id}/', None),
+                           ('/recommend/', None)):
+            with self.subTest(path=path, data=data):
+                response = self.client.get(path, data)
+                self.assertContains(response, f'src="{placeholder}"')
+        # With ratings but no trained model, /recommend/ falls back to popular (imported) titles
+        Myrating.objects.create(user=viewer, movie=heat, rating=5)
+        self.assertContains(self.client.get('/recommend/'), f'src="{placeholder}"')
+
+    def test_rating_value_rounds_half_stars_up(self):
+        self.assertEqual([importer.rating_value(v) for v in ('0.5', '2.5', '3.0', '4.5', '7')], [1, 3, 3, 5, 5])
+
+
+class TrainingSnapshotTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.users = [User.objects.create_user(f'rater-{i}') for i in range(3)]
+        self.movies = [Movie.objects.create(title=f'Film {i}') for i in range(4)]
+        for i, user in enumerate(self.users):
+            for j, movie in enumerate(self.movies[:3]):
+                Myrating.objects.create(user=user, movie=movie, rating=1 + (i + j) % 5)
+        # Older than the high-water overlap, so only later changes are appended
+        Myrating.objects.update(updated_at=timezone.now() - timezone.timedelta(days=1))
+
+    def current_ratings(self):
+        """{(user_id, movie_id): rating} from the snapshot, later rows overriding earlier ones."""
+        return {(int(u), int(m)): int(r) for u, m, r in zip(*snapshot.load_snapshot(self.directory))}
+
+    def live_ratings(self):
+        return {(u, m): r for u, m, r in Myrating.objects.values_list('user_id', 'movie_id', 'rating')}
+
+    def test_full_export_writes_typed_columns(self):
+        stats = snapshot.export_snapshot(self.directory)
+        self.assertEqual((stats.rows, stats.rebuilt), (9, True))
+        user_ids, movie_ids, ratings = snapshot.load_snapshot(self.directory)
+        self.assertEqual((user_ids.dtype, movie_ids.dtype, ratings.dtype), (np.int32, np.int32, np.int8))
+        self.assertIsInstance(user_ids.base, np.memmap)
+        self.assertEqual(self.current_ratings(), self.live_ratings())
+
+    def test_incremental_export_appends_changes(self):
+        snapshot.export_snapshot(self.directory)
+        rating = Myrating.objects.get(user=self.users[0], movie=self.movies[0])
+        rating.rating = 5
+        rating.save()
+        Myrating.objects.create(user=self.users[1], movie=self.movies[3], rating=2)
+
+        stats = snapshot.export_snapshot(self.directory)
+        self.assertEqual((stats.rows, stats.appended, stats.rebuilt), (11, 2, False))
+        self.assertEqual(self.current_ratings(), self.live_ratings())
+        # Rows changed within HIGH_WATER_OVERLAP are read again; appending them twice changes nothing
+        snapshot.export_snapshot(self.directory)
+        self.assertEqual(self.current_ratings(), self.live_ratings())
+
+    def test_deletions_rewrite_the_snapshot(self):
+        snapshot.export_snapshot(self.directory)
+        Myrating.objects.filter(user=self.users[2]).delete()
+        stats = snapshot.export_snapshot(self.directory)
+        self.assertEqual((stats.rows, stats.rebuilt), (6, True))
+        self.assertEqual(self.current_ratings(), self.live_ratings())
+        self.assertEqual(len(set(os.listdir(self.directory)) - {snapshot.LOCK_FILE}), 4)  # the old generation is gone
+
+    def test_training_from_snapshot_matches_the_database(self):
+        with self.settings(RECOMMENDER_SNAPSHOT_DIR=self.directory):
+            snapshot.export_snapshot()
+            rating = Myrating.objects.get(user=self.users[0], movie=self.movies[0])
+            rating.rating = 5
+            rating.save()
+            # Appends the changed rating, then trains on the memory-mapped snapshot
+            factors = train_factors(trainer='als', seed=0)
+            with self.settings(RECOMMENDER_TRAIN_FROM_SNAPSHOT=False):
+                expected = train_factors(trainer='als', seed=0)
+        self.assertEqual(factors['num_ratings'], 9)
+        np.testing.assert_allclose(factors['X'], expected['X'])
+
+    def test_export_waits_for_another_process_holding_the_lock(self):
+        if snapshot.fcntl is None:
+            self.skipTest("fcntl is not available")
+        write_full = mock.Mock(return_value=snapshot.SnapshotStats())
+        with open(os.path.join(self.directory, snapshot.LOCK_FILE), 'a') as other_process, \
+                mock.patch.object(snapshot, '_write_full', write_full):
+            snapshot.fcntl.flock(other_process, snapshot.fcntl.LOCK_EX)  # a separate open file, like another process
+            exporter = threading.Thread(target=snapshot.export_snapshot, args=(self.directory,))
+            exporter.start()
+            exporter.join(0.2)
+            self.assertTrue(exporter.is_alive())
+            self.assertFalse(write_full.called)
+            snapshot.fcntl.flock(other_process, snapshot.fcntl.LOCK_UN)
+            exporter.join(5)
+        self.assertFalse(exporter.is_alive())
+        write_full.assert_called_once_with(self.directory, None)
+
+
+class ParallelExecutionTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = np.random.default_rng(0)
+        pairs = rng.choice(60 * 40, size=900, replace=False)
+        cls.cols, cls.rows = np.divmod(pairs, 40)  # 60 users x 40 movies
+        cls.vals = rng.integers(1, 6, size=pairs.size).astype(np.float64)
+
+    def fit_als(self, **options):
+        trainer = ALSTrainer(max_iter=4, tol=0, block_entries=100, **options)
+        return trainer.fit(self.rows, self.cols, self.vals - 3, 40, 60, 5, 1.0, np.random.default_rng(1))
+
+    def test_als_gives_the_same_factors_on_any_pool(self):
+        X, Theta = self.fit_als(workers=1)
+        for pool in ('thread', 'process'):
+            with self.subTest(pool=pool):
+                X_parallel, Theta_parallel = self.fit_als(workers=3, pool=pool)
+                np.testing.assert_allclose(X_parallel, X)
+                np.testing.assert_allclose(Theta_parallel, Theta)
+
+    def test_cross_validation_folds(self):
+        folds = cross_validate(self.cols, self.rows, self.vals, num_folds=3, num_features=3, trainer='als')
+        self.assertEqual([fold['fold'] for fold in folds], [0, 1, 2])
+        self.assertTrue(all(np.isfinite(fold['test_rmse']) and fold['iterations'] for fold in folds))
+        parallel = cross_validate(self.cols, self.rows, self.vals, num_folds=3, num_features=3, trainer='als',
+                                  workers=3, pool='process')
+        self.assertEqual([fold['test_rmse'] for fold in parallel], [fold['test_rmse'] for fold in folds])
+
+    def test_cross_validation_with_a_trainer_instance(self):
+        trainer = ALSTrainer(max_iter=3, tol=0, workers=2)
+        inline = cross_validate(self.cols, self.rows, self.vals, num_folds=3, num_features=3,
+                                trainer=ALSTrainer(max_iter=3, tol=0))
+        for pool in ('thread', 'process'):
+            with self.subTest(pool=pool):
+                folds = cross_validate(self.cols, self.rows, self.vals, num_folds=3, num_features=3, trainer=trainer,
+                                       workers=3, pool=pool)
+                self.assertEqual([fold['iterations'] for fold in folds], [3, 3, 3])
+                self.assertEqual([fold['test_rmse'] for fold in folds], [fold['test_rmse'] for fold in inline])
+        # Each fold fitted its own copy
+        self.assertEqual((trainer.workers, trainer.n_iter_), (2, None))
+
+    def test_top_k_scoring_matches_inline(self):
+        X, Theta = self.fit_als()
+        order = np.argsort(self.cols, kind='stable')
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(self.cols, minlength=60))))
+        args = (X, np.full(40, 3.0), Theta, self.rows[order], bounds, 5, 16)
+        inline = list(score_top_k(*args, workers=1))
+        parallel = list(score_top_k(*args, workers=2, pool='process'))
+        self.assertEqual([start for start, _, _ in parallel], [0, 16, 32, 48])
+        for (_, idx, scores), (_, parallel_idx, parallel_scores) in zip(inline, parallel):
+            np.testing.assert_array_equal(parallel_idx, idx)
+            np.testing.assert_array_equal(parallel_scores, scores)
+        # Rated movies are never recommended
+        rated = set(self.rows[order][bounds[0]:bounds[1]].tolist())
+        self.assertFalse(rated & set(inline[0][1][0].tolist()))
+
+    def test_unknown_pool_kind(self):
+        with self.assertRaises(ValueError):
+            WorkerPool(2, 'fiber')
+
+
+class EvaluationMetricsTests(SimpleTestCase):
+
+    def setUp(self):
+        # 4 movies x 2 users, one feature: user 0 likes movies in order 0 > 1 > 2 > 3, user 1 the reverse
+        self.X = np.array([[4.0], [3.0], [2.0], [1.0]])
+        self.Theta = np.array([[1.0], [-1.0]])
+        self.Ymean = np.zeros(4)
+
+    def test_rmse(self):
+        self.assertEqual(rmse(self.X, self.Theta, self.Ymean, np.array([0, 3]), np.array([0, 1]),
+                              np.array([4.0, -1.0])), 0.0)
+        self.assertTrue(np.isnan(rmse(self.X, self.Theta, self.Ymean, [], [], np.array([]))))
+
+    def test_index_held_out(self):
+        rows, cols, known = index_held_out(np.array([10, 20]), np.array([1, 2]), np.array([20, 30, 10]),
+                                           np.array([2, 2, 3]))
+        self.assertEqual(known.tolist(), [True, False, False])
+        self.assertEqual((rows[0], cols[0]), (1, 1))
+
+    def test_precision_and_recall_at_k(self):
+        # Training: user 0 rated movie 0, user 1 rated movie 3, so those are never recommended
+        rows, cols = np.array([0, 3]), np.array([0, 1])
+        # Held out: user 0 loved movies 1 and 3; user 1 loved movie 2 and disliked movie 1
+        test_rows, test_cols, test_vals = np.array([1, 3, 2, 1]), np.array([0, 0, 1, 1]), np.array([5, 4, 5, 1])
+        precision, recall = ranking_metrics(self.X, self.Theta, self.Ymean, rows, cols,
+                                            test_rows, test_cols, test_vals, k=2)
+        # User 0 is shown movies 1 and 2 (one hit of two relevant); user 1 movies 2 and 1 (one hit of one)
+        self.assertEqual((precision, recall), (0.5, 0.75))
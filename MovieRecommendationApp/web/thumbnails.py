@@ -0,0 +1,104 @@
+"""
+Resized, recompressed poster variants for Movie.movie_logo.
+
+Each poster is hashed and written as THUMBNAIL_FORMAT at every THUMBNAIL_WIDTHS
+width under MEDIA_ROOT/thumbnails/<hash>-<width>.<ext>; widths beyond the
+poster's own are capped at it, so no variant is an upscaled copy. Because the
+name changes whenever the image does, the web server can serve that directory
+with an immutable, far-future Cache-Control header. Movie.poster_hash and
+Movie.poster_width record the hash and width so templates can build a srcset
+without touching the files.
+
+Needs Pillow; without it (or for unreadable images) nothing is generated and
+the {% poster_srcset %} tag emits nothing, leaving the original upload.
+"""
+import hashlib
+import io
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = 'thumbnails'
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png'}
+
+
+def get_widths():
+    return tuple(sorted(getattr(settings, 'THUMBNAIL_WIDTHS', (160, 320, 480))))
+
+
+def get_format():
+    return getattr(settings, 'THUMBNAIL_FORMAT', 'WEBP').upper()
+
+
+def thumbnail_name(poster_hash, width):
+    return f'{THUMBNAIL_DIR}/{poster_hash}-{width}.{EXTENSIONS.get(get_format(), "img")}'
+
+
+def variant_widths(poster_width=None):
+    """THUMBNAIL_WIDTHS capped at poster_width (if known), narrowest first and without duplicates."""
+    if not poster_width:
+        return get_widths()
+    return tuple(sorted({min(width, poster_width) for width in get_widths()}))
+
+
+def thumbnail_urls(poster_hash, poster_width=None):
+    """[(width, url), ...] for a poster hash, narrowest first."""
+    return [(width, default_storage.url(thumbnail_name(poster_hash, width))) for width in variant_widths(poster_width)]
+
+
+def generate_thumbnails(movie, force=False):
+    """
+    Write the variants for movie's poster and store its hash and width on the row.
+    Returns the hash, or None if Pillow is missing or the poster can't be read.
+    """
+    if Image is None or not movie.movie_logo:
+        return None
+    try:
+        with movie.movie_logo.open('rb') as fh:
+            data = fh.read()
+        poster_hash = hashlib.sha256(data).hexdigest()[:16]
+
+        source = Image.open(io.BytesIO(data))  # reads the header only; pixels are decoded on convert()
+        poster_width = source.width
+        image = None
+        for width in variant_widths(poster_width):
+            name = thumbnail_name(poster_hash, width)
+            if not force and default_storage.exists(name):
+                continue
+            if image is None:
+                image = source.convert('RGBA' if source.mode in ('RGBA', 'LA', 'P') else 'RGB')
+            default_storage.delete(name)
+            default_storage.save(name, ContentFile(_resize(image, width)))
+    except FileNotFoundError:
+        # Common for rows whose upload never made it to this server; not worth a traceback per save
+        logger.warning("Poster %s of movie %s is missing; no thumbnails built", movie.movie_logo.name, movie.pk)
+        return None
+    except (OSError, ValueError):
+        logger.warning("Could not build thumbnails for movie %s (%s)", movie.pk, movie.movie_logo.name, exc_info=True)
+        return None
+
+    if (movie.poster_hash, movie.poster_width) != (poster_hash, poster_width):
+        type(movie).objects.filter(pk=movie.pk).update(poster_hash=poster_hash, poster_width=poster_width)
+        movie.poster_hash, movie.poster_width = poster_hash, poster_width
+    return poster_hash
+
+
+def _resize(image, width):
+    fmt = get_format()
+    if image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS)
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    out = io.BytesIO()
+    image.save(out, format=fmt, quality=getattr(settings, 'THUMBNAIL_QUALITY', 75), optimize=True)
+    return out.getvalue()
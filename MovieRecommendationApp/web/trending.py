@@ -0,0 +1,140 @@
+"""
+Trending movies from the Trakt API, cached so page views never wait on Trakt.
+
+Requests go through one pooled requests.Session with connect/read timeouts, so
+a slow upstream costs at most TRAKT_TIMEOUT seconds. Results live in Django's
+cache: for TRENDING_CACHE_TTL seconds they are served as-is; after that, for up
+to TRENDING_STALE_TTL more seconds, the stale list is still served while one
+background thread refetches it. Only a cold (or fully expired) cache makes the
+caller wait for Trakt. ``manage.py warm_trending`` fills the cache ahead of time.
+"""
+import logging
+import os
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'trending:movies'
+REFRESH_LOCK_KEY = 'trending:refreshing'
+DEFAULT_CLIENT_ID = '5ec622fbbdee1dc73c6dc8686a586f8c354912e2e21d639600df3fa78b279b4'
+
+
+class TrendingUnavailable(Exception):
+    """Trakt could not be reached or returned an error, and nothing is cached."""
+
+
+def get_api_url():
+    return getattr(settings, 'TRAKT_API_URL', 'https://api.trakt.tv').rstrip('/')
+
+
+def get_client_id():
+    return getattr(settings, 'TRAKT_CLIENT_ID', None) or os.environ.get('TRAKT_CLIENT_ID', DEFAULT_CLIENT_ID)
+
+
+def get_timeout():
+    """(connect, read) timeout in seconds for each Trakt request."""
+    return getattr(settings, 'TRAKT_TIMEOUT', (3.05, 5))
+
+
+def get_ttl():
+    return getattr(settings, 'TRENDING_CACHE_TTL', 10 * 60)
+
+
+def get_stale_ttl():
+    return getattr(settings, 'TRENDING_STALE_TTL', 24 * 60 * 60)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Process-wide Session, so connections (and TLS handshakes) are reused across requests."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=10)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({
+                    'Content-Type': 'application/json',
+                    'trakt-api-version': '2',
+                })
+                _session = session
+    return _session
+
+
+def fetch_trending():
+    """Fetch the trending list from Trakt. Raises TrendingUnavailable on any failure."""
+    try:
+        response = get_session().get(
+            f'{get_api_url()}/movies/trending',
+            headers={'trakt-api-key': get_client_id()},
+            timeout=get_timeout(),
+        )
+    except requests.RequestException as e:
+        raise TrendingUnavailable(f'Error fetching trending movies from Trakt: {e}') from e
+
+    if response.status_code != 200:
+        try:
+            error_message = response.json().get('error', response.text)
+        except ValueError:
+            error_message = response.text
+        raise TrendingUnavailable(f'Trakt API error (status {response.status_code}): {error_message}')
+    try:
+        data = response.json()
+    except ValueError as e:
+        raise TrendingUnavailable('Trakt API returned invalid JSON') from e
+    # Each item has 'movie' key with movie details
+    return [item['movie'] for item in data if 'movie' in item]
+
+
+def refresh_trending():
+    """Fetch from Trakt and publish to the cache. Returns the movies; raises TrendingUnavailable."""
+    movies = fetch_trending()
+    cache.set(CACHE_KEY, {'movies': movies, 'fetched_at': time.time()}, get_ttl() + get_stale_ttl())
+    return movies
+
+
+def _refresh_quietly():
+    try:
+        refresh_trending()
+    except TrendingUnavailable as e:
+        logger.warning("Background trending refresh failed: %s", e)
+    finally:
+        cache.delete(REFRESH_LOCK_KEY)
+
+
+def start_background_refresh():
+    """
+    Refresh the cache in a daemon thread unless a refresh is already running.
+    Returns the thread, or None if another refresh holds the lock.
+    """
+    # cache.add is atomic, so only one worker refreshes even with many concurrent stale hits
+    if not cache.add(REFRESH_LOCK_KEY, True, sum(get_timeout()) + 30):
+        return None
+    thread = threading.Thread(target=_refresh_quietly, name='trending-refresh', daemon=True)
+    thread.start()
+    return thread
+
+
+def get_trending():
+    """
+    Trending movies, from the cache whenever possible. Stale entries are returned
+    immediately and refreshed in the background; raises TrendingUnavailable only
+    when nothing is cached and Trakt fails.
+    """
+    entry = cache.get(CACHE_KEY)
+    if entry is None:
+        return refresh_trending()
+    if time.time() - entry['fetched_at'] > get_ttl():
+        start_background_refresh()
+    return entry['movies']
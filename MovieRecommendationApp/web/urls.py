@@ -5,6 +5,7 @@ urlpatterns = [
     path('', views.landing_page, name='landing_page'),
     path('movies/', views.movie_list, name='movie_list'),
     path('movie/<int:movie_id>/', views.detail, name='detail'),
+    path('movie/<int:movie_id>/similar/', views.similar_movies_api, name='similar_movies'),
     path('signup/', views.signUp, name='signup'),
     path('login/', views.Login, name='login'),
     path('logout/', views.Logout, name='logout'),
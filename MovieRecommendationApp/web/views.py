@@ -1,52 +1,68 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
-from django.db.models import Q, Case, When, Count, Avg # Ensure Avg is imported
 from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
-from .models import Movie, Myrating, Feedback, Watchlist # Ensure all models are imported
+from .models import Movie, Myrating, Feedback, Watchlist, RecommenderVersion, UserRecommendation # Ensure all models are imported
 from .forms import UserForm, FeedbackForm, ManualRecommendationForm, APIKeyForm
-from .recommendation import Myrecommend # Ensure Myrecommend is imported
-import numpy as np
-import pandas as pd
-import requests
-import json
+from .model_store import get_serving_model, similar_movies
+from .popularity import popular_movie_ids
+from .search import search_movie_ids
+from .trending import TrendingUnavailable, get_trending
 import os
-from django.conf import settings
 from django.contrib.auth.decorators import login_required
 
 
+def _movies_in_order(movie_ids):
+    """Movie objects for movie_ids, in the same order (ids that no longer exist are dropped)."""
+    movies_by_id = Movie.objects.in_bulk(movie_ids)
+    return [movies_by_id[pk] for pk in movie_ids if pk in movies_by_id]
+
 def landing_page(request):
     """Renders the new landing page and shows recent feedback."""
-    latest_feedback = Feedback.objects.order_by('-created_at')[:3]
+    latest_feedback = Feedback.objects.select_related('user').order_by('-created_at')[:3]
     context = {
         'feedbacks': latest_feedback
     }
     return render(request, 'web/landing.html', context)
 
+MOVIES_PER_PAGE = 48
+
 def movie_list(request):
-    """Renders the list of all movies with their average ratings and rating counts."""
-    movies = Movie.objects.all()
+    """Renders a page of movies with their average ratings and rating counts."""
     query = request.GET.get('q')
+    try:
+        after = max(int(request.GET.get('after', 0)), 0)
+    except ValueError:
+        after = 0
+
+    # Keyset pagination on id: each page is an index range scan, however deep it is.
+    # One extra row tells us whether there is a next page.
     if query:
-        movies = movies.filter(Q(title__icontains=query)).distinct()
+        page_ids = search_movie_ids(query, after=after, limit=MOVIES_PER_PAGE + 1)
+        movies = _movies_in_order(page_ids[:MOVIES_PER_PAGE])
+        has_next = len(page_ids) > MOVIES_PER_PAGE
+    else:
+        movies = list(Movie.objects.filter(id__gt=after).order_by('id')[:MOVIES_PER_PAGE + 1])
+        has_next = len(movies) > MOVIES_PER_PAGE
+        movies = movies[:MOVIES_PER_PAGE]
 
-    # Annotate each movie with its average rating and count of ratings
-    movies = movies.annotate(
-        average_rating=Avg('myrating__rating'),
-        rating_count=Count('myrating')
-    )
+    # average_rating / rating_count come from the denormalized columns on Movie
 
-    # If user is authenticated, fetch their personal rating for each movie efficiently
+    # If user is authenticated, fetch their personal rating for the movies on this page
     user_personal_ratings = {}
-    if request.user.is_authenticated:
+    if request.user.is_authenticated and movies:
         # Get a dictionary of {movie_id: rating} for the current user
-        user_ratings_query = Myrating.objects.filter(user=request.user).values_list('movie_id', 'rating')
+        user_ratings_query = Myrating.objects.filter(
+            user=request.user, movie_id__in=[movie.id for movie in movies]
+        ).values_list('movie_id', 'rating')
         user_personal_ratings = dict(user_ratings_query)
 
     context = {
         'movies': movies,
         'user_personal_ratings': user_personal_ratings, # Renamed for clarity in template
+        'next_cursor': movies[-1].id if has_next else None,
+        'is_first_page': after == 0,
     }
     return render(request, 'web/list.html', context)
 
@@ -55,21 +71,6 @@ def detail(request, movie_id):
         return redirect("login")
     
     movie = get_object_or_404(Movie, pk=movie_id)
-    
-    # Get overall average rating and count for the movie for display
-    movie_with_stats = Movie.objects.filter(pk=movie_id).annotate(
-        average_rating=Avg('myrating__rating'),
-        rating_count=Count('myrating')
-    ).first()
-
-    # Get the current user's personal rating for THIS specific movie
-    personal_rating = None
-    if request.user.is_authenticated:
-        try:
-            personal_rating_obj = Myrating.objects.get(user=request.user, movie=movie)
-            personal_rating = personal_rating_obj.rating
-        except Myrating.DoesNotExist:
-            pass # No personal rating for this movie yet
 
     if request.method == "POST":
         rate = request.POST.get('rating')
@@ -81,15 +82,38 @@ def detail(request, movie_id):
             messages.success(request, "Your rating has been submitted!")
             # After rating submission, redirect to the detail page itself
             return redirect('detail', movie_id=movie.id)
+
+    # Get the current user's personal rating for THIS specific movie
+    personal_rating = None
+    if request.user.is_authenticated:
+        try:
+            personal_rating_obj = Myrating.objects.get(user=request.user, movie=movie)
+            personal_rating = personal_rating_obj.rating
+        except Myrating.DoesNotExist:
+            pass # No personal rating for this movie yet
     
     context = {
         'movies': movie, # The main movie object
-        'movie_with_stats': movie_with_stats, # Movie object with average rating and count
+        'movie_with_stats': movie, # average_rating and rating_count are plain columns on the movie
         'personal_rating': personal_rating, # Current user's specific rating for this movie
+        'similar_movies': _movies_in_order(similar_movies(movie.id, n=6)),
     }
     return render(request, 'web/detail.html', context)
 
 
+def similar_movies_api(request, movie_id):
+    """JSON list of the movies most similar to movie_id according to the trained model."""
+    try:
+        n = min(max(int(request.GET.get('n', 10)), 1), 50)
+    except ValueError:
+        n = 10
+    movies = _movies_in_order(similar_movies(movie_id, n=n))
+    return JsonResponse({
+        'movie_id': movie_id,
+        'similar': [{'id': m.id, 'title': m.title, 'genre': m.genre} for m in movies],
+    })
+
+
 @login_required
 def recommend(request):
     ai_movie_list = []
@@ -97,31 +121,26 @@ def recommend(request):
 
     if not user_ratings_exist:
         messages.warning(request, "Please rate some movies to get personalized AI recommendations!")
-        ai_movie_list = Movie.objects.annotate(num_ratings=Count('myrating')).order_by('-num_ratings')[:12]
+        ai_movie_list = _movies_in_order(popular_movie_ids(12))
     else:
-        unique_rated_user_ids = Myrating.objects.values_list('user_id', flat=True).distinct().order_by('user_id')
-        user_id_to_matrix_index = {user_id: idx for idx, user_id in enumerate(unique_rated_user_ids)}
-
-        if request.user.id in user_id_to_matrix_index:
-            current_user_matrix_index = user_id_to_matrix_index[request.user.id]
-            
-            prediction_matrix, Ymean = Myrecommend()
-
-            if current_user_matrix_index < prediction_matrix.shape[1]:
-                my_predictions = prediction_matrix[:, current_user_matrix_index] + Ymean.flatten()
-                pred_idxs_sorted = np.argsort(my_predictions)[::-1] + 1
-                
-                rated_movie_ids = Myrating.objects.filter(user=request.user).values_list('movie_id', flat=True)
-                recommended_movie_ids_filtered = [mid for mid in pred_idxs_sorted.tolist() if mid not in rated_movie_ids]
-
-                preserved = Case(*[When(pk=pk, then=pos) for pos, pk in enumerate(recommended_movie_ids_filtered)])
-                ai_movie_list = Movie.objects.filter(id__in=recommended_movie_ids_filtered).order_by(preserved)[:12]
-            else:
-                messages.warning(request, "Cannot generate personalized AI recommendations based on your current ratings. Showing popular movies.")
-                ai_movie_list = Movie.objects.annotate(num_ratings=Count('myrating')).order_by('-num_ratings')[:12]
+        # Precomputed after training; removed when the user rates something new, and
+        # ignored once another model version is active
+        active_versions = RecommenderVersion.objects.filter(is_active=True).values('version')
+        precomputed = UserRecommendation.objects.filter(user=request.user, model_version__in=active_versions).first()
+        # Otherwise serve from the offline-trained model; training never happens inside the request
+        model = None if precomputed else get_serving_model()
+
+        if precomputed:
+            ai_movie_list = _movies_in_order(precomputed.movie_id_list()[:12])
+        elif model is not None and model.has_user(request.user.id):
+            rated_movie_ids = Myrating.objects.filter(user=request.user).values_list('movie_id', flat=True)
+            recommended_movie_ids = model.recommend(request.user.id, exclude_movie_ids=rated_movie_ids, n=12)
+
+            # Fetch just the ranked ids and keep the model's order
+            ai_movie_list = _movies_in_order(recommended_movie_ids)
         else:
             messages.warning(request, "Cannot generate personalized AI recommendations yet. Showing popular movies.")
-            ai_movie_list = Movie.objects.annotate(num_ratings=Count('myrating')).order_by('-num_ratings')[:12]
+            ai_movie_list = _movies_in_order(popular_movie_ids(12))
 
     manual_movie_list = None
     form = ManualRecommendationForm(request.POST or None)
@@ -133,7 +152,10 @@ def recommend(request):
         if rec_type == 'movie':
             selected_movie = form.cleaned_data.get('movie')
             if selected_movie:
-                manual_movie_list = Movie.objects.filter(genre=selected_movie.genre).exclude(id=selected_movie.id).order_by('?')[:num_recs]
+                # Nearest neighbours in the model's movie-factor space; same-genre picks if the model doesn't know the movie
+                manual_movie_list = _movies_in_order(similar_movies(selected_movie.id, n=num_recs))
+                if not manual_movie_list:
+                    manual_movie_list = Movie.objects.filter(genre=selected_movie.genre).exclude(id=selected_movie.id).order_by('?')[:num_recs]
             else:
                 messages.error(request, "Please select a movie for movie-based recommendations.")
         elif rec_type == 'genre':
@@ -196,8 +218,6 @@ def submit_feedback(request):
 
 @login_required
 def trending(request):
-    # Use Trakt API for trending movies
-    trakt_client_id = os.environ.get('TRAKT_CLIENT_ID', '5ec622fbbdee1dc73c6dc8686a586f8c354912e2e21d639600df3fa78b279b4')  # Replace with your actual client ID or use env var
     youtube_api_key = os.environ.get('YOUTUBE_API_KEY', '')
 
     # Get user's API keys if they've set them (optional, for YouTube)
@@ -210,28 +230,12 @@ def trending(request):
     else:
         form = APIKeyForm()
 
-    # Get trending movies from Trakt API
+    # Trending movies from Trakt, served from cache (see web.trending)
     trending_movies = []
     try:
-        headers = {
-            'Content-Type': 'application/json',
-            'trakt-api-version': '2',
-            'trakt-api-key': trakt_client_id,
-        }
-        response = requests.get('https://api.trakt.tv/movies/trending', headers=headers)
-        if response.status_code == 200:
-            trakt_data = response.json()
-            # Each item has 'movie' key with movie details
-            trending_movies = [item['movie'] for item in trakt_data if 'movie' in item]
-        else:
-            try:
-                error_data = response.json()
-                error_message = error_data.get('error', response.text)
-            except Exception:
-                error_message = response.text
-            messages.error(request, f'Trakt API error (status {response.status_code}): {error_message}')
-    except Exception as e:
-        messages.error(request, f'Error fetching trending movies from Trakt: {str(e)}')
+        trending_movies = get_trending()
+    except TrendingUnavailable as e:
+        messages.error(request, str(e))
     
     # Get user's watchlist
     watchlist = Watchlist.objects.filter(user=request.user)